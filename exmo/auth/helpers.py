@@ -21,24 +21,115 @@ import re
 from types import NoneType
 
 from django.db.models import Q
+from django.utils.functional import cached_property
 
-from exmo2010.models import Task, Score, Parameter, ObserversGroup
+from exmo2010.models import Task, Score, Parameter, ObserversGroup, OrgUser
 from exmo2010.models.monitoring import Monitoring, PRE, RATE, RES, INT, PUB, FIN
 
 
+class PermissionFacts(object):
+    """
+    Role facts of user, which permission checks depend on. Every fact is loaded with one query
+    on first access and memoized, so facts should not outlive the request. Request-scoped facts
+    are attached to request.user by exmo2010.middleware.PermissionFactsMiddleware.
+
+    """
+    def __init__(self, user):
+        self.user = user
+        self._tasks = {}
+        self._monitorings = {}
+
+    @cached_property
+    def is_expertA(self):
+        return self.user.is_expertA
+
+    @cached_property
+    def is_expertB(self):
+        return self.user.is_expertB
+
+    @cached_property
+    def is_organization(self):
+        return self.user.is_organization
+
+    @cached_property
+    def represented_orgs(self):
+        if not self.user.is_active:
+            return frozenset()
+        return frozenset(OrgUser.objects.filter(userprofile__user=self.user).values_list('organization_id', flat=True))
+
+    @cached_property
+    def observed_orgs(self):
+        if not self.user.is_active:
+            return frozenset()
+        orgs = ObserversGroup.organizations.through.objects.filter(observersgroup__users=self.user)
+        return frozenset(orgs.values_list('organization_id', flat=True))
+
+    @cached_property
+    def observed_monitorings(self):
+        if not self.user.is_active:
+            return frozenset()
+        return frozenset(ObserversGroup.objects.filter(users=self.user).values_list('monitoring_id', flat=True))
+
+    @cached_property
+    def executed_monitorings(self):
+        """ Monitorings, where user has tasks. """
+        if not self.is_expertB:
+            return frozenset()
+        tasks = Task.objects.filter(user=self.user)
+        return frozenset(tasks.values_list('organization__monitoring_id', flat=True))
+
+    @cached_property
+    def represented_monitorings(self):
+        """ Monitorings, where organizations represented by user have approved tasks. """
+        if not self.represented_orgs:
+            return frozenset()
+        tasks = Task.approved_tasks.filter(organization__in=list(self.represented_orgs))
+        return frozenset(tasks.values_list('organization__monitoring_id', flat=True))
+
+    def represents(self, org_pk):
+        return org_pk in self.represented_orgs
+
+    def observes(self, org_pk):
+        return org_pk in self.observed_orgs
+
+    def executes(self, task):
+        return self.is_expertB and task.user_id == self.user.pk
+
+    def task_of(self, score):
+        """ Task of score, fetched once per task. """
+        if score.task_id not in self._tasks:
+            self._tasks[score.task_id] = score.task
+        return self._tasks[score.task_id]
+
+    def monitoring_of(self, task):
+        """ Monitoring of task, fetched once per organization. """
+        if task.organization_id not in self._monitorings:
+            self._monitorings[task.organization_id] = task.organization.monitoring
+        return self._monitorings[task.organization_id]
+
+
+def get_facts(user):
+    """
+    Return request-scoped permission facts of user, or new facts if there is no request scope.
+
+    """
+    return getattr(user, 'perm_facts', None) or PermissionFacts(user)
+
+
 def perm_filter(user, priv, queryset):
+    facts = get_facts(user)
     if priv == 'view_monitoring':
-        if user.is_superuser or user.is_expertA:
+        if user.is_superuser or facts.is_expertA:
             return queryset
 
         published = Q(status=PUB, hidden=False)
         can_observe = Q()
-        if user.is_active and ObserversGroup.objects.filter(users=user).exists():
+        if facts.observed_monitorings:
             can_observe = Q(observersgroup__users=user)
 
-        if user.is_expertB:
+        if facts.is_expertB:
             own = Q(organization__task__user=user) & ~Q(status=PRE)
-        elif user.is_organization:
+        elif facts.is_organization:
             orgs = user.profile.organization.filter(task__status=Task.TASK_APPROVED)
             own = Q(status__in=(INT, FIN, PUB), organization__in=orgs)
         else:
@@ -46,39 +137,152 @@ def perm_filter(user, priv, queryset):
 
         return queryset.filter(published | own | can_observe).distinct()
 
+    if priv in perm_queries.get(queryset.model, {}):
+        return queryset.filter(perm_query(user, priv, queryset.model))
+
+
+# Conditions, which are always true or false for any object.
+ALL = Q(pk__isnull=False)
+NONE = Q(pk__in=[])
+
+
+def _flag(value):
+    return ALL if value else NONE
+
+
+def _task_conditions(user, prefix=''):
+    """
+    Return dict of Q conditions on task fields (with given lookup prefix) and user facts, which
+    task permissions depend on.
+
+    """
+    facts = get_facts(user)
+    lookup = lambda name, value: Q(**{prefix + name: value})
+    phase = lambda *phases: lookup('organization__monitoring__status__in', phases)
+
+    def orgs(pks):
+        return lookup('organization__in', list(pks)) if pks else NONE
+
+    return dict(
+        phase=phase,
+        status=lambda status: lookup('status', status),
+        executes=lookup('user', user.pk) if facts.is_expertB else NONE,
+        represents=orgs(facts.represented_orgs),
+        observes=orgs(facts.observed_orgs),
+        hidden=lookup('organization__monitoring__hidden', True),
+    )
+
+
+def task_query(user, priv, prefix=''):
+    """
+    Queryset counterpart of task_permission: return Q object, which filters tasks (or other objects
+    related to task with given lookup prefix) where user has given permission.
+
+    """
+    facts = get_facts(user)
+    if facts.is_expertA:
+        return ALL
+
+    c = _task_conditions(user, prefix)
+    phase, status, executes, represents = c['phase'], c['status'], c['executes'], c['represents']
+    approved = status(Task.TASK_APPROVED)
+
     if priv == 'view_task':
-        if user.is_expertA:
-            return queryset
-        elif user.is_expertB:
-            return queryset.filter(user=user)
+        return executes | \
+            ((represents | c['observes']) & approved & phase(INT, FIN, PUB)) | \
+            (approved & phase(PUB) & ~c['hidden'])
+    elif priv == 'close_task':
+        return status(Task.TASK_OPEN) & executes & phase(RATE)
+    elif priv == 'open_task':
+        return status(Task.TASK_READY) & executes & phase(RATE)
+    elif priv == 'fill_task':
+        return executes & (phase(INT, FIN) | (phase(RATE) & status(Task.TASK_OPEN)))
+    elif priv == 'view_openness':
+        return _flag(facts.is_expertB) | represents | phase(PUB)
+    elif priv == 'view_comments':
+        return phase(INT, FIN, PUB) & (executes | represents)
+    return NONE
+
+
+def score_query(user, priv):
+    """
+    Queryset counterpart of score_permission.
+
+    """
+    facts = get_facts(user)
+    c = _task_conditions(user, 'task__')
+    phase, executes = c['phase'], c['executes']
+    is_expertA = _flag(facts.is_expertA)
+
+    if priv == 'view_score':
+        return task_query(user, 'view_task', 'task__')
+    elif priv == 'edit_score':
+        return (is_expertA & phase(RATE, INT, RES, FIN)) | \
+            (executes & (phase(INT, FIN) | (phase(RATE) & c['status'](Task.TASK_OPEN))))
+    elif priv == 'delete_score':
+        return executes & (phase(INT, FIN) | (phase(RATE) & c['status'](Task.TASK_OPEN)))
+    elif priv == 'add_comment':
+        return (is_expertA & phase(INT, FIN, PUB)) | \
+            (executes & phase(INT, FIN)) | \
+            (c['represents'] & c['status'](Task.TASK_APPROVED) & phase(INT))
+    elif priv in ['answer_claim', 'answer_clarification']:
+        return executes & phase(RATE, INT, FIN)
+    elif priv in ['view_claim', 'view_clarification']:
+        return is_expertA | executes
+    elif priv in ['add_claim', 'add_clarification']:
+        return is_expertA & phase(RATE, RES)
+    elif priv == 'delete_claim':
+        return is_expertA
+    return NONE
+
+
+def perm_query(user, priv, model):
+    """
+    Return Q object, which filters objects of given model where user has given permission.
+
+    """
+    return perm_queries[model][priv](user, priv)
+
+
+def get_perms_map(user, objs):
+    """
+    Return dict of sets of permissions by object pk for list of objects of the same model.
+    Every permission is checked for all objects with single query.
+
+    """
+    if not objs:
+        return {}
+    model = objs[0].__class__
+    pks = [obj.pk for obj in objs]
+    result = dict((pk, set()) for pk in pks)
+    for priv in perm_queries[model]:
+        for pk in model.objects.filter(perm_query(user, priv, model), pk__in=pks).values_list('pk', flat=True):
+            result[pk].add(priv)
+    return result
 
 
 def monitoring_permission(user, priv, monitoring):
+    facts = get_facts(user)
     phase = monitoring.status
 
     if priv in ('admin_monitoring', 'edit_monitoring'):
-        if user.is_expertA:
+        if facts.is_expertA:
             return True
 
     if priv == 'delete_monitoring':
-        if user.is_expertA and not phase == PUB:
+        if facts.is_expertA and not phase == PUB:
             return True
 
     if priv == 'view_monitoring':
-        if user.is_superuser or user.is_expertA:
+        if user.is_superuser or facts.is_expertA:
             return True
         elif phase == PUB and not monitoring.hidden:
             return True
-        elif user.is_expertB and phase != PRE and \
-                user.task_set.filter(organization__monitoring=monitoring).exists():
+        elif facts.is_expertB and phase != PRE and monitoring.pk in facts.executed_monitorings:
             return True
-        elif user.is_organization and Task.approved_tasks.filter(
-                organization__monitoring=monitoring,
-                organization__monitoring__status__in=(INT, FIN, PUB),
-                organization__in=user.profile.organization.all()).exists():
+        elif facts.is_organization and phase in (INT, FIN, PUB) and monitoring.pk in facts.represented_monitorings:
             return True
-        elif phase in (INT, FIN) and user.is_active and \
-                ObserversGroup.objects.filter(monitoring=monitoring, users=user).exists():
+        elif phase in (INT, FIN) and monitoring.pk in facts.observed_monitorings:
             return True
 
     return False
@@ -88,84 +292,86 @@ def task_permission(user, priv, task):
     if priv not in existing_permissions(task):
         return False
 
-    if user.is_expertA:
+    facts = get_facts(user)
+    if facts.is_expertA:
         return True
 
-    monitoring = task.organization.monitoring
+    monitoring = facts.monitoring_of(task)
     phase = monitoring.status
 
     if priv == 'view_task':
-        if user.executes(task):
+        if facts.executes(task):
             return True
-        elif user.represents(task.organization) or user.observes(task.organization):
+        elif facts.represents(task.organization_id) or facts.observes(task.organization_id):
             if task.approved and phase in (INT, FIN, PUB):
                 return True
         elif task.approved and phase == PUB and not monitoring.hidden:
             # Anonymous or unprivileged user
             return True
     elif priv == 'close_task' and task.open:
-        if user.executes(task) and phase == RATE:
+        if facts.executes(task) and phase == RATE:
             return True
     elif priv == 'open_task' and task.ready:
-        if user.executes(task) and phase == RATE:
+        if facts.executes(task) and phase == RATE:
             return True
     elif priv == 'fill_task':  # create_score
-        if user.executes(task):
+        if facts.executes(task):
             if phase in (INT, FIN) or (phase == RATE and task.open):
                 return True
     elif priv == 'view_openness':
-        if user.is_expertB or user.represents(task.organization) or phase == PUB:
+        if facts.is_expertB or facts.represents(task.organization_id) or phase == PUB:
             return True
     if priv == 'view_comments':
         if phase in (INT, FIN, PUB):
-            if user.is_expertA or user.executes(task) or user.represents(task.organization):
+            if facts.is_expertA or facts.executes(task) or facts.represents(task.organization_id):
                 return True
 
     return False
 
 
 def score_permission(user, priv, score):
-    task = score.task
-    monitoring = task.organization.monitoring
+    facts = get_facts(user)
+    task = facts.task_of(score)
+    monitoring = facts.monitoring_of(task)
     phase = monitoring.status
 
     if priv == 'view_score':
         return user.has_perm('view_task', task)
 
     if priv == 'edit_score':
-        if user.is_expertA and phase in (RATE, INT, RES, FIN):
+        if facts.is_expertA and phase in (RATE, INT, RES, FIN):
             return True
-        elif user.executes(task):
+        elif facts.executes(task):
             if phase in (INT, FIN) or (phase == RATE and task.open):
                 return True
 
     if priv == 'delete_score':
-        if user.executes(task):
+        if facts.executes(task):
             if phase in (INT, FIN) or (phase == RATE and task.open):
                 return True
 
     if priv == 'add_comment':
-        if user.is_expertA and phase in (INT, FIN, PUB):
+        if facts.is_expertA and phase in (INT, FIN, PUB):
             return True
-        elif user.is_expertB and task.user_id == user.pk and phase in (INT, FIN):
+        elif facts.is_expertB and task.user_id == user.pk and phase in (INT, FIN):
             return True
-        elif user.represents(task.organization) and task.approved and phase == INT:
+        elif facts.represents(task.organization_id) and task.approved and phase == INT:
             return True
 
     if priv in ['answer_claim', 'answer_clarification']:
-        if user.executes(task) and phase in (RATE, INT, FIN):
+        if facts.executes(task) and phase in (RATE, INT, FIN):
             return True
 
     if priv in ['view_claim', 'view_clarification']:
-        if user.is_expertA or user.executes(task):
+        if facts.is_expertA or facts.executes(task):
             return True
 
     if priv in ['add_claim', 'add_clarification']:
-        if user.is_expertA and phase in (RATE, RES):
+        if facts.is_expertA and phase in (RATE, RES):
             return True
 
     if priv == 'delete_claim':
-        if user.is_expertA:
+        if facts.is_expertA:
             return True
 
     return False
@@ -173,7 +379,7 @@ def score_permission(user, priv, score):
 
 def parameter_permission(user, priv, parameter):
     if priv == 'exclude_parameter':
-        if user.is_expertA:
+        if get_facts(user).is_expertA:
             return True
     return False
 
@@ -191,7 +397,7 @@ def check_permission(user, priv, context_obj=None):
     else:
         # Global permissions
         if priv == 'create_monitoring':
-            return user.is_expertA
+            return get_facts(user).is_expertA
 
 
 perm_handlers = {
@@ -236,6 +442,13 @@ _existing_permissions = {
 }
 
 
+# Queryset permission compilers by model and permission.
+perm_queries = {
+    Task: dict((priv, task_query) for priv in _existing_permissions[Task]),
+    Score: dict((priv, score_query) for priv in _existing_permissions[Score]),
+}
+
+
 def existing_permissions(obj):
     for perm in _existing_permissions[obj.__class__]:
         yield perm
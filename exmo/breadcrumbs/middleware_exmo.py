@@ -49,7 +49,7 @@ class ExmoBreadcrumbsMiddleware(BreadcrumbsMiddleware):
         if 'score_pk' in kwargs:
             score = kwargs.get('score')
             if not score:
-                score = Score.objects.select_related('task.organization.monitoring')\
+                score = Score.objects.select_related('task__organization__monitoring')\
                                         .get(pk=kwargs['score_pk'])
             kwargs['task'] = score.task
             kwargs['task_pk'] = score.task.pk
@@ -57,7 +57,7 @@ class ExmoBreadcrumbsMiddleware(BreadcrumbsMiddleware):
         if 'task_pk' in kwargs:
             task = kwargs.get('task')
             if not task:
-                task = Task.objects.select_related('organization.monitoring')\
+                task = Task.objects.select_related('organization__monitoring')\
                                     .get(pk=kwargs['task_pk'])
             kwargs['org'] = task.organization
             kwargs['org_pk'] = task.organization.pk
@@ -147,6 +147,17 @@ sql_tail_with_respect_to_revision = """
 END)
 """
 
+# Select scores of initial revision: scores with revision = 1
+# and scores with revision = 0 which have no revision = 1 copy
+sql_initial_revision_filter = """
+(exmo2010_score.revision = 1
+OR NOT EXISTS (SELECT SC.`id`
+    FROM `exmo2010_score` SC
+    WHERE SC.`parameter_id`=exmo2010_score.parameter_id
+    AND SC.`task_id`=exmo2010_score.task_id
+    AND SC.`revision`=1))
+"""
+
 # Calculate Openness Initial for each score (with openness code = 1)
 sql_score_openness_initial_v1 = sql_score_openness_v1 + sql_tail_with_respect_to_revision
 
@@ -358,7 +369,35 @@ WHERE (
         AND `exmo2010_score`.`parameter_id` IS NOT NULL
         AND `exmo2010_parameter`.`id` IS NOT NULL))
     )
-ORDER BY task_openness DESC, organization_name ASC
+ORDER BY task_openness DESC, organization_name ASC, organization_id ASC
+"""
+
+
+# Parameters of monitoring with count of organizations, for which parameter is relevant, and count of
+# found scores of approved tasks of those organizations.
+sql_parameter_found_report = """
+SELECT
+    `exmo2010_parameter`.*,
+    COUNT(DISTINCT `exmo2010_organization`.`id`) as organization_count,
+    COUNT(`exmo2010_score`.`id`) as score_count
+FROM `exmo2010_parameter`
+LEFT OUTER JOIN `exmo2010_organization` ON (
+    `exmo2010_organization`.`monitoring_id` = `exmo2010_parameter`.`monitoring_id`
+    AND NOT EXISTS (
+        SELECT 1 FROM `exmo2010_parameter_exclude`
+        WHERE `exmo2010_parameter_exclude`.`parameter_id` = `exmo2010_parameter`.`id`
+            AND `exmo2010_parameter_exclude`.`organization_id` = `exmo2010_organization`.`id`))
+LEFT OUTER JOIN `exmo2010_task` ON (
+    `exmo2010_task`.`organization_id` = `exmo2010_organization`.`id`
+    AND `exmo2010_task`.`status` = %(task_status)s)
+LEFT OUTER JOIN `exmo2010_score` ON (
+    `exmo2010_score`.`task_id` = `exmo2010_task`.`id`
+    AND `exmo2010_score`.`parameter_id` = `exmo2010_parameter`.`id`
+    AND `exmo2010_score`.`revision` = %(revision)s
+    AND `exmo2010_score`.`found` = 1)
+WHERE `exmo2010_parameter`.`monitoring_id` = %(monitoring_pk)s
+GROUP BY `exmo2010_parameter`.`id`
+ORDER BY `exmo2010_parameter`.`code`, `exmo2010_parameter`.`name`
 """
 
 
@@ -27,6 +27,7 @@ import re
 
 from django.conf import settings
 from django.core.urlresolvers import get_resolver, RegexURLResolver
+from django.db import connection
 from django.utils.safestring import mark_safe
 from lxml.html.clean import Cleaner
 
@@ -212,3 +213,32 @@ def dictfetchall(cursor):
     """
     keys = [col[0] for col in cursor.description]
     return [dict(zip(keys, values)) for values in cursor.fetchall()]
+
+
+def dictfetchiter(sql, params=None, chunk_size=1000):
+    """
+    Yields rows of raw SQL query as dictionaries, fetching rows by chunks.
+    On MySQL unbuffered server-side cursor is used, so whole result set is never held in memory.
+    """
+    if connection.vendor == 'mysql':
+        from MySQLdb.cursors import SSCursor
+
+        connection.cursor()  # Ensure connection is established.
+        cursor = connection.connection.cursor(SSCursor)
+    else:
+        cursor = connection.cursor()
+
+    try:
+        if params is None:
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql, params)
+        keys = [col[0] for col in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for values in rows:
+                yield dict(zip(keys, values))
+    finally:
+        cursor.close()
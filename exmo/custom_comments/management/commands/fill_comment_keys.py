@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from custom_comments.models import CommentExmo
+from exmo2010.models import Score
+
+
+class Command(BaseCommand):
+    """
+    Fill score_id, task_id and monitoring_id fields of comments created before these fields were added.
+
+    USAGE:
+        python manage.py fill_comment_keys
+
+    """
+    help = 'Fill score, task and monitoring keys of comments from their object_pk.'
+
+    chunk_size = 500
+
+    def handle(self, *args, **options):
+        # Only comments to scores have keys, object_pk of other comments may be not an integer.
+        content_type = ContentType.objects.get_for_model(Score)
+        comments = CommentExmo.objects.filter(content_type=content_type, score_id__isnull=True)
+        object_pks = sorted(set(int(pk) for pk in comments.values_list('object_pk', flat=True)))
+
+        for i in range(0, len(object_pks), self.chunk_size):
+            chunk = object_pks[i:i + self.chunk_size]
+            scores = Score.objects.filter(pk__in=chunk)\
+                .values_list('pk', 'task_id', 'task__organization__monitoring_id')
+            keys = dict((pk, (task_pk, monitoring_pk)) for pk, task_pk, monitoring_pk in scores)
+            with transaction.commit_on_success():
+                for score_pk in chunk:
+                    task_pk, monitoring_pk = keys.get(score_pk, (None, None))
+                    comments.filter(object_pk=str(score_pk))\
+                            .update(score_id=score_pk, task_id=task_pk, monitoring_id=monitoring_pk)
+
+        self.stdout.write('Filled keys of comments to %d objects.\n' % len(object_pks))
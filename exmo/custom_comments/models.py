@@ -19,8 +19,10 @@
 #
 from datetime import datetime
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from django.utils.translation import ugettext as _
 from django.contrib.comments.models import Comment
+from django.contrib.contenttypes.models import ContentType
 
 
 class CommentExmo(Comment):
@@ -41,3 +43,40 @@ class CommentExmo(Comment):
     status = models.PositiveIntegerField(choices=STATUSES, default=OPEN, verbose_name=_('status'))
     answered_date = models.DateTimeField(default=datetime.min)
     posted_by_expert = models.BooleanField(default=False, verbose_name=_('posted by expert'))
+
+    # Integer copies of commented score pk and its task and monitoring pks. Text "object_pk" can't be
+    # joined with integer pks using index, so comments are looked up by these fields instead.
+    score_id = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    task_id = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    monitoring_id = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        if self.object_pk and self.score_id is None:
+            self.fill_score_keys()
+        super(CommentExmo, self).save(*args, **kwargs)
+
+    def fill_score_keys(self):
+        """
+        Fill score_id, task_id and monitoring_id fields from "object_pk" of commented score.
+        Keys of comments to other objects are left empty.
+
+        """
+        from exmo2010.models import Score
+
+        if self.content_type_id != ContentType.objects.get_for_model(Score).pk:
+            return
+        self.score_id = int(self.object_pk)
+        keys = Score.objects.filter(pk=self.score_id).values_list('task_id', 'task__organization__monitoring_id')
+        self.task_id, self.monitoring_id = keys[0] if keys else (None, None)
+
+
+def _comment_changed(sender, instance, **kwargs):
+    from exmo2010.view_cache import invalidate_monitoring_views
+
+    # Comments statistics are shown in cached rating and statistics pages.
+    if instance.monitoring_id:
+        invalidate_monitoring_views([instance.monitoring_id])
+
+
+post_save.connect(_comment_changed, sender=CommentExmo)
+post_delete.connect(_comment_changed, sender=CommentExmo)
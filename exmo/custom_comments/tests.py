@@ -17,6 +17,7 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+from cStringIO import StringIO
 from datetime import datetime, timedelta
 
 from django.conf import settings
@@ -24,6 +25,7 @@ from django.contrib.auth.models import AnonymousUser, User, Group
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
 from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from core.test_utils import TestCase
 from mock import MagicMock, Mock, patch
@@ -71,27 +73,28 @@ class CommentReportTestCase(TestCase):
         score1 = mommy.make(Score, task=task1)
         score2 = mommy.make(Score, task=task2)
 
+        content_type = ContentType.objects.get_for_model(Score)
         init_date = datetime.today() - timedelta(days=30)
         late = init_date + timedelta(days=25)
 
         # AND comment by org1user1 that was answered in time
         mommy.make(
-            CommentExmo, object_pk=score1.pk, user=org1user1, submit_date=init_date,
+            CommentExmo, content_type=content_type, object_pk=score1.pk, user=org1user1, submit_date=init_date,
             status=CommentExmo.ANSWERED, answered_date=init_date)
 
         # AND 1 comment by org2user1 that was not answered
         mommy.make(
-            CommentExmo, object_pk=score2.pk, user=org2user1, submit_date=init_date,
+            CommentExmo, content_type=content_type, object_pk=score2.pk, user=org2user1, submit_date=init_date,
             status=CommentExmo.OPEN)
         # AND 1 comment by org2user1 that was answered late
         mommy.make(
-            CommentExmo, object_pk=score2.pk, user=org2user1, submit_date=init_date,
+            CommentExmo, content_type=content_type, object_pk=score2.pk, user=org2user1, submit_date=init_date,
             status=CommentExmo.ANSWERED, answered_date=late)
 
         # AND 1 comment by expertB for org1
-        mommy.make(CommentExmo, object_pk=score1.pk, user=expertB)
+        mommy.make(CommentExmo, content_type=content_type, object_pk=score1.pk, user=expertB)
         # AND 1 comment by expertB for org2
-        mommy.make(CommentExmo, object_pk=score2.pk, user=expertB)
+        mommy.make(CommentExmo, content_type=content_type, object_pk=score2.pk, user=expertB)
 
     def test_count_of_organizations_with_representatives(self):
         report = comment_report(self.monitoring)
@@ -128,7 +131,8 @@ class OpenCommentsAnswerTimeUrgencyTestCase(TestCase):
         patch('custom_comments.utils.datetime', Mock(today=lambda: datetime(2014, 8, 14, 10, 25))).start()
 
         # AND 4 comments by organization representative
-        kwargs = dict(model=CommentExmo, status=CommentExmo.OPEN, object_pk=score.pk, user=orguser)
+        kwargs = dict(model=CommentExmo, status=CommentExmo.OPEN, object_pk=score.pk, user=orguser,
+                      content_type=ContentType.objects.get_for_model(Score))
 
         # BUG 2178. Submitted at previous Thursday evening. Calculations should ignore hours, use date only.
         mommy.make(submit_date=datetime(2014, 8, 7, 18, 31), **kwargs)  # expired
@@ -329,3 +333,82 @@ class CommentsDigestTestCase(TestCase):
 
         # THEN 1 email should be sent
         self.assertEqual(len(mail.outbox), 1)
+
+
+class CommentsDigestRecipientsTestCase(TestCase):
+    # send_digest should send comments only to relevant users and update digest dates of all users
+
+    def setUp(self):
+        # GIVEN score with comment of organization representative
+        score = mommy.make(Score)
+        self.orguser = User.objects.create_user('orguser', 'orguser@svobodainfo.org', 'password')
+        self.orguser.profile.is_organization = True
+        mommy.make(OrgUser, organization=score.task.organization, userprofile=self.orguser.profile)
+        mommy.make(CommentExmo, user=self.orguser, object_pk=score.pk, content_type=ContentType.objects.get_for_model(Score))
+        # AND expertB assigned to the task of the score
+        self.expertB = score.task.user
+        self.expertB.email = 'expertB@svobodainfo.org'
+        self.expertB.save()
+        self.expertB.profile.is_expertB = True
+        # AND another expertB
+        other_expertB = User.objects.create_user('other', 'other@svobodainfo.org', 'password')
+        other_expertB.profile.is_expertB = True
+        # AND all of them have NOTIFICATION_DIGEST setting enabled
+        UserProfile.objects.update(notification_type=UserProfile.NOTIFICATION_DIGEST)
+
+    def test_recipients(self):
+        # WHEN send_digest task is executed
+        now = datetime.now()
+        send_digest(now)
+
+        # THEN email is sent only to expertB of the task (representative does not get own comments)
+        self.assertEqual([m.to for m in mail.outbox], [[self.expertB.email]])
+        # AND digest date is updated for all users, including ones without new comments
+        dates = dict(UserProfile.objects.values_list('user__username', 'digest_date_journal'))
+        self.assertEqual(dates, {self.expertB.username: now, 'orguser': now, 'other': now})
+
+
+class CommentScoreKeysTestCase(TestCase):
+    # CommentExmo should store integer keys of commented score, its task and monitoring.
+    # Comments to other objects should have no keys.
+
+    def setUp(self):
+        # GIVEN score
+        self.score = mommy.make(Score)
+        self.content_type = ContentType.objects.get_for_model(Score)
+
+    def test_save(self):
+        # WHEN comment to the score is created
+        comment = mommy.make(CommentExmo, object_pk=self.score.pk, content_type=self.content_type)
+
+        # THEN comment has keys of the score, its task and monitoring
+        comment = CommentExmo.objects.get(pk=comment.pk)
+        self.assertEqual((comment.score_id, comment.task_id, comment.monitoring_id),
+                         (self.score.pk, self.score.task.pk, self.score.task.organization.monitoring.pk))
+
+    def test_fill_comment_keys_command(self):
+        # GIVEN comment without keys (created before keys were added)
+        comment = mommy.make(CommentExmo, object_pk=self.score.pk, content_type=self.content_type)
+        CommentExmo.objects.filter(pk=comment.pk).update(score_id=None, task_id=None, monitoring_id=None)
+
+        # WHEN fill_comment_keys management command is executed
+        call_command('fill_comment_keys', stdout=StringIO())
+
+        # THEN comment has keys of the score, its task and monitoring
+        comment = CommentExmo.objects.get(pk=comment.pk)
+        self.assertEqual((comment.score_id, comment.task_id, comment.monitoring_id),
+                         (self.score.pk, self.score.task.pk, self.score.task.organization.monitoring.pk))
+
+    def test_other_object(self):
+        # WHEN comment to a task with non-numeric object_pk is created
+        comment = mommy.make(CommentExmo, object_pk='task-%s' % self.score.task.pk,
+                             content_type=ContentType.objects.get_for_model(Task))
+
+        # THEN comment has no keys
+        comment = CommentExmo.objects.get(pk=comment.pk)
+        self.assertEqual((comment.score_id, comment.task_id, comment.monitoring_id), (None, None, None))
+
+        # WHEN fill_comment_keys management command is executed
+        call_command('fill_comment_keys', stdout=StringIO())
+        # THEN comment still has no keys
+        self.assertEqual(CommentExmo.objects.get(pk=comment.pk).score_id, None)
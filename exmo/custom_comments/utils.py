@@ -23,7 +23,7 @@ from django.contrib.auth.models import User
 
 from core.utils import workday_count
 from custom_comments.models import CommentExmo
-from exmo2010.models import Score, Task
+from exmo2010.models import Task
 
 
 def comment_report(monitoring):
@@ -45,19 +45,19 @@ def comment_report(monitoring):
     org_users = User.objects.filter(userprofile__organization__monitoring=monitoring)
     org_users = set(org_users.distinct().values_list('pk', flat=True))
 
-    scores = Score.objects.filter(task__organization__monitoring=monitoring, task__status=Task.TASK_APPROVED)
+    tasks = Task.objects.filter(organization__monitoring=monitoring, status=Task.TASK_APPROVED)
 
-    _scores = scores.values_list('pk', 'task__organization_id', 'task__organization__name', 'task__user__username')
-    score_org_expert = dict((str(pk), (org_pk, org_name, expert)) for pk, org_pk, org_name, expert in _scores)
+    _tasks = tasks.values_list('pk', 'organization_id', 'organization__name', 'user__username')
+    task_org_expert = dict((pk, (org_pk, org_name, expert)) for pk, org_pk, org_name, expert in _tasks)
 
     # Dict by pk. Later this will become a list of active_experts and active_orgs.
     dict_active_experts, dict_active_orgs = {}, {}
     non_urgent, urgent, expired = [], [], []
     num_org_comments = num_answered = num_answered_late = 0
 
-    for comment in CommentExmo.objects.filter(object_pk__in=scores).prefetch_related('user'):
+    for comment in CommentExmo.objects.filter(task_id__in=list(task_org_expert)).prefetch_related('user'):
         if comment.user.pk in org_users:
-            org_pk, org_name, expert = score_org_expert[comment.object_pk]
+            org_pk, org_name, expert = task_org_expert[comment.task_id]
             dict_active_orgs.setdefault(org_pk, {'num_comments': 0, 'name': org_name, 'expert': expert})
             dict_active_orgs[org_pk]['num_comments'] += 1
 
@@ -89,5 +89,5 @@ def comment_report(monitoring):
         userprofile__isnull=False, orguser__seen=True).distinct().count()
 
     # Clean unneeded intermediate local variables before returning the rest as result dictionary.
-    del scores, _scores, dict_active_experts, dict_active_orgs, org_users
+    del tasks, _tasks, dict_active_experts, dict_active_orgs, org_users
     return locals()
@@ -50,6 +50,12 @@ CELERY_IGNORE_RESULT = True
 EMAIL_DEFAULT_RETRY_DELAY = 10 * 60  # seconds
 EMAIL_MAX_RETRIES = 5
 EMAIL_RATE_LIMIT = '100/m'
+# mass mailing is sent by batches of messages, every batch over single SMTP connection
+EMAIL_BATCH_SIZE = 50
+EMAIL_BATCH_RATE_LIMIT = '2/m'
+
+# Monitorings with more scores are copied by celery task in background
+MONITORING_COPY_BACKGROUND_SCORES = 20000
 
 # Databases
 MYSQL_INIT = [
@@ -120,6 +126,11 @@ EMAIL_ATTACHMENT_MAX_UPLOAD_SIZE = 15 * 1024 * 1024  # 15MB
 CACHE_PATH = '/var/cache/exmo2010/'
 CACHE_MIDDLEWARE_ANONYMOUS_ONLY = True
 
+# Precomputed export files of published monitorings, see exmo2010/export_artifacts.py
+PRECOMPUTED_EXPORTS = True
+EXPORT_ROOT = None  # Defaults to CACHE_PATH/exports
+EXPORT_BUILD_DELAY = 60  # seconds
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -128,6 +139,22 @@ CACHES = {
     }
 }
 
+# Cache shared between processes, which needs no external services: 'file' keeps cache in
+# CACHE_PATH/django, 'db' keeps it in database table created with 'manage.py createcachetable exmo_cache'.
+# Default is separate in-memory cache of every process. Cached pages and statistics are invalidated
+# by dropping monitoring data versions in cache, so they are cached only if cache is shared. Otherwise
+# other web or celery processes would see changes only after timeouts.
+SHARED_CACHE = None
+
+# Cached rating, ratings, public statistics and task scores pages and rating places index are
+# invalidated by monitoring changes, see exmo2010/view_cache.py. Timeout limits the time they are
+# kept. Used with SHARED_CACHE only.
+VIEW_CACHE_TIMEOUT = 60 * 60
+
+# Seen state of representatives is checked again after this timeout. Unseen links created in other
+# processes are not noticed until then, unless cache is shared between processes.
+ORGUSER_SEEN_CACHE_TIMEOUT = 10 * 60
+
 # CKEditor config
 CKEDITOR_UPLOAD_PATH = 'ckeditor_uploads/'
 CKEDITOR_IMAGE_BACKEND = 'pillow'
@@ -187,6 +214,7 @@ MIDDLEWARE_CLASSES += (
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'exmo2010.middleware.OrguserTrackingMiddleware',
+    'exmo2010.middleware.PermissionFactsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.transaction.TransactionMiddleware',
     'reversion.middleware.RevisionMiddleware',
@@ -328,6 +356,9 @@ if TEST:
     # execute celery tasks immediately
     CELERY_ALWAYS_EAGER = True
 
+    # Exports are generated on the fly, unless precomputed exports are enabled explicitly in test.
+    PRECOMPUTED_EXPORTS = False
+
     # in-memory SQLite used for testing.
     CELERY_RESULT_BACKEND = 'db+sqlite:///celery_results.db'
     DATABASES = {
@@ -378,3 +409,9 @@ if DEVEL or TEST:
     CACHE_PATH = mkdir_ifnotexist(path('../cache'))
     MEDIA_ROOT = mkdir_ifnotexist(path('../media'))
     STATIC_ROOT = mkdir_ifnotexist(path('../static'))
+
+if SHARED_CACHE == 'file' and not TEST:
+    CACHES['default'].update(BACKEND='django.core.cache.backends.filebased.FileBasedCache',
+                             LOCATION=os.path.join(CACHE_PATH, 'django'))
+elif SHARED_CACHE == 'db' and not TEST:
+    CACHES['default'].update(BACKEND='django.core.cache.backends.db.DatabaseCache', LOCATION='exmo_cache')
@@ -21,23 +21,33 @@
 import email
 import imaplib
 import re
+import smtplib
+import socket
 import sys
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from celery import shared_task
 from celery.schedules import crontab
 from celery.task import periodic_task
+from celery.utils.log import get_task_logger
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.comments.models import Comment
 from django.contrib.sites.models import Site
+from django.core.mail import get_connection
+from django.db import transaction
 from django.utils.translation import ugettext as _
 from django.utils import translation
 from livesettings import config_value
 
-from exmo2010.models import Score, UserProfile, Organization
+from custom_comments.models import CommentExmo
+from exmo2010.export_artifacts import build_artifacts
+from exmo2010.models import Monitoring, Organization, OrgUser, Score, UserProfile
+from exmo2010.monitoring_copy import MonitoringCopy
 
 
+logger = get_task_logger(__name__)
+
 mail_task_opts = dict(
     default_retry_delay=settings.EMAIL_DEFAULT_RETRY_DELAY,
     max_retries=settings.EMAIL_MAX_RETRIES,
@@ -55,6 +65,44 @@ def send_org_email(message, org_pk):
     Organization.objects.filter(pk=org_pk, inv_status='NTS').update(inv_status='SNT')
 
 
+@shared_task(bind=True, ignore_result=True, default_retry_delay=settings.EMAIL_DEFAULT_RETRY_DELAY,
+             max_retries=settings.EMAIL_MAX_RETRIES, rate_limit=settings.EMAIL_BATCH_RATE_LIMIT)
+def send_mass_email(self, subject, body, link_url, recipients, attachments):
+    """
+    Send batch of mass mailing messages over single SMTP connection. Messages are rendered here for
+    every recipient, see exmo2010.mail.mail_mass. If connection fails, task is retried for the rest
+    of recipients. Messages refused by server are logged and skipped.
+
+    """
+    from exmo2010.mail import mass_mail_message, read_attachments
+
+    files = read_attachments(attachments)
+    connection = get_connection()
+    try:
+        connection.open()
+    except (smtplib.SMTPException, socket.error) as exc:
+        raise self.retry(exc=exc)
+
+    sent_orgs = []
+    try:
+        for done, rcpt in enumerate(recipients):
+            message = mass_mail_message(subject, body, link_url, rcpt, files)
+            message.connection = connection
+            try:
+                message.send()
+            except (smtplib.SMTPServerDisconnected, socket.error) as exc:
+                raise self.retry(args=(subject, body, link_url, recipients[done:], attachments), exc=exc)
+            except smtplib.SMTPException:
+                # Recipient was refused or message was rejected, it should not stop the rest of batch.
+                logger.exception('Mass mailing message to %s was not sent', rcpt['email'])
+                continue
+            if rcpt.get('org_pk'):
+                sent_orgs.append(rcpt['org_pk'])
+    finally:
+        connection.close()
+        Organization.objects.filter(pk__in=sent_orgs, inv_status='NTS').update(inv_status='SNT')
+
+
 @periodic_task(ignore_result=True, run_every=crontab(minute="*/30"))
 def check_mdn_emails():
     """
@@ -105,13 +153,89 @@ def check_mdn_emails():
 
 
 @periodic_task(ignore_result=True, run_every=crontab(minute="*/60"))
-def send_digest(now=datetime.now()):
+def refresh_monitoring_statistics():
+    """
+    Calculate statistics of monitorings shown on public statistics page, which is missing in cache
+    because monitoring data was changed or cached entry expired. Web processes see it only if cache
+    is shared with them, see SHARED_CACHE setting.
+
+    """
+    if not settings.SHARED_CACHE:
+        return
+    for monitoring in Monitoring.objects.filter(hidden=False):
+        monitoring.statistics()
+
+
+@periodic_task(ignore_result=True, run_every=crontab(minute="*/60"))
+def send_digest(now=None):
+    """
+    Send digests of new comments to users with digest notification type.
+
+    New comments are scanned once, starting from the earliest digest start date of users whose digest
+    interval has passed, and fanned out to recipients: expertsA get all comments, expertsB get comments
+    of their tasks and organizations representatives get comments of their organizations.
+
+    """
     from exmo2010.mail import ExmoEmail
 
-    users = User.objects.filter(
-        userprofile__notification_type=UserProfile.NOTIFICATION_DIGEST,
-        is_active=True,
-        email__isnull=False)
+    now = now or datetime.now()
+    profiles = UserProfile.objects.filter(
+        notification_type=UserProfile.NOTIFICATION_DIGEST,
+        user__is_active=True,
+        user__email__isnull=False).exclude(user__email__exact='').select_related('user')
+
+    # Digest start dates of users whose digest interval has passed.
+    due = {}
+    for profile in profiles:
+        last_date = profile.digest_date_journal or now - timedelta(days=profile.notification_interval)
+        if now - last_date >= timedelta(hours=profile.notification_interval):
+            due[profile.user_id] = (profile, last_date)
+    if not due:
+        return
+
+    comments = CommentExmo.objects.filter(content_type__model='score', score_id__isnull=False,
+                                          submit_date__gte=min(d for p, d in due.values()))
+    comments = list(comments.select_related('user__userprofile').order_by('submit_date'))
+    # Digest date is advanced for all due users, even if they got no comments, so it does not hold
+    # back start of the scan.
+    if not comments:
+        UserProfile.objects.filter(user__in=list(due)).update(digest_date_journal=now)
+        return
+
+    scores = Score.objects.select_related('task__organization', 'parameter')\
+                          .in_bulk(set(c.score_id for c in comments))
+
+    groups = defaultdict(set)
+    for user_pk, group in User.groups.through.objects.filter(user__in=due).values_list('user_id', 'group__name'):
+        groups[user_pk].add(group)
+
+    experts_a, experts_b, orgusers_by_org = set(), set(), defaultdict(set)
+    for user_pk, (profile, last_date) in due.items():
+        if profile.user.is_superuser or UserProfile.expertA_group in groups[user_pk]:
+            experts_a.add(user_pk)
+        elif UserProfile.expertB_group in groups[user_pk]:
+            experts_b.add(user_pk)
+    orgusers = OrgUser.objects.filter(userprofile__user__in=set(due) - experts_a - experts_b,
+                                      userprofile__user__groups__name=UserProfile.organization_group)
+    for org_pk, user_pk in orgusers.values_list('organization_id', 'userprofile__user_id'):
+        orgusers_by_org[org_pk].add(user_pk)
+
+    comments_by_user = defaultdict(list)
+    for comment in comments:
+        score = comment.score = scores.get(comment.score_id)
+        if score is None:
+            continue
+        recipients = set(experts_a)
+        if score.task.user_id in experts_b:
+            recipients.add(score.task.user_id)
+        recipients |= orgusers_by_org[score.task.organization_id]
+        for user_pk in recipients:
+            profile, last_date = due[user_pk]
+            if comment.submit_date < last_date:
+                continue
+            if comment.user_id == user_pk and not profile.notification_self:
+                continue
+            comments_by_user[user_pk].append(comment)
 
     subject = _("%(prefix)s Email digest") % {
         'prefix': config_value('EmailServer', 'EMAIL_SUBJECT_PREFIX'),
@@ -120,47 +244,59 @@ def send_digest(now=datetime.now()):
         'masked_expert_name': config_value('GlobalParameters', 'EXPERT'),
         'site': Site.objects.get_current(),
     }
-    for user in users.exclude(email__exact='').select_related('userprofile'):
-        profile = user.userprofile
-        last_date = profile.digest_date_journal
-        if not last_date:
-            last_date = now - timedelta(days=profile.notification_interval)
-        interval = profile.notification_interval
-        if now - last_date < timedelta(hours=interval):
-            continue
-
-        if profile.is_expertA:
-            score_pk = Score.objects.all()
-        elif profile.is_expertB:
-            score_pk = Score.objects.filter(task__user=user)
-        elif profile.is_organization:
-            score_pk = Score.objects.filter(task__organization__in=profile.organization.all())
-        else:
-            score_pk = Score.objects.none()
-
-        comments = Comment.objects.filter(
-            content_type__model='score',
-            object_pk__in=score_pk.values_list('id', flat=True),
-        ).order_by('submit_date')
-
-        if last_date:
-            comments = comments.filter(submit_date__gte=last_date)
-        if not user.userprofile.notification_self:
-            comments = comments.exclude(user=user)
-
-        if not comments:
-            continue
-
+    for user_pk, user_comments in comments_by_user.items():
+        profile, last_date = due[user_pk]
         context.update({
-            'comments': comments,
+            'comments': user_comments,
             'from': last_date,
             'till': now,
-            'user': user,
+            'user': profile.user,
         })
 
         with translation.override(profile.language or settings.LANGUAGE_CODE):
-            message = ExmoEmail(template_basename='mail/digest', context=context, to=[user.email], subject=subject)
+            message = ExmoEmail(template_basename='mail/digest', context=context, to=[profile.user.email],
+                                subject=subject)
 
         send_email.delay(message)
-        profile.digest_date_journal = now
-        profile.save()
+
+    UserProfile.objects.filter(user__in=list(due)).update(digest_date_journal=now)
+
+
+@shared_task(ignore_result=True)
+def build_export_artifacts(monitoring_pk):
+    """
+    Build precomputed export files of published monitoring.
+
+    """
+    build_artifacts(monitoring_pk)
+
+
+def copy_task_id(monitoring_pk):
+    """
+    Celery task id of background copy job, so its progress can be found by the new monitoring pk.
+
+    """
+    return 'copy_monitoring-%s' % monitoring_pk
+
+
+@shared_task(bind=True, ignore_result=False)
+def copy_monitoring(self, origin_pk, monitoring_pk, donors):
+    """
+    Copy data of origin monitoring to the new monitoring, reporting progress to result backend.
+    If copy fails, the new monitoring is deleted, so it is not mistaken for a complete copy.
+
+    """
+    def progress(done, total):
+        if not self.request.is_eager:
+            self.update_state(state='PROGRESS', meta={'done': done, 'total': total})
+
+    origin = Monitoring.objects.get(pk=origin_pk)
+    monitoring = Monitoring.objects.get(pk=monitoring_pk)
+    try:
+        with transaction.commit_on_success():
+            MonitoringCopy(origin, monitoring, donors).run(progress)
+    except Exception:
+        # Copied data is rolled back, the new monitoring has only settings and questionnaire.
+        with transaction.commit_on_success():
+            monitoring.delete()
+        raise
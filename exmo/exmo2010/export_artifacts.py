@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Precomputed export files of published monitorings.
+
+Export files are built by celery task for every language and stored in EXPORT_ROOT/<monitoring pk>/
+with sha1 of content (used as ETag) in the file name. Files are deleted whenever scores, parameters,
+parameter exclusions, tasks, organizations or questionnaire answers of the monitoring are changed, and
+rebuilt on first request afterwards, until then exports are generated on the fly.
+
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.servers.basehttp import FileWrapper
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponseNotModified, StreamingHttpResponse
+from django.utils import translation
+from django.utils.http import parse_etags, quote_etag
+
+from .models import Monitoring, Organization, Parameter, QAnswer, Score, Task
+from .models.monitoring import MONITORING_PUBLISHED
+from .view_cache import changed_monitoring_pks
+
+
+ARTIFACTS = {
+    'json': ('application/json', 'monitoring-%s.json'),
+    'csv': ('application/vnd.ms-excel', 'monitoring-%s.csv'),
+    'criteria': ('application/zip', 'monitoring-%s.zip'),
+    'answers': ('application/vnd.ms-excel', 'anketa-%s.csv'),
+}
+
+
+def export_root():
+    return getattr(settings, 'EXPORT_ROOT', None) or os.path.join(settings.CACHE_PATH, 'exports')
+
+
+def _monitoring_dir(monitoring_pk):
+    return os.path.join(export_root(), str(monitoring_pk))
+
+
+def _stamp_path(monitoring_pk):
+    return os.path.join(export_root(), '%s.stamp' % monitoring_pk)
+
+
+def _read_stamp(monitoring_pk):
+    try:
+        with open(_stamp_path(monitoring_pk)) as f:
+            return f.read()
+    except IOError:
+        return ''
+
+
+def get_artifact(monitoring_pk, kind, language):
+    """
+    Return (path, etag) of stored export file, or None if it is not built yet.
+
+    """
+    prefix = '%s.%s.' % (kind, language)
+    try:
+        names = os.listdir(_monitoring_dir(monitoring_pk))
+    except OSError:
+        return None
+    for name in names:
+        if name.startswith(prefix):
+            return os.path.join(_monitoring_dir(monitoring_pk), name), name[len(prefix):]
+    return None
+
+
+def invalidate_artifacts(monitoring_pk):
+    """
+    Delete stored export files of monitoring. Stamp is updated, so export build which is in progress
+    at the moment will be discarded.
+
+    """
+    if not os.path.isdir(export_root()):
+        return
+    with open(_stamp_path(monitoring_pk), 'w') as f:
+        f.write(repr(time.time()))
+    shutil.rmtree(_monitoring_dir(monitoring_pk), ignore_errors=True)
+
+
+def _build_key(monitoring_pk):
+    return 'export_artifacts_build:%s' % monitoring_pk
+
+
+def schedule_build(monitoring_pk):
+    """
+    Schedule export files build unless it is already scheduled.
+
+    """
+    from .celery_tasks import build_export_artifacts
+
+    if cache.add(_build_key(monitoring_pk), True, settings.EXPORT_BUILD_DELAY * 2):
+        build_export_artifacts.apply_async((monitoring_pk,), countdown=settings.EXPORT_BUILD_DELAY)
+
+
+def _write_file(directory, kind, language, write):
+    """
+    Write export file with given write(file) function, name it by sha1 of content.
+
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w+b') as f:
+        write(f)
+        f.seek(0)
+        sha1 = hashlib.sha1()
+        for chunk in iter(lambda: f.read(64 * 1024), ''):
+            sha1.update(chunk)
+    os.rename(tmp_path, os.path.join(directory, '%s.%s.%s' % (kind, language, sha1.hexdigest())))
+
+
+def build_artifacts(monitoring_pk):
+    """
+    Build export files of published monitoring for every language.
+
+    """
+    from questionnaire.views import write_answers_csv
+    from .views.export_import import MonitoringExport, write_criteria_zip
+
+    # Changes made from now on should schedule new build.
+    cache.delete(_build_key(monitoring_pk))
+
+    monitorings = Monitoring.objects.filter(pk=monitoring_pk, status=MONITORING_PUBLISHED)
+    if not monitorings:
+        return
+    monitoring = monitorings[0]
+
+    root = export_root()
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    stamp = _read_stamp(monitoring_pk)
+    build_dir = tempfile.mkdtemp(dir=root)
+    try:
+        has_answers = Task.approved_tasks.filter(organization__monitoring=monitoring).exists() and \
+            monitoring.has_questionnaire()
+        for language, name in settings.LANGUAGES:
+            with translation.override(language):
+                export = MonitoringExport(monitoring)
+                _write_file(build_dir, 'json', language, lambda f: f.writelines(export.iter_json()))
+                _write_file(build_dir, 'csv', language, lambda f: f.writelines(export.iter_csv()))
+                _write_file(build_dir, 'criteria', language, lambda f: write_criteria_zip(monitoring, f))
+                if has_answers:
+                    _write_file(build_dir, 'answers', language, lambda f: write_answers_csv(monitoring, f))
+
+        if _read_stamp(monitoring_pk) != stamp:
+            # Monitoring data was changed during the build.
+            return
+        shutil.rmtree(_monitoring_dir(monitoring_pk), ignore_errors=True)
+        os.rename(build_dir, _monitoring_dir(monitoring_pk))
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def artifact_response(request, monitoring, kind):
+    """
+    Serve stored export file with ETag support. Return None if precomputed exports are disabled,
+    monitoring is not published or export file is not built yet (build will be scheduled).
+
+    """
+    if not settings.PRECOMPUTED_EXPORTS or monitoring.status != MONITORING_PUBLISHED:
+        return None
+
+    artifact = get_artifact(monitoring.pk, kind, translation.get_language())
+    if artifact is None:
+        schedule_build(monitoring.pk)
+        return None
+
+    path, etag = artifact
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = quote_etag(etag)
+        return response
+
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        # File was deleted by invalidation just now.
+        return None
+
+    content_type, filename = ARTIFACTS[kind]
+    response = StreamingHttpResponse(FileWrapper(f), content_type=content_type)
+    response['Content-Length'] = os.fstat(f.fileno()).st_size
+    response['Content-Disposition'] = 'attachment; filename=%s' % (filename % monitoring.pk)
+    response['ETag'] = quote_etag(etag)
+    return response
+
+
+def _monitoring_saved(sender, instance, **kwargs):
+    # Exports of not published monitoring are not served and will be rebuilt on publishing.
+    if settings.PRECOMPUTED_EXPORTS and instance.status == MONITORING_PUBLISHED:
+        invalidate_artifacts(instance.pk)
+        schedule_build(instance.pk)
+
+
+def _invalidate_published(monitoring_pks):
+    for monitoring_pk in Monitoring.objects.filter(pk__in=list(monitoring_pks), status=MONITORING_PUBLISHED)\
+            .values_list('pk', flat=True):
+        invalidate_artifacts(monitoring_pk)
+
+
+def _monitoring_data_changed(sender, instance, **kwargs):
+    if settings.PRECOMPUTED_EXPORTS:
+        _invalidate_published(changed_monitoring_pks(sender, instance))
+
+
+def _parameter_exclude_changed(sender, instance, action, **kwargs):
+    # Instance is parameter or organization, depending on the side relation is changed from.
+    if settings.PRECOMPUTED_EXPORTS and action.startswith('post_'):
+        _invalidate_published([instance.monitoring_id])
+
+
+post_save.connect(_monitoring_saved, sender=Monitoring)
+for model in (Organization, Parameter, QAnswer, Score, Task):
+    post_save.connect(_monitoring_data_changed, sender=model)
+    post_delete.connect(_monitoring_data_changed, sender=model)
+m2m_changed.connect(_parameter_exclude_changed, sender=Parameter.exclude.through)
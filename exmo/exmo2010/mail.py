@@ -18,12 +18,15 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import hashlib
 import re
+from os.path import join
 from urllib import urlencode
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
+from django.core.files.storage import default_storage
 from django.core.mail.utils import DNS_NAME
 from django.core.mail import EmailMultiAlternatives
 from django.core.urlresolvers import reverse
@@ -34,7 +37,7 @@ from django.utils import translation
 from livesettings import config_value
 
 from custom_comments.models import CommentExmo
-from .celery_tasks import send_email, send_org_email
+from .celery_tasks import send_email, send_mass_email, send_org_email
 from .models import UserProfile, Organization, MONITORING_INTERACTION, MONITORING_FINALIZING
 
 
@@ -116,7 +119,7 @@ def mail_clarification(request, clarification):
                                            context=context, to=[email], subject=subject))
 
 
-def mail_organization(email, org, subject, body, attachments=None):
+def organization_email(email, inv_code, subject, body, attachments=None):
     message = ExmoEmail(
         template_basename='mail/email_base',
         context={'subject': subject, 'body': body},
@@ -131,10 +134,13 @@ def mail_organization(email, org, subject, body, attachments=None):
         'Disposition-Notification-To': extra_headers_email,
         'X-Confirm-Reading-To': extra_headers_email,
         'Return-Receipt-To': extra_headers_email,
-        'In-Reply-To': '<%s@%s>' % (org.inv_code, DNS_NAME),
-        'Message-ID': '<%s@%s>' % (org.inv_code, DNS_NAME)}
+        'In-Reply-To': '<%s@%s>' % (inv_code, DNS_NAME),
+        'Message-ID': '<%s@%s>' % (inv_code, DNS_NAME)}
+    return message
+
 
-    send_org_email.delay(message, org.pk)
+def mail_organization(email, org, subject, body, attachments=None):
+    send_org_email.delay(organization_email(email, org.inv_code, subject, body, attachments), org.pk)
 
 
 def mail_orguser(email, subject, body, attachments=None):
@@ -151,6 +157,77 @@ def mail_orguser(email, subject, body, attachments=None):
     send_email.delay(message)
 
 
+def expand_magic_words(text, link_url, rcpt):
+    """
+    Replace magic words %code% and %link% in the mass mailing text for the recipient.
+
+    Recipient is a dict with 'email' and optional 'code' (invitation code to replace %code% with) and
+    'link_codes' (invitation codes included in the %link% url).
+
+    """
+    if rcpt.get('code'):
+        text = text.replace('%code%', rcpt['code'])
+    params = {'code': rcpt.get('link_codes', [])}
+    if rcpt['email']:
+        params['email'] = rcpt['email']
+    return text.replace('%link%', link_url + '?' + urlencode(params, True))
+
+
+def mass_mail_message(subject, body, link_url, rcpt, attachments):
+    """
+    Build mass mailing message for the recipient. Recipient dict may also have 'org_pk' and 'inv_code',
+    then message to organization with delivery notification headers is built.
+
+    """
+    text = expand_magic_words(body, link_url, rcpt)
+    if rcpt.get('org_pk'):
+        return organization_email(rcpt['email'], rcpt['inv_code'], subject, text, attachments)
+    return ExmoEmail(template_basename='mail/email_base', context={'subject': subject, 'body': text},
+                     to=[rcpt['email']], subject=subject, attachments=attachments)
+
+
+def store_attachment(upload_file):
+    """
+    Store uploaded attachment under the name made of sha1 of its content, so the same file is stored once.
+    Return this name, which is the key to reference the attachment by.
+
+    """
+    sha1 = hashlib.sha1()
+    for chunk in upload_file.chunks():
+        sha1.update(chunk)
+    key = sha1.hexdigest()
+    path = join(settings.EMAIL_ATTACHMENT_UPLOAD_PATH, key)
+    if not default_storage.exists(path):
+        upload_file.seek(0)
+        default_storage.save(path, upload_file)
+    return key
+
+
+def read_attachments(attachments):
+    """
+    Read stored attachments, given as list of (key, original filename) pairs. Attachments are read
+    once per batch of mass mailing and shared by all its messages.
+
+    """
+    contents = []
+    for key, original_filename in attachments:
+        saved_file = default_storage.open(join(settings.EMAIL_ATTACHMENT_UPLOAD_PATH, key))
+        contents.append((original_filename, saved_file.read()))
+        saved_file.close()
+    return contents
+
+
+def mail_mass(subject, body, link_url, recipients, attachments=()):
+    """
+    Queue mass mailing to recipients in batches of EMAIL_BATCH_SIZE. Every batch is sent by a single
+    celery task over one SMTP connection, message bodies are rendered by the task.
+
+    """
+    batch_size = settings.EMAIL_BATCH_SIZE
+    for i in range(0, len(recipients), batch_size):
+        send_mass_email.delay(subject, body, link_url, recipients[i:i + batch_size], list(attachments))
+
+
 def mail_certificate_order(request, email_data):
     org = email_data['organization']
     subject = '%s %s' % (_('Ordering openness certificate for'), org.name)
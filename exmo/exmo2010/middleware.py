@@ -16,8 +16,10 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+from django.conf import settings
 from django.contrib import auth
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.exceptions import MiddlewareNotUsed
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseRedirect
@@ -27,6 +29,7 @@ from django.utils import translation
 from django.utils.encoding import iri_to_uri
 from livesettings import config_value
 
+from auth.helpers import PermissionFacts
 from .models import OrgUser
 
 
@@ -35,6 +38,8 @@ class CustomLocaleMiddleware(LocaleMiddleware):
     def process_request(self, request):
         is_i18n_pattern = self.is_language_prefix_patterns_used()
         user = auth.get_user(request)
+        # AuthenticationMiddleware will reuse this user instead of fetching it again.
+        request._cached_user = user
         if is_i18n_pattern and user.is_authenticated() and user.profile.language:
             language = user.profile.language
             language_in_path = translation.get_language_from_path(request.path_info)
@@ -58,14 +63,30 @@ class CustomLocaleMiddleware(LocaleMiddleware):
 class OrguserTrackingMiddleware(object):
     """
     Mark orguser as "seen" on any request.
+    When all links of the user are seen, flag is cached and links are not checked until new unseen link
+    is saved or cache timeout passes.
     NOTE: It should be placed after AuthenticationMiddleware
     """
     def process_request(self, request):
         if request.user.is_authenticated():
-            for orguser in OrgUser.objects.filter(userprofile=request.user.profile, seen=False):
+            key = OrgUser.seen_cache_key(request.user.pk)
+            if cache.get(key):
+                return
+            for orguser in OrgUser.objects.filter(userprofile__user=request.user, seen=False):
                 # NOTE: We rely on post_save signal, hence can't use update()
                 orguser.seen = True
                 orguser.save()
+            cache.set(key, True, settings.ORGUSER_SEEN_CACHE_TIMEOUT)
+
+
+class PermissionFactsMiddleware(object):
+    """
+    Memoize permission facts of user (represented and observed organizations, roles, etc.)
+    for the duration of request.
+    NOTE: It should be placed after AuthenticationMiddleware
+    """
+    def process_request(self, request):
+        request.user.perm_facts = PermissionFacts(request.user)
 
 
 class StaticDataInitMiddleware(object):
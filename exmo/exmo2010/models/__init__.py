@@ -32,6 +32,11 @@ from .questionnaire import *
 from .score import *
 from .static_page import *
 from .task import *
+from .task_openness import *
 from .text_fragments import *
 from .userprofile import *
 from .observers_group import *
+
+# Connect signal handlers, which invalidate cached pages and precomputed exports.
+from exmo2010 import view_cache
+from exmo2010 import export_artifacts
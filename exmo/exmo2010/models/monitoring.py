@@ -19,7 +19,6 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 from django.contrib.auth.models import User
-from django.contrib.comments.models import Comment
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext_lazy
@@ -93,7 +92,7 @@ class Monitoring(BaseModel):
         """
         Calculate monitoring rating, annotate each approved task with openness and place in the resulting
          rating list
-        Rerturns sorted tasks queryset
+        Rerturns sorted tasks list
         Kwargs:
             rating_type (str): possible values are ['user', 'other', 'npa']
 
@@ -102,25 +101,38 @@ class Monitoring(BaseModel):
 
         """
         from .task import Task
+        from .task_openness import TaskOpenness, update_task_openness
 
-        if rating_type == 'npa':
-            parameters = self.parameter_set.filter(npa=True)
-        elif rating_type == 'other':
-            parameters = self.parameter_set.filter(npa=False)
-        elif rating_type != 'user':
-            parameters = None  # Use all parameters
+        if rating_type == 'user' and parameters is not None:
+            if not parameters:
+                # Parameters filter was given empty. Rating calculation is impossible.
+                return []
 
-        if not parameters and parameters is not None:
-            # Parameters filter was given empty. Rating calculation is impossible.
-            return []
+            sql_openness = self.openness_expression.get_sql_openness(parameters)
+            sql_openness_initial = self.openness_expression.get_sql_openness(parameters, initial=True)
 
-        sql_openness = self.openness_expression.get_sql_openness(parameters)
-        sql_openness_initial = self.openness_expression.get_sql_openness(parameters, initial=True)
-
-        tasks = Task.approved_tasks.filter(organization__monitoring=self).extra(
-            select={'task_openness': sql_openness, 'task_openness_initial': sql_openness_initial},
-            where=['%s IS NOT NULL' % sql_openness],
-            order_by=['-task_openness']).select_related('organization').distinct()
+            tasks = Task.approved_tasks.filter(organization__monitoring=self).extra(
+                select={'task_openness': sql_openness, 'task_openness_initial': sql_openness_initial},
+                where=['%s IS NOT NULL' % sql_openness],
+                order_by=['-task_openness']).select_related('organization').distinct()
+        else:
+            # Use materialized openness for predefined rating types.
+            if rating_type not in TaskOpenness.RATING_TYPES:
+                rating_type = 'all'
+
+            update_task_openness(self)
+            rows = TaskOpenness.objects.filter(
+                monitoring=self,
+                rating_type=rating_type,
+                openness_code=self.openness_expression_id,
+                openness__isnull=False,
+                task__status=Task.TASK_APPROVED).select_related('task__organization').order_by('-openness')
+
+            tasks = []
+            for row in rows:
+                row.task.task_openness = row.openness
+                row.task.task_openness_initial = row.openness_initial
+                tasks.append(row.task)
 
         previous_openness = None
         place = 0
@@ -147,49 +159,49 @@ class Monitoring(BaseModel):
     def statistics(self):
         """
         Метод, возвращающий словарь со статистикой по мониторингу.
+        Statistics is cached with version of monitoring data, see exmo2010.view_cache.
+
+        """
+        from ..view_cache import cached_view_data, monitoring_version
+
+        key = 'monitoring_statistics:%s:%s' % (self.pk, monitoring_version(self.pk))
+        return cached_view_data(key, self.compute_statistics)
 
+    def compute_statistics(self):
         """
+        Calculate monitoring statistics with aggregate queries scoped by monitoring.
+
+        """
+        from custom_comments.models import CommentExmo
         from .task import Task
-        from .score import Score
-        from .userprofile import UserProfile
+        from .task_openness import TaskOpenness, update_task_openness
 
         stat = {}
-        scores = list(Score.objects.filter(task__organization__monitoring=self).values_list('pk', flat=True))
-        orgs = list(self.organization_set.values_list('pk', flat=True))
-        stat['organization'] = len(orgs)
-
+        stat['organization'] = self.organization_set.count()
         stat['organization_rated'] = Task.approved_tasks.filter(organization__monitoring=self).count()
-        orgusers = User.objects.filter(userprofile__organization__in=orgs, userprofile__orguser__seen=True)
-        orgusers = set(orgusers.values_list('pk', flat=True))
 
-        stat['organization_users'] = len(orgusers)
+        orgusers = User.objects.filter(userprofile__orguser__organization__monitoring=self,
+                                       userprofile__orguser__seen=True)
+        stat['organization_users'] = orgusers.distinct().count()
 
-        active_orgusers = {
-            'user__comment_comments__object_pk__in': scores,
-            'organization__in': orgs,
-            'orguser__seen': True
-        }
-        stat['organization_users_active'] = UserProfile.objects.filter(**active_orgusers).distinct().count()
+        comments = CommentExmo.objects.filter(content_type__model='score', monitoring_id=self.pk)
+        orguser_comments = comments.filter(user__in=orgusers.values('pk'))
+        stat['organization_users_active'] = orguser_comments.values('user').distinct().count()
 
         stat['expert'] = User.objects.filter(task__organization__monitoring=self).distinct().count()
 
-        stat['comment_organization'] = Comment.objects.filter(
-            content_type__model='score',
-            object_pk__in=scores,
-            user__in=orgusers
-        ).count()
-
-        stat['comment_expert'] = Comment.objects.filter(
-            content_type__model='score',
-            object_pk__in=scores
-        ).exclude(user__in=orgusers).count()
-
-        rating_list = self.rating()
-        if rating_list:
-            stat['avg_openness'] = sum(t.task_openness for t in rating_list) / len(rating_list)
-            stat['avg_openness_initial'] = sum(t.task_openness_initial for t in rating_list) / len(rating_list)
-        else:
-            stat.update(avg_openness=None, avg_openness_initial=None)
+        stat['comment_organization'] = orguser_comments.count()
+        stat['comment_expert'] = comments.count() - stat['comment_organization']
+
+        update_task_openness(self)
+        openness = TaskOpenness.objects.filter(
+            monitoring=self,
+            rating_type='all',
+            openness_code=self.openness_expression_id,
+            openness__isnull=False,
+            task__status=Task.TASK_APPROVED).aggregate(avg_openness=models.Avg('openness'),
+                                                       avg_openness_initial=models.Avg('openness_initial'))
+        stat.update(openness)
         return stat
 
     @property
@@ -49,6 +49,22 @@ def generate_inv_code(ch_nr):
     return "".join(random.sample(INV_CODE_CHARS, ch_nr))
 
 
+def generate_inv_codes(count, ch_nr=6):
+    """
+    Generate given number of distinct invitation codes, which are not used by any organization yet.
+
+    """
+    codes = set()
+    while len(codes) < count:
+        candidates = set(generate_inv_code(ch_nr) for i in range(count - len(codes))) - codes
+        candidates_list = list(candidates)
+        for i in range(0, len(candidates_list), 500):
+            used = Organization.objects.filter(inv_code__in=candidates_list[i:i + 500]).values_list('inv_code', flat=True)
+            candidates -= set(used)
+        codes |= candidates
+    return list(codes)
+
+
 phone_re = re.compile(r'([+()\d\s\-]{3,25})')
 email_re = re.compile(r'([0-9a-zA-Z]([-\.\w]*[0-9a-zA-Z])*@([0-9a-zA-Z][-\w]*[0-9a-zA-Z]\.)+[a-zA-Z]{2,9})')
 delimiters_re = re.compile(r',|\s||(,\s)|\n|(,\n)')
@@ -122,7 +122,8 @@ class Score(BaseModel):
             # in database, which have empty recommendations, but rated to non-maximum. Reevaluating those
             # scores to maximum should be possible, even if recommendations does not change (empty).
             if self.pk and self.parameter.monitoring.status in (INT, FIN):
-                db_score = Score.objects.get(pk=self.pk)
+                # Score state before changes may be given by bulk import to avoid extra query.
+                db_score = getattr(self, 'db_score', None) or Score.objects.get(pk=self.pk)
                 if self.recommendations == db_score.recommendations:
                     for crit in criteria:
                         if getattr(self, crit) != getattr(db_score, crit):
@@ -140,6 +141,14 @@ class Score(BaseModel):
         return result
 
     def save(self, *args, **kwargs):
+        self.prepare_save()
+        super(Score, self).save(*args, **kwargs)
+
+    def prepare_save(self):
+        """
+        Normalize fields before saving. Should be called explicitly if score is saved with bulk queries.
+
+        """
         if self.pk is not None:
             self.accomplished = True
 
@@ -154,52 +163,19 @@ class Score(BaseModel):
             for crit in self.parameter.OPTIONAL_CRITERIA:
                 setattr(self, crit, None)
 
-        super(Score, self).save(*args, **kwargs)
-
     @models.permalink
     def get_absolute_url(self):
         return ('exmo2010:score', [str(self.id)])
 
     @property
     def openness(self):
-        complete = 1
-        topical = 1
-        accessible = 1
-        hypertext = 1
-        document = 1
-        image = 1
-        param = self.parameter
-
-        if param.complete:
-            if self.complete == 1:
-                complete = 0.2
-            elif self.complete == 2:
-                complete = 0.5
-
-        if param.topical:
-            if self.topical == 1:
-                topical = 0.7
-            elif self.topical == 2:
-                topical = 0.85
-
-        if param.accessible:
-            if self.accessible == 1:
-                accessible = 0.9
-            elif self.accessible == 2:
-                accessible = 0.95
-
-        if param.hypertext and self.hypertext == 0:
-            hypertext = 0.2
-
-        if param.document and self.document == 0:
-            document = 0.85
-
-        if param.image and self.image == 0:
-            image = 0.95
-
-        result = self.found * complete * topical * accessible * hypertext * document * image * 100.0
+        """
+        Score openness in percents without parameter weight, calculated with monitoring openness expression.
 
-        return result
+        """
+        from ..openness import score_openness
+
+        return score_openness(self.parameter.monitoring.openness_expression_id, self.parameter, self)
 
     def add_clarification(self, creator, comment):
         clarification = Clarification(score=self, creator=creator, comment=clean_message(comment))
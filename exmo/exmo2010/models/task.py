@@ -22,6 +22,7 @@ from datetime import date
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Count, F
 from django.utils.translation import ugettext, ugettext_lazy as _
 
 from .base import BaseModel
@@ -65,7 +66,8 @@ class Task(BaseModel):
     close_date = models.DateField(null=True, blank=True, verbose_name=_('close date'), editable=False)
 
     def relevant_scores(self):
-        return self.score_set.filter(revision=Score.REVISION_DEFAULT).exclude(parameter__exclude=self.organization)
+        return self.score_set.filter(revision=Score.REVISION_DEFAULT).exclude(parameter__exclude=self.organization)\
+                             .select_related('parameter__monitoring')
 
     @property
     def openness_initial(self):
@@ -149,28 +151,24 @@ class Task(BaseModel):
 
     @property
     def completeness(self):
-        monitoring = self.organization.monitoring_id
-        parameters_num = Parameter.objects.filter(monitoring=monitoring).exclude(exclude=self.organization).count()
-        if parameters_num:
-            questions_num = QQuestion.objects.filter(questionnaire__monitoring=monitoring).count()
-            answers_num = len(self.qanswer_set.all())
-            scores_num = Score.objects.filter(task=self, parameter__monitoring=monitoring)\
-                                      .filter(revision=Score.REVISION_DEFAULT, accomplished=True)\
-                                      .exclude(parameter__exclude=self.organization).count()
-            completeness = (scores_num + answers_num) * 100.0 / (parameters_num + questions_num)
-        else:
-            completeness = 0
+        """
+        Percent of accomplished scores of relevant parameters and questionnaire answers. Value
+        precalculated by annotate_completeness() is used, if any.
 
-        return completeness
+        """
+        if hasattr(self, '_completeness'):
+            return self._completeness
+        return tasks_completeness([self])[self.pk]
 
-    def get_rating_place(self, parameters=None):
+    def get_rating_place(self, rating_type='all'):
         """
         Если задача в рейтинге (одобрена), то вернет место в
         рейтинге относительно прочих задач
 
         """
-        task_places = {t.pk: t.place for t in self.organization.monitoring.rating(parameters)}
-        return task_places.get(self.pk)
+        from .task_openness import get_rating_place
+
+        return get_rating_place(self, rating_type)
 
     @property
     def rating_place(self):
@@ -178,19 +176,11 @@ class Task(BaseModel):
 
     @property
     def rating_place_npa(self):
-        params = self.organization.monitoring.parameter_set.filter(npa=True)
-        if params.exists():
-            return self.get_rating_place(params)
-        else:
-            return None
+        return self.get_rating_place('npa')
 
     @property
     def rating_place_other(self):
-        params = self.organization.monitoring.parameter_set.filter(npa=False)
-        if params.exists():
-            return self.get_rating_place(params)
-        else:
-            return None
+        return self.get_rating_place('other')
 
     open = property(_get_open, _set_open)
     ready = property(_get_ready, _set_ready)
@@ -252,3 +242,54 @@ class TaskHistory(BaseModel):
         ordering = (
             'timestamp',
         )
+
+
+def _counts(queryset, field):
+    # Values are used, as values_list of translated models drops annotations.
+    return dict((row[field], row['num']) for row in queryset.values(field).annotate(num=Count('pk')).order_by())
+
+
+def tasks_completeness(tasks):
+    """
+    Return completeness of given tasks by task pk. Number of queries does not depend on number of tasks.
+
+    """
+    tasks = list(tasks)
+    task_pks = [t.pk for t in tasks]
+    org_pks = set(t.organization_id for t in tasks)
+    org_monitorings = dict(Organization.objects.filter(pk__in=org_pks).values_list('pk', 'monitoring').order_by())
+    monitoring_pks = set(org_monitorings.values())
+
+    parameters_num = _counts(Parameter.objects.filter(monitoring__in=monitoring_pks), 'monitoring')
+    excluded_num = _counts(Parameter.exclude.through.objects.filter(
+        organization__in=org_pks, parameter__monitoring=F('organization__monitoring')), 'organization')
+    questions_num = _counts(QQuestion.objects.filter(questionnaire__monitoring__in=monitoring_pks),
+                            'questionnaire__monitoring')
+    answers_num = _counts(QAnswer.objects.filter(task__in=task_pks), 'task')
+    scores = Score.objects.filter(task__in=task_pks, revision=Score.REVISION_DEFAULT, accomplished=True,
+                                  parameter__monitoring=F('task__organization__monitoring'))
+    scores_num = _counts(scores, 'task')
+    excluded_scores_num = _counts(scores.filter(parameter__exclude=F('task__organization')), 'task')
+
+    completeness = {}
+    for task in tasks:
+        monitoring_pk = org_monitorings.get(task.organization_id)
+        relevant_num = parameters_num.get(monitoring_pk, 0) - excluded_num.get(task.organization_id, 0)
+        if relevant_num:
+            done_num = scores_num.get(task.pk, 0) - excluded_scores_num.get(task.pk, 0) + answers_num.get(task.pk, 0)
+            completeness[task.pk] = done_num * 100.0 / (relevant_num + questions_num.get(monitoring_pk, 0))
+        else:
+            completeness[task.pk] = 0
+    return completeness
+
+
+def annotate_completeness(tasks):
+    """
+    Precalculate completeness of given tasks with a few grouped queries. Return list of tasks.
+
+    """
+    tasks = list(tasks)
+    completeness = tasks_completeness(tasks)
+    for task in tasks:
+        task._completeness = completeness[task.pk]
+    return tasks
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from .base import BaseModel
+from .monitoring import Monitoring
+from .parameter import Parameter
+from .score import Score
+from .task import Task
+
+
+class TaskOpenness(BaseModel):
+    """
+    Materialized task openness and openness initial, calculated with monitoring openness expression
+    for all parameters ('all'), normative ('npa') and recommendatory ('other') parameters.
+
+    Rows are deleted whenever scores, parameters or parameter exclusions change and are lazily
+    recalculated for outdated tasks only, see `update_task_openness`. Rows calculated with another
+    openness expression code are considered outdated.
+
+    """
+    class Meta(BaseModel.Meta):
+        unique_together = (('task', 'rating_type'),)
+
+    RATING_TYPES = ('all', 'npa', 'other')
+
+    task = models.ForeignKey(Task)
+    monitoring = models.ForeignKey(Monitoring)
+    rating_type = models.CharField(max_length=5)
+    openness_code = models.PositiveIntegerField()
+    openness = models.FloatField(null=True)
+    openness_initial = models.FloatField(null=True)
+
+
+class TaskOpennessVersion(BaseModel):
+    """
+    Version of task data, which task openness depends on. It is increased whenever materialized
+    openness of task is deleted, so that openness calculated from data read before the change is
+    never stored, see `update_task_openness`. Tasks without version row have version 0.
+
+    """
+    task = models.OneToOneField(Task, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+
+
+def update_task_openness(monitoring):
+    """
+    Calculate and store openness of monitoring tasks, which have no actual materialized openness.
+    All rating types of outdated tasks are calculated in memory by OpennessEngine.
+
+    Openness is stored only for tasks, which data version is not changed since calculation started.
+    Versions are checked with lock, so concurrent change either is seen here or deletes stored rows
+    after this transaction is committed.
+
+    """
+    from ..openness import OpennessEngine
+
+    actual = TaskOpenness.objects.filter(
+        monitoring=monitoring, rating_type='all', openness_code=monitoring.openness_expression_id)
+    tasks = Task.objects.filter(organization__monitoring=monitoring).exclude(pk__in=actual.values('task_id'))
+    task_pks = list(tasks.values_list('pk', flat=True))
+    if not task_pks:
+        return
+
+    versions = _openness_versions(task_pks)
+    engine = OpennessEngine.for_monitoring(monitoring, tasks=task_pks)
+    openness = [(rating_type, engine.tasks_openness(npa=npa))
+                for rating_type, npa in [('all', None), ('npa', True), ('other', False)]]
+
+    # Concurrent request may store openness of the same tasks in the meantime. Its rows are as good
+    # as ours, so unique constraint violation is ignored.
+    sid = transaction.savepoint() if transaction.is_managed() else None
+    try:
+        current = _openness_versions(task_pks, lock=True)
+        task_pks = set(pk for pk in task_pks if current.get(pk, 0) == versions.get(pk, 0))
+        objects = []
+        for rating_type, tasks_openness in openness:
+            for task_pk, (task_openness, openness_initial) in tasks_openness.iteritems():
+                if task_pk not in task_pks:
+                    continue
+                objects.append(TaskOpenness(
+                    task_id=task_pk,
+                    monitoring=monitoring,
+                    rating_type=rating_type,
+                    openness_code=engine.code,
+                    openness=task_openness,
+                    openness_initial=openness_initial))
+        TaskOpenness.objects.filter(task__in=task_pks).delete()
+        TaskOpenness.objects.bulk_create(objects)
+    except IntegrityError:
+        if sid:
+            transaction.savepoint_rollback(sid)
+    else:
+        if sid:
+            transaction.savepoint_commit(sid)
+    _invalidate_rating_index([monitoring.pk])
+
+
+def _openness_versions(task_pks, lock=False):
+    versions = TaskOpennessVersion.objects.filter(task__in=task_pks)
+    if lock:
+        # Locking read sees versions committed by other transactions after this one has started.
+        versions = versions.select_for_update()
+    return dict(versions.values_list('task_id', 'version'))
+
+
+def _increase_openness_versions(task_pks):
+    """
+    Increase data versions of tasks, creating missing version rows.
+
+    """
+    task_pks = set(task_pks)
+    existing = set(_openness_versions(task_pks, lock=True))
+    TaskOpennessVersion.objects.filter(task__in=existing).update(version=F('version') + 1)
+    missing = task_pks - existing
+    if not missing:
+        return
+
+    sid = transaction.savepoint() if transaction.is_managed() else None
+    try:
+        TaskOpennessVersion.objects.bulk_create([TaskOpennessVersion(task_id=pk, version=1) for pk in missing])
+    except IntegrityError:
+        # Concurrent request has created missing version rows in the meantime.
+        if sid:
+            transaction.savepoint_rollback(sid)
+        TaskOpennessVersion.objects.filter(task__in=missing).update(version=F('version') + 1)
+    else:
+        if sid:
+            transaction.savepoint_commit(sid)
+
+
+def update_monitorings_openness(monitorings):
+    """
+    Batch version of `update_task_openness`. Monitorings having outdated tasks are found with single query.
+
+    """
+    actual = TaskOpenness.objects.filter(rating_type='all', openness_code=F('monitoring__openness_expression'))
+    outdated = Task.objects.filter(organization__monitoring__in=monitorings).exclude(pk__in=actual.values('task_id'))
+    outdated_monitorings = set(outdated.values_list('organization__monitoring', flat=True))
+    for monitoring in monitorings:
+        if monitoring.pk in outdated_monitorings:
+            update_task_openness(monitoring)
+
+
+def _rating_index_key(monitoring_pk, rating_type):
+    from ..view_cache import monitoring_version
+
+    # Version of monitoring data is dropped in shared cache by any process, which changes scores.
+    return 'rating_index:%s:%s:%s' % (monitoring_pk, monitoring_version(monitoring_pk), rating_type)
+
+
+def _invalidate_rating_index(monitoring_pks):
+    from ..view_cache import view_cache_enabled
+
+    if view_cache_enabled():
+        cache.delete_many([_rating_index_key(pk, t) for pk in monitoring_pks for t in TaskOpenness.RATING_TYPES])
+
+
+def get_rating_index(monitoring, rating_type='all'):
+    """
+    Sorted list of distinct openness values of approved tasks in monitoring rating. Materialized
+    openness should be updated beforehand. Index is cached only if cache is shared between processes
+    and is invalidated whenever materialized openness of monitoring tasks is changed.
+
+    """
+    from ..view_cache import view_cache_enabled
+
+    def build_index():
+        rows = TaskOpenness.objects.filter(
+            monitoring=monitoring,
+            rating_type=rating_type,
+            openness_code=monitoring.openness_expression_id,
+            openness__isnull=False,
+            task__status=Task.TASK_APPROVED)
+        return sorted(set(rows.values_list('openness', flat=True)))
+
+    if not view_cache_enabled():
+        return build_index()
+
+    key = _rating_index_key(monitoring.pk, rating_type)
+    index = cache.get(key)
+    if index is None:
+        index = build_index()
+        cache.set(key, index, settings.VIEW_CACHE_TIMEOUT)
+    return index
+
+
+def get_rating_place(task, rating_type='all'):
+    """
+    Place of approved task in monitoring rating of given type, or None if task is not in rating.
+    Tasks with equal openness share same place, so place is the number of distinct
+    openness values greater than or equal to task openness.
+
+    """
+    if not task.approved:
+        return None
+    monitoring = task.organization.monitoring
+    update_task_openness(monitoring)
+    index = get_rating_index(monitoring, rating_type)
+    openness = TaskOpenness.objects.filter(
+        task=task, rating_type=rating_type, openness_code=monitoring.openness_expression_id)\
+        .values_list('openness', flat=True)
+    if not openness or openness[0] is None:
+        return None
+    return len(index) - bisect_left(index, openness[0])
+
+
+def _delete_task_openness(tasks):
+    # Version is increased before rows are deleted, so openness being stored by concurrent
+    # transaction is either not stored or deleted here after that transaction is committed.
+    task_pks = dict(tasks.values_list('pk', 'organization__monitoring'))
+    _increase_openness_versions(task_pks)
+    TaskOpenness.objects.filter(task__in=task_pks).delete()
+    _invalidate_rating_index(set(task_pks.values()))
+
+
+def invalidate_task_openness(task_pk):
+    """
+    Delete materialized openness of task. Should be called explicitly when scores are changed with bulk queries.
+
+    """
+    _delete_task_openness(Task.objects.filter(pk=task_pk))
+
+
+def _score_changed(sender, instance, **kwargs):
+    invalidate_task_openness(instance.task_id)
+
+
+def _task_changed(sender, instance, created, **kwargs):
+    if not created:
+        # Task organization or status may be changed.
+        _delete_task_openness(Task.objects.filter(pk=instance.pk))
+
+
+def _task_deleted(sender, instance, **kwargs):
+    # Materialized openness and version rows will be deleted by cascade.
+    rows = TaskOpenness.objects.filter(task=instance)
+    _invalidate_rating_index(set(rows.values_list('monitoring_id', flat=True)))
+
+
+def _parameter_changed(sender, instance, **kwargs):
+    # Parameter weight, criteria or type affect openness of all tasks in monitoring.
+    _delete_task_openness(Task.objects.filter(organization__monitoring=instance.monitoring_id))
+
+
+def _parameter_exclude_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # Parameters exclusion was changed from the organization side.
+        _delete_task_openness(Task.objects.filter(organization=instance))
+    elif pk_set is None:
+        _delete_task_openness(Task.objects.filter(organization__monitoring=instance.monitoring_id))
+    else:
+        _delete_task_openness(Task.objects.filter(organization__in=pk_set))
+
+
+post_save.connect(_score_changed, sender=Score)
+post_delete.connect(_score_changed, sender=Score)
+post_save.connect(_task_changed, sender=Task)
+pre_delete.connect(_task_deleted, sender=Task)
+post_save.connect(_parameter_changed, sender=Parameter)
+post_delete.connect(_parameter_changed, sender=Parameter)
+m2m_changed.connect(_parameter_exclude_changed, sender=Parameter.exclude.through)
@@ -20,6 +20,7 @@
 #
 from django.contrib import auth
 from django.contrib.auth.models import Group, User, AnonymousUser
+from django.core.cache import cache
 from django.db.models import (
     ForeignKey, PositiveSmallIntegerField, CharField, BooleanField, ManyToManyField, OneToOneField, DateTimeField)
 from django.db.models.signals import post_save
@@ -30,7 +31,7 @@ from .claim import Claim
 from .clarification import Clarification
 from .monitoring import PRE, RATE, RES, INT, FIN
 from .organization import Organization
-from .score import Score
+from .task import Task
 
 from ..columns_picker import ColumnsPickerModel
 
@@ -39,7 +40,10 @@ def check_role(user, groups):
     if user.is_superuser and 'expert' in ''.join(groups):
         # Superuser have expert rights
         return True
-    return bool(set(groups) & set(user.groups.values_list('name', flat=True)))
+    if not hasattr(user, '_group_names'):
+        # Roles are checked many times per request, group names are fetched once per user instance.
+        user._group_names = set(user.groups.values_list('name', flat=True))
+    return bool(set(groups) & user._group_names)
 
 
 def group_property(group):
@@ -48,6 +52,7 @@ def group_property(group):
     def _setter(self, val):
         action = self.user.groups.add if val else self.user.groups.remove
         action(Group.objects.get(name=group))
+        self.user.__dict__.pop('_group_names', None)
 
     _getter = lambda self: check_role(self.user, [group])
 
@@ -70,6 +75,18 @@ class OrgUser(BaseModel):
     # monitoring is copied. Will be reset to True in OrguserTrackingMiddleware.
     seen = BooleanField(default=True)
 
+    @staticmethod
+    def seen_cache_key(user_pk):
+        """
+        Cache key of the flag, which is set by OrguserTrackingMiddleware when all links of the user are seen.
+
+        """
+        return 'orguser_seen:%s' % user_pk
+
+    @staticmethod
+    def reset_seen_cache(user_pks):
+        cache.delete_many([OrgUser.seen_cache_key(pk) for pk in user_pks])
+
 
 class UserProfile(BaseModel, ColumnsPickerModel):
     """
@@ -163,7 +180,7 @@ class UserProfile(BaseModel, ColumnsPickerModel):
         Возвращает queryset из коментов представителей организаций на которые не был дан ответ
         """
         from custom_comments.models import CommentExmo
-        return CommentExmo.objects.filter(object_pk__in=Score.objects.filter(task__user=self.user),
+        return CommentExmo.objects.filter(task_id__in=Task.objects.filter(user=self.user),
                                           content_type__model='score',
                                           user__groups__name=UserProfile.organization_group,
                                           status=CommentExmo.OPEN)\
@@ -174,7 +191,7 @@ class UserProfile(BaseModel, ColumnsPickerModel):
         Возвращает queryset из коментов представителей организаций на которые был дан ответ экспертом
         """
         from custom_comments.models import CommentExmo
-        return CommentExmo.objects.filter(object_pk__in=Score.objects.filter(task__user=self.user),
+        return CommentExmo.objects.filter(task_id__in=Task.objects.filter(user=self.user),
                                           content_type__model='score',
                                           user__groups__name=UserProfile.organization_group,
                                           status=CommentExmo.ANSWERED)\
@@ -319,3 +336,15 @@ def orguser_saved(sender, instance, created, **kwargs):
 
 
 post_save.connect(orguser_saved, sender=OrgUser)
+
+
+def orguser_unseen_saved(sender, instance, **kwargs):
+    """
+    Make OrguserTrackingMiddleware check links of the user again.
+
+    """
+    if not instance.seen:
+        OrgUser.reset_seen_cache(UserProfile.objects.filter(pk=instance.userprofile_id).values_list('user', flat=True))
+
+
+post_save.connect(orguser_unseen_saved, sender=OrgUser)
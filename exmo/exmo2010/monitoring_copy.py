@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Bulk copy of monitoring data to another (new) monitoring.
+
+Every kind of objects is inserted with bulk_create. Since bulk_create does not return primary keys,
+pks of copied objects are remapped afterwards by natural keys: invitation code of organization,
+user and organization of task, code of parameter.
+
+"""
+from copy import deepcopy
+
+from .models import Organization, OrgUser, Parameter, Score, Task, TaskHistory, generate_inv_codes
+from .view_cache import invalidate_monitoring_views
+
+
+BATCH_SIZE = 3000
+
+
+def _clone(obj, **changes):
+    copied = deepcopy(obj)
+    copied.id = None
+    for attr, value in changes.items():
+        setattr(copied, attr, value)
+    return copied
+
+
+class MonitoringCopy(object):
+    """
+    Copy organizations, tasks, parameters with exclusions, scores and representatives of origin
+    monitoring to the target monitoring. Donors is a set of MonitoringCopyForm.DONORS choices.
+
+    """
+    def __init__(self, origin, monitoring, donors):
+        self.origin = origin
+        self.monitoring = monitoring
+        self.donors = donors
+        self.organization_map = {}
+        self.task_map = {}
+        self.parameter_map = {}
+
+    def steps(self):
+        steps = [self.copy_organizations]
+        if 'tasks' in self.donors:
+            steps.append(self.copy_tasks)
+        if 'parameters' in self.donors:
+            steps.append(self.copy_parameters)
+        if {'all_scores', 'current_scores'} & set(self.donors):
+            steps.append(self.copy_scores)
+        if 'representatives' in self.donors:
+            steps.append(self.copy_representatives)
+        return steps
+
+    def run(self, progress=None):
+        """
+        Copy all data. Progress callback, if given, is called with number of done and total steps.
+
+        """
+        steps = self.steps()
+        for done, step in enumerate(steps, start=1):
+            step()
+            if progress:
+                progress(done, len(steps))
+        # Objects are inserted with bulk_create, which sends no signals.
+        invalidate_monitoring_views([self.monitoring.pk])
+
+    def copy_organizations(self):
+        orgs = list(Organization.objects.filter(monitoring=self.origin).order_by())
+        inv_codes = generate_inv_codes(len(orgs))
+        Organization.objects.bulk_create(
+            [_clone(org, monitoring=self.monitoring, inv_status='NTS', inv_code=inv_code)
+             for org, inv_code in zip(orgs, inv_codes)], batch_size=BATCH_SIZE)
+
+        new_pks = dict(Organization.objects.filter(monitoring=self.monitoring).values_list('inv_code', 'pk'))
+        self.organization_map = dict((org.pk, new_pks[inv_code]) for org, inv_code in zip(orgs, inv_codes))
+
+    def copy_tasks(self):
+        tasks = Task.objects.filter(organization__monitoring=self.origin).order_by()
+        Task.objects.bulk_create(
+            [_clone(task, organization_id=self.organization_map[task.organization_id]) for task in tasks],
+            batch_size=BATCH_SIZE)
+
+        new_tasks = Task.objects.filter(organization__monitoring=self.monitoring)\
+            .select_related('user__userprofile', 'organization')
+        new_pks = dict(((t.user_id, t.organization_id), t.pk) for t in new_tasks)
+        self.task_map = dict(
+            (t.pk, new_pks[t.user_id, self.organization_map[t.organization_id]]) for t in tasks)
+
+        # Same side effects as Task.save() has for new tasks.
+        TaskHistory.objects.bulk_create(
+            [TaskHistory(task=t, user_id=t.user_id, status=self.monitoring.status) for t in new_tasks],
+            batch_size=BATCH_SIZE)
+        from .mail import mail_task_assigned
+        for task in new_tasks:
+            mail_task_assigned(task)
+
+    def copy_parameters(self):
+        params = Parameter.objects.filter(monitoring=self.origin).order_by()
+        Parameter.objects.bulk_create([_clone(param, monitoring=self.monitoring) for param in params],
+                                      batch_size=BATCH_SIZE)
+
+        new_pks = dict(Parameter.objects.filter(monitoring=self.monitoring).values_list('code', 'pk'))
+        self.parameter_map = dict((param.pk, new_pks[param.code]) for param in params)
+
+        Exclude = Parameter.exclude.through
+        exclusions = Exclude.objects.filter(parameter__monitoring=self.origin)
+        Exclude.objects.bulk_create(
+            [Exclude(parameter_id=self.parameter_map[param_pk], organization_id=self.organization_map[org_pk])
+             for param_pk, org_pk in exclusions.values_list('parameter_id', 'organization_id')],
+            batch_size=BATCH_SIZE)
+
+    def copy_scores(self):
+        scores = Score.objects.filter(task__organization__monitoring=self.origin,
+                                      parameter__monitoring=self.origin).order_by()
+        if 'all_scores' not in self.donors:
+            scores = scores.filter(revision=Score.FINAL)
+
+        bulk_of_scores = [
+            _clone(score, task_id=self.task_map[score.task_id], parameter_id=self.parameter_map[score.parameter_id])
+            for score in scores]
+
+        # Disable 'auto_now' option to copy 'last_modified' field as is
+        field = Score._meta.get_field('last_modified')
+        field.auto_now = False
+        try:
+            Score.objects.bulk_create(bulk_of_scores, batch_size=BATCH_SIZE)
+        finally:
+            field.auto_now = True
+
+    def copy_representatives(self):
+        orgusers = OrgUser.objects.filter(organization__monitoring=self.origin)\
+            .values_list('userprofile_id', 'organization_id').distinct()
+        OrgUser.objects.bulk_create(
+            [OrgUser(organization_id=self.organization_map[org_pk], userprofile_id=profile_pk, seen=False)
+             for profile_pk, org_pk in orgusers], batch_size=BATCH_SIZE)
+        # Same side effect as OrgUser.save() has for unseen links.
+        OrgUser.reset_seen_cache(
+            OrgUser.objects.filter(organization__monitoring=self.monitoring).values_list('userprofile__user', flat=True))
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+In-process openness calculation, equivalent to SQL expressions from core.sql.
+
+Every criterion factor of openness formula is a whole number of percents, so score openness is
+calculated as integer product of factors in percents, scaled to UNIT. Sums of integers do not
+depend on summation order and are exact, single rounding happens on final division. This gives
+the same results for equal scores, which is important for rating places.
+
+"""
+from __future__ import division
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.utils.translation import ugettext
+
+from .models import Parameter, Score, Task
+
+
+CRITERIA = Parameter.OPTIONAL_CRITERIA
+COMPLETE, TOPICAL, ACCESSIBLE, HYPERTEXT, DOCUMENT, IMAGE = range(len(CRITERIA))
+
+# Openness of score with all criteria rated at maximum. Each of 6 factors is in percents.
+UNIT = 100 ** len(CRITERIA)
+
+_COMPLETE = {1: 20, 2: 50}
+_TOPICAL = {1: 70, 2: 85}
+_ACCESSIBLE = {1: 90, 2: 95}
+
+
+def _factors_v1(param, score):
+    result = 100 ** 2
+    result *= _COMPLETE.get(score[COMPLETE], 100) if param[COMPLETE] else 100
+    result *= _TOPICAL.get(score[TOPICAL], 100) if param[TOPICAL] else 100
+    result *= _ACCESSIBLE.get(score[ACCESSIBLE], 100) if param[ACCESSIBLE] else 100
+    if not param[HYPERTEXT] or score[HYPERTEXT] is None:
+        result *= 100
+    elif score[HYPERTEXT] == 0:
+        result *= 20
+    elif param[DOCUMENT] and score[DOCUMENT] == 0:
+        result *= 90
+    else:
+        result *= 100
+    return result
+
+
+def _factors_v8(param, score):
+    result = _COMPLETE.get(score[COMPLETE], 100) if param[COMPLETE] else 100
+    result *= _TOPICAL.get(score[TOPICAL], 100) if param[TOPICAL] else 100
+    result *= _ACCESSIBLE.get(score[ACCESSIBLE], 100) if param[ACCESSIBLE] else 100
+    result *= 20 if param[HYPERTEXT] and score[HYPERTEXT] == 0 else 100
+    result *= 85 if param[DOCUMENT] and score[DOCUMENT] == 0 else 100
+    result *= 95 if param[IMAGE] and score[IMAGE] == 0 else 100
+    return result
+
+
+FACTORS = {1: _factors_v1, 8: _factors_v8}
+
+
+def get_factors(code):
+    try:
+        return FACTORS[code]
+    except KeyError:
+        raise ValidationError(ugettext('Unknown OpennessExpression code'))
+
+
+def score_openness_units(code, found, param_criteria, score_criteria):
+    """
+    Score openness without parameter weight, scaled to UNIT.
+
+    """
+    if not found:
+        return 0
+    return found * get_factors(code)(param_criteria, score_criteria)
+
+
+def score_openness(code, parameter, score):
+    """
+    Score openness in percents without parameter weight (as shown on score page).
+
+    """
+    units = score_openness_units(
+        code, score.found,
+        [getattr(parameter, crit) for crit in CRITERIA],
+        [getattr(score, crit) for crit in CRITERIA])
+    return units * 100 / UNIT
+
+
+class OpennessEngine(object):
+    """
+    Openness calculator for all tasks of monitoring.
+
+    Parameters, exclusions, tasks and scores of monitoring are loaded with 4 queries into
+    plain tuples once, see `for_monitoring`, or taken from already loaded instances, see `for_task`.
+    After that openness and openness initial of every task can be calculated for any parameters
+    subset and openness expression code without any database queries.
+
+    """
+    PARAM_FIELDS = ('pk', 'weight', 'npa') + tuple(CRITERIA)
+    SCORE_FIELDS = ('pk', 'task_id', 'parameter_id', 'revision', 'found') + tuple(CRITERIA)
+
+    def __init__(self, code, params, exclusions, tasks, scores):
+        """
+        Create engine from loaded rows: params and scores are tuples of PARAM_FIELDS and SCORE_FIELDS
+        values, exclusions are (parameter pk, organization pk) pairs, tasks are (task pk, organization pk) pairs.
+
+        """
+        self.code = code
+        self.params = dict((row[0], tuple(row[1:])) for row in params)
+        self.excluded = defaultdict(set)
+        for param_pk, org_pk in exclusions:
+            self.excluded[org_pk].add(param_pk)
+        self.tasks = dict(tasks)
+        self.scores = [tuple(row) for row in scores]
+
+    @classmethod
+    def for_monitoring(cls, monitoring, tasks=None):
+        """
+        Create engine for all tasks of monitoring, or only given tasks pks.
+
+        """
+        params = Parameter.objects.filter(monitoring=monitoring).values_list(*cls.PARAM_FIELDS)
+        exclusions = Parameter.exclude.through.objects.filter(parameter__monitoring=monitoring)\
+                                                      .values_list('parameter_id', 'organization_id')
+        task_qs = Task.objects.filter(organization__monitoring=monitoring)
+        score_qs = Score.objects.filter(task__organization__monitoring=monitoring)
+        if tasks is not None:
+            task_qs = task_qs.filter(pk__in=tasks)
+            score_qs = score_qs.filter(task__in=tasks)
+        return cls(monitoring.openness_expression_id, params, exclusions,
+                   task_qs.values_list('pk', 'organization_id'), score_qs.values_list(*cls.SCORE_FIELDS))
+
+    @classmethod
+    def for_task(cls, task, parameters, excluded, scores, code):
+        """
+        Create engine for single task from already loaded Parameter and Score instances and set of
+        pks of parameters excluded for task organization, without any database queries.
+
+        """
+        return cls(code,
+                   [[getattr(p, f) for f in cls.PARAM_FIELDS] for p in parameters],
+                   [(param_pk, task.organization_id) for param_pk in excluded],
+                   [(task.pk, task.organization_id)],
+                   [[getattr(s, f) for f in cls.SCORE_FIELDS] for s in scores])
+
+    def parameter_pks(self, parameters=None, npa=None):
+        """
+        Return set of selected parameters pks. Parameters may be given as list of Parameter instances or pks.
+
+        """
+        if parameters is None:
+            pks = set(self.params)
+        else:
+            pks = set(getattr(p, 'pk', p) for p in parameters) & set(self.params)
+        if npa is not None:
+            pks = set(pk for pk in pks if self.params[pk][1] == npa)
+        return pks
+
+    def scores_units(self, code=None):
+        """
+        Return dict of score openness without parameter weight, scaled to UNIT, by score pk.
+
+        """
+        factors = get_factors(code or self.code)
+        params = self.params
+        result = {}
+        for pk, task_pk, param_pk, revision, found, crit_1, crit_2, crit_3, crit_4, crit_5, crit_6 in self.scores:
+            if found:
+                result[pk] = found * factors(params[param_pk][2:], (crit_1, crit_2, crit_3, crit_4, crit_5, crit_6))
+            else:
+                result[pk] = 0
+        return result
+
+    def scores_openness(self, code=None):
+        """
+        Return dict of score openness in percents without parameter weight by score pk.
+
+        """
+        return dict((pk, units * 100 / UNIT) for pk, units in self.scores_units(code).iteritems())
+
+    def tasks_openness(self, parameters=None, npa=None, code=None):
+        """
+        Return dict of (openness, openness_initial) tuples by task pk.
+
+        Openness is calculated over final scores. Openness initial is calculated over interim
+        scores or final scores of parameters without interim score. Openness is None if there
+        are no scores or sum of relevant parameters weights is zero.
+
+        """
+        selected = self.parameter_pks(parameters, npa)
+        units = self.scores_units(code)
+        params = self.params
+
+        final = defaultdict(int)
+        interim = defaultdict(int)
+        has_final = set()
+        has_interim = set()
+        interim_keys = set()
+        for pk, task_pk, param_pk, revision, found, crit_1, crit_2, crit_3, crit_4, crit_5, crit_6 in self.scores:
+            if revision == Score.INTERIM:
+                interim_keys.add((task_pk, param_pk))
+
+        for pk, task_pk, param_pk, revision, found, crit_1, crit_2, crit_3, crit_4, crit_5, crit_6 in self.scores:
+            if param_pk not in selected or task_pk not in self.tasks:
+                continue
+            if param_pk in self.excluded[self.tasks[task_pk]]:
+                continue
+            value = params[param_pk][0] * units[pk]
+            if revision == Score.FINAL:
+                final[task_pk] += value
+                has_final.add(task_pk)
+                if (task_pk, param_pk) in interim_keys:
+                    continue
+            interim[task_pk] += value
+            has_interim.add(task_pk)
+
+        weights = {}
+        result = {}
+        for task_pk, org_pk in self.tasks.iteritems():
+            if org_pk not in weights:
+                weights[org_pk] = sum(
+                    params[pk][0] for pk in selected - self.excluded[org_pk] if params[pk][0] >= 0)
+            weight = weights[org_pk]
+            if not weight:
+                result[task_pk] = (None, None)
+                continue
+            result[task_pk] = (
+                final[task_pk] * 100 / (weight * UNIT) if task_pk in has_final else None,
+                interim[task_pk] * 100 / (weight * UNIT) if task_pk in has_interim else None)
+        return result
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+
+from django.contrib.auth.models import User, Group
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.urlresolvers import reverse
+from model_mommy import mommy
+
+from core.test_utils import FileStorageTestCase
+from exmo2010.models import Monitoring, Organization
+
+
+class SendMailAttachmentsTestCase(FileStorageTestCase):
+    # exmo2010:ajax_upload_file, exmo2010:send_mail
+
+    # Uploaded attachments should be stored once by content and attached to sent emails.
+
+    def setUp(self):
+        # GIVEN monitoring with 2 not registered organizations
+        self.monitoring = mommy.make(Monitoring)
+        mommy.make(Organization, monitoring=self.monitoring, email='a@test.ru', inv_status='NTS')
+        mommy.make(Organization, monitoring=self.monitoring, email='b@test.ru', inv_status='NTS')
+
+        # AND I am logged in as expertA
+        expertA = User.objects.create_user('expertA', 'experta@svobodainfo.org', 'password')
+        expertA.groups.add(Group.objects.get(name=expertA.profile.expertA_group))
+        self.client.login(username='expertA', password='password')
+
+    def upload(self, name, content):
+        url = reverse('exmo2010:ajax_upload_file')
+        response = self.client.post(url, {'upload_file': ContentFile(content, name=name)},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return json.loads(response.content)['saved_filename']
+
+    def test_same_content(self):
+        # WHEN I upload two files with the same content
+        key1 = self.upload('first.doc', 'some content')
+        key2 = self.upload('second.doc', 'some content')
+
+        # THEN both files get the same key
+        self.assertEqual(key1, key2)
+        # AND content is stored once
+        self.assertEqual(len(default_storage.listdir('email_attachments')[1]), 1)
+
+    def test_send_attachment(self):
+        # WHEN I upload file
+        key = self.upload('report.doc', 'some content')
+        # AND submit email form with this attachment
+        url = reverse('exmo2010:send_mail', args=[self.monitoring.pk])
+        self.client.post(url, {'comment': 'text', 'subject': 'subject', 'dst_orgs_noreg': '1',
+                               'attachments_names': json.dumps({key: 'report.doc'})})
+
+        # THEN every organization gets email with the attachment
+        self.assertEqual([m.attachments for m in mail.outbox], [[('report.doc', 'some content')]] * 2)
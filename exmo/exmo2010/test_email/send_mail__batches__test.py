@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import smtplib
+
+from django.contrib.auth.models import User, Group
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from core.test_utils import TestCase
+from mock import patch
+from model_mommy import mommy
+
+from exmo2010.models import Organization, Monitoring
+
+
+class SendMailBatchesTestCase(TestCase):
+    # exmo2010:send_mail
+
+    # Email messages should be sent in batches, every batch over single connection,
+    # with magic words expanded for every recipient.
+
+    def setUp(self):
+        # GIVEN monitoring with 3 not registered organizations
+        self.monitoring = mommy.make(Monitoring)
+        for name in 'abc':
+            mommy.make(Organization, monitoring=self.monitoring, email=name + '@test.ru', inv_status='NTS')
+
+        # AND I am logged in as expertA
+        self.expertA = User.objects.create_user('expertA', 'experta@svobodainfo.org', 'password')
+        self.expertA.groups.add(Group.objects.get(name=self.expertA.profile.expertA_group))
+        self.client.login(username='expertA', password='password')
+
+        self.url = reverse('exmo2010:send_mail', args=[self.monitoring.pk])
+
+    @override_settings(EMAIL_BATCH_SIZE=2)
+    def test_batches(self):
+        post_data = {'comment': u'code: %code%', 'subject': u'Тема', 'dst_orgs_noreg': '1'}
+
+        # WHEN I submit email form
+        with patch('exmo2010.celery_tasks.get_connection', side_effect=get_connection) as connection_mock:
+            self.client.post(self.url, post_data)
+
+        # THEN 3 emails are sent over 2 connections
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(connection_mock.call_count, 2)
+        # AND every email has invitation code of its organization
+        codes = dict(Organization.objects.values_list('email', 'inv_code'))
+        for message in mail.outbox:
+            self.assertIn('code: ' + codes[message.to[0]], message.body)
+        # AND invitation status of all organizations is changed to 'Sent'
+        self.assertEqual(set(Organization.objects.values_list('inv_status', flat=True)), {'SNT'})
+
+    @override_settings(EMAIL_BATCH_SIZE=3)
+    def test_refused_recipient(self):
+        post_data = {'comment': u'code: %code%', 'subject': u'Тема', 'dst_orgs_noreg': '1'}
+
+        def send_messages(backend, messages):
+            if messages[0].to == ['b@test.ru']:
+                raise smtplib.SMTPRecipientsRefused({'b@test.ru': (550, 'No such user')})
+            return send_messages_orig(backend, messages)
+
+        send_messages_orig = EmailBackend.send_messages.im_func
+        # WHEN I submit email form and server refuses the second recipient of the batch
+        with patch.object(EmailBackend, 'send_messages', send_messages):
+            self.client.post(self.url, post_data)
+
+        # THEN emails to the rest of recipients are sent
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['a@test.ru', 'c@test.ru'])
+        # AND invitation status is changed only for organizations which got emails
+        self.assertEqual(dict(Organization.objects.values_list('email', 'inv_status')),
+                         {'a@test.ru': 'SNT', 'b@test.ru': 'NTS', 'c@test.ru': 'SNT'})
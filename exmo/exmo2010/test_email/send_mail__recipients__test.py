@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+
+from django.contrib.auth.models import User, Group
+from django.core.urlresolvers import reverse
+from core.test_utils import TestCase
+from model_mommy import mommy
+
+from exmo2010.models import Monitoring, Organization, OrgUser
+from exmo2010.views.send_mail import mail_recipients
+
+
+class SendMailRecipientsTestCase(TestCase):
+    # exmo2010:send_mail
+
+    # Recipients should be resolved with constant number of queries, AJAX request should return preview
+    # of the first message and number of messages.
+
+    def setUp(self):
+        # GIVEN monitoring with 3 registered organizations
+        self.monitoring = mommy.make(Monitoring)
+        orgs = [mommy.make(Organization, monitoring=self.monitoring, email='org%d@test.ru' % i, inv_status='RGS')
+                for i in range(3)]
+        # AND 2 unseen representatives, second one represents 2 organizations
+        for i, user_orgs in enumerate([orgs[:1], orgs[1:]]):
+            orguser = User.objects.create_user('orguser%d' % i, 'orguser%d@test.ru' % i, 'password')
+            for org in user_orgs:
+                mommy.make(OrgUser, organization=org, userprofile=orguser.profile, seen=False)
+
+        # AND I am logged in as expertA
+        self.expertA = User.objects.create_user('expertA', 'experta@svobodainfo.org', 'password')
+        self.expertA.groups.add(Group.objects.get(name=self.expertA.profile.expertA_group))
+        self.client.login(username='expertA', password='password')
+
+        self.formdata = {'comment': 'code: %code%', 'subject': 'subject', 'handpicked_orgs': [],
+                         'dst_orgs_inact': True, 'dst_orgusers_unseen': True}
+
+    def test_queries(self):
+        # WHEN recipients are resolved
+        with self.assertNumQueries(3):
+            recipients = mail_recipients(self.monitoring, self.formdata)
+
+        # THEN every organization and every representative for each of his organizations gets message
+        self.assertEqual(sorted(r['email'] for r in recipients), [
+            'org0@test.ru', 'org1@test.ru', 'org2@test.ru', 'orguser0@test.ru', 'orguser1@test.ru', 'orguser1@test.ru'])
+
+    def test_preview_count(self):
+        url = reverse('exmo2010:send_mail', args=[self.monitoring.pk])
+        post_data = {'comment': 'code: %code%', 'subject': 'subject', 'dst_orgs_inact': '1', 'dst_orgusers_unseen': '1'}
+
+        # WHEN I request preview of mass mailing
+        response = self.client.post(url, post_data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        # THEN response has number of messages to be sent
+        self.assertEqual(json.loads(response.content)['count'], 6)
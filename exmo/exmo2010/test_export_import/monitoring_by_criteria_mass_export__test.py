@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import unicode_literals
+
+import zipfile
+from cStringIO import StringIO
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from core.test_utils import TestCase
+from model_mommy import mommy
+
+from core.utils import UnicodeReader
+from exmo2010.models import Monitoring, Organization, Parameter, Score, Task
+from exmo2010.views.export_import import write_criteria_zip
+
+
+class MonitoringByCriteriaMassExportTestCase(TestCase):
+    # exmo2010:monitoring_by_criteria_mass_export
+
+    # Should export zip archive of csv files with scores criteria by organizations and parameters.
+    # Excluded parameters and missing scores should be empty.
+
+    def setUp(self):
+        # GIVEN monitoring with 2 parameters, "complete" criterion of second parameter is not relevant
+        self.monitoring = mommy.make(Monitoring)
+        param1 = mommy.make(Parameter, monitoring=self.monitoring, code=1, weight=1)
+        param2 = mommy.make(Parameter, monitoring=self.monitoring, code=2, weight=1, complete=False)
+        # AND 3 organizations with approved tasks, second parameter is excluded for the second organization
+        org1, org2, org3 = [mommy.make(Organization, monitoring=self.monitoring, name=name) for name in 'abc']
+        param2.exclude.add(org2)
+        task1, task2, task3 = [mommy.make(Task, organization=org, status=Task.TASK_APPROVED) for org in (org1, org2, org3)]
+        # AND scores for all parameters, except second parameter of the third organization
+        crit = dict(complete=3, topical=2, accessible=1, hypertext=1, document=0, image=1)
+        for task in (task1, task2, task3):
+            mommy.make(Score, task=task, parameter=param1, found=1, **crit)
+        for task in (task1, task2):
+            mommy.make(Score, task=task, parameter=param2, found=1, **crit)
+        # AND expert A account
+        expertA = User.objects.create_user('expertA', 'expertA@svobodainfo.org', 'password')
+        expertA.profile.is_expertA = True
+        self.client.login(username='expertA', password='password')
+
+    def read_csv(self, content, name):
+        rows = UnicodeReader(StringIO(zipfile.ZipFile(StringIO(content)).read(name)))
+        return [row for row in rows if not row[0].startswith('#')]
+
+    def test_export(self):
+        # WHEN I export monitoring by criteria
+        url = reverse('exmo2010:monitoring_by_criteria_mass_export', args=[self.monitoring.pk])
+        response = self.client.get(url)
+        content = b''.join(response.streaming_content)
+
+        # THEN response is zip archive
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get('content-type'), 'application/zip')
+        # AND archive has csv file for every criterion
+        self.assertEqual(sorted(zipfile.ZipFile(StringIO(content)).namelist()), [
+            'Accessible.csv', 'Complete.csv', 'Document.csv', 'Found.csv', 'Hypertext.csv', 'Image.csv', 'Topical.csv'])
+        # AND excluded parameters and missing scores are empty
+        self.assertEqual(self.read_csv(content, 'Found.csv'), [
+            ['', '1', '2'], ['a', '1', '1'], ['b', '1', ''], ['c', '1', '']])
+        # AND irrelevant criteria are empty
+        self.assertEqual(self.read_csv(content, 'Complete.csv'), [
+            ['', '1', '2'], ['a', '3', ''], ['b', '3', ''], ['c', '3', '']])
+        self.assertEqual(self.read_csv(content, 'Topical.csv'), [
+            ['', '1', '2'], ['a', '2', '2'], ['b', '2', ''], ['c', '2', '']])
+
+    def test_queries(self):
+        # WHEN export archive is written
+        # THEN number of queries does not depend on number of tasks and parameters
+        with self.assertNumQueries(5):
+            write_criteria_zip(self.monitoring, StringIO())
@@ -73,7 +73,7 @@ class MonitoringExportApprovedTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         # AND отдается json
         self.assertEqual(response.get('content-type'), 'application/json')
-        json_file = json.loads(response.content)
+        json_file = json.loads(b''.join(response.streaming_content))
         self.assertEqual(len(json_file['monitoring']['tasks']), 1, json.dumps(json_file, indent=2))
 
     def test_approved_csv(self):
@@ -83,6 +83,6 @@ class MonitoringExportApprovedTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         # AND отдается csv
         self.assertEqual(response.get('content-type'), 'application/vnd.ms-excel')
-        csv = [line for line in UnicodeReader(StringIO(response.content))]
+        csv = [line for line in UnicodeReader(StringIO(b''.join(response.streaming_content)))]
         # only header, 1 string of content and license
         self.assertEqual(len(csv), 3)
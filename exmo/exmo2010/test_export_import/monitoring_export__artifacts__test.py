@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from core.test_utils import TestCase
+from model_mommy import mommy
+
+from exmo2010.models import Monitoring, Parameter, Score, Task
+from exmo2010.models.monitoring import PUB
+
+
+class MonitoringExportArtifactsTestCase(TestCase):
+    # exmo2010:monitoring_export
+
+    # Export of published monitoring should be precomputed, served with ETag and
+    # rebuilt after score changes.
+
+    def setUp(self):
+        self.export_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_root, True)
+        settings_override = override_settings(PRECOMPUTED_EXPORTS=True, EXPORT_ROOT=self.export_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # GIVEN published monitoring with approved task
+        self.monitoring = mommy.make(Monitoring, status=PUB)
+        task = mommy.make(Task, organization__monitoring=self.monitoring, status=Task.TASK_APPROVED)
+        # AND 1 score
+        parameter = mommy.make(Parameter, monitoring=self.monitoring, weight=1)
+        self.score = mommy.make(Score, task=task, parameter=parameter, found=1)
+        self.url = reverse('exmo2010:monitoring_export', args=[self.monitoring.pk]) + '?format=json'
+
+    def test_etag(self):
+        # WHEN I get monitoring export first time after score was changed
+        response = self.client.get(self.url)
+        # THEN export is generated on the fly without ETag
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        live_content = b''.join(response.streaming_content)
+
+        # WHEN I get monitoring export again
+        response = self.client.get(self.url)
+        # THEN precomputed export is served with ETag
+        self.assertTrue(response.has_header('ETag'))
+        # AND content is equal to export generated on the fly
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), json.loads(live_content))
+
+        # WHEN I get monitoring export with the same ETag in If-None-Match header
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        # THEN response status code is 304 (Not Modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_score_change(self):
+        # WHEN precomputed export is built
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        # AND score is changed
+        self.score.found = 0
+        self.score.save()
+
+        # THEN export is generated on the fly
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        # AND rebuilt export has new ETag
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_parameter_exclude(self):
+        # WHEN precomputed export is built
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        # AND parameter is excluded for the organization
+        self.score.parameter.exclude.add(self.score.task.organization)
+
+        # THEN export is generated on the fly
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_not_published_monitoring(self):
+        # WHEN score of not published monitoring is changed
+        monitoring = mommy.make(Monitoring)
+        score = mommy.make(Score, task__organization__monitoring=monitoring, parameter__monitoring=monitoring)
+        score.found = 1
+        score.save()
+        # THEN no invalidation stamp is written for it
+        self.assertFalse(os.path.exists(os.path.join(self.export_root, '%s.stamp' % monitoring.pk)))
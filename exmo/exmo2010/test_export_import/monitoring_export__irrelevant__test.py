@@ -132,7 +132,7 @@ class MonitoringExportIrrelevantTestCase(OptimizedTestCase):
         self.assertEqual(response.get('content-type'), 'application/json')
 
         # AND JSON content has irrelevant criteria excluded from scores
-        self.assertEqual(self.expected_json[code], json.loads(response.content))
+        self.assertEqual(self.expected_json[code], json.loads(b''.join(response.streaming_content)))
 
     @parameterized.expand(zip(OpennessExpression.OPENNESS_EXPRESSIONS))
     def test_csv(self, code):
@@ -149,4 +149,4 @@ class MonitoringExportIrrelevantTestCase(OptimizedTestCase):
         self.assertEqual(response.get('content-type'), 'application/vnd.ms-excel')
 
         # AND CSV content has irrelevant criteria marked with "not relevant" values
-        self.assertEqual(self.expected_csv[code], response.content.decode('utf16'))
+        self.assertEqual(self.expected_csv[code], b''.join(response.streaming_content).decode('utf16'))
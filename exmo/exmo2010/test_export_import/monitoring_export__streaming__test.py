@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import unicode_literals
+
+import json
+from cStringIO import StringIO
+
+from django.core.urlresolvers import reverse
+from core.test_utils import TestCase
+from model_mommy import mommy
+
+from core.utils import UnicodeReader
+from exmo2010.models import Monitoring, Parameter, Score, Task
+from exmo2010.models.monitoring import PUB
+
+
+class MonitoringExportStreamingTestCase(TestCase):
+    # exmo2010:monitoring_export
+
+    # Export should be streamed, scores should be grouped by tasks and tasks with equal openness
+    # should share same position.
+
+    def setUp(self):
+        attrs = {a: False for a in Parameter.OPTIONAL_CRITERIA}
+        # GIVEN published monitoring with 2 parameters
+        self.monitoring = mommy.make(Monitoring, status=PUB)
+        parameters = mommy.make(Parameter, monitoring=self.monitoring, weight=1, _quantity=2, **attrs)
+        # AND 3 approved tasks with openness 50, 50 and 0
+        for name, found in [('a', 1), ('b', 1), ('c', 0)]:
+            task = mommy.make(Task, organization__monitoring=self.monitoring, organization__name=name,
+                              status=Task.TASK_APPROVED)
+            mommy.make(Score, task=task, parameter=parameters[0], found=found)
+            mommy.make(Score, task=task, parameter=parameters[1], found=0)
+        self.url = reverse('exmo2010:monitoring_export', args=[self.monitoring.pk])
+
+    def test_json(self):
+        # WHEN I get monitoring exported as JSON
+        response = self.client.get(self.url + '?format=json')
+
+        # THEN response is streamed
+        self.assertTrue(response.streaming)
+        tasks = json.loads(b''.join(response.streaming_content))['monitoring']['tasks']
+        # AND every task has all its scores
+        self.assertEqual([len(t['scores']) for t in tasks], [2, 2, 2])
+        # AND tasks with equal openness share same position
+        self.assertEqual([(t['name'], t['position']) for t in tasks], [('a', 1), ('b', 1), ('c', 2)])
+
+    def test_csv(self):
+        # WHEN I get monitoring exported as CSV
+        response = self.client.get(self.url + '?format=csv')
+
+        # THEN response is streamed
+        self.assertTrue(response.streaming)
+        rows = list(UnicodeReader(StringIO(b''.join(response.streaming_content))))
+        # AND every score row has position of its task
+        positions = [(row[1], row[3]) for row in rows[1:] if not row[0].startswith('#')]
+        self.assertEqual(positions, [('a', '1'), ('a', '1'), ('b', '1'), ('b', '1'), ('c', '2'), ('c', '2')])
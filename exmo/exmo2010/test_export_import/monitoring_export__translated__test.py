@@ -68,7 +68,7 @@ class TranslatedMonitoringScoresDataExportTestCase(TestCase):
         self.client.login(username='user_%s' % lang, password='password')
         # AND I get json-file from response for current monitoring
         response = self.client.get(self.url + '?format=json', follow=True)
-        json_file = json.loads(response.content)
+        json_file = json.loads(b''.join(response.streaming_content))
         # THEN monitoring, organization and parameter names should be in user preferable language
         field = 'name_%s' % lang
         self.assertEqual(json_file['monitoring']['name'], getattr(self.monitoring, field))
@@ -84,7 +84,7 @@ class TranslatedMonitoringScoresDataExportTestCase(TestCase):
         self.client.login(username='user_%s' % lang, password='password')
         # AND I get csv-file from response for current monitoring
         response = self.client.get(self.url + '?format=csv', follow=True)
-        csv = UnicodeReader(StringIO(response.content))
+        csv = UnicodeReader(StringIO(b''.join(response.streaming_content)))
         field = 'name_%s' % lang
         for count, row in enumerate(csv, 1):
             if count != 1 and not row[0].startswith('#'):
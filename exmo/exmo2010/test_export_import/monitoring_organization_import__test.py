@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.urlresolvers import reverse
+from core.test_utils import TestCase
+from model_mommy import mommy
+
+from exmo2010.models import Monitoring, Organization
+
+
+class UploadOrganizationsCSVTest(TestCase):
+    # exmo2010:monitoring_organization_import
+
+    # Should create new organizations, update existing ones by name and generate
+    # unique invitation codes.
+
+    def setUp(self):
+        # GIVEN monitoring with organization "org1"
+        self.monitoring = mommy.make(Monitoring)
+        self.org1 = mommy.make(Organization, monitoring=self.monitoring, name='org1', inv_code='AAAAAA')
+        # AND expert A account
+        expertA = User.objects.create_user('expertA', 'expertA@svobodainfo.org', 'password')
+        expertA.profile.is_expertA = True
+        # AND I am logged in as expert A
+        self.client.login(username='expertA', password='password')
+        self.url = reverse('exmo2010:monitoring_organization_import', args=[self.monitoring.pk])
+
+    def test_import(self):
+        csv_data = (
+            '#Name,Url,Email,Phone,recommendations_hidden\n'
+            'org1,http://org1.ru,org1@test.ru,,True\n'
+            'org2,,org2@test.ru,,False\n'
+            'org2,,org2@test.ru; org2@mail.ru,,\n'
+            ',,,,\n'
+            'org3,,not email,,\n')
+        f = ContentFile(csv_data.encode('utf-16'), name='temp.csv')
+
+        # WHEN I upload csv file
+        response = self.client.post(self.url, data={'orgfile': f})
+
+        # THEN 3 of 6 rows are imported
+        self.assertEqual(response.context['row_count'], '3/6')
+        # AND errors of empty name and invalid email are displayed
+        errors = response.context['errors']
+        self.assertEqual(errors[1], 'row 5 (csv). Empty organization name')
+        self.assertTrue(errors[2].startswith('row 6 (validation).'))
+        # AND existing organization is updated
+        org1 = Organization.objects.get(pk=self.org1.pk)
+        self.assertEqual((org1.url, org1.email, org1.recommendations_hidden), ('http://org1.ru', 'org1@test.ru', True))
+        # AND new organization is created once with data of the last row
+        org2 = Organization.objects.get(monitoring=self.monitoring, name='org2')
+        self.assertEqual(org2.email, 'org2@test.ru, org2@mail.ru')
+        # AND all organizations have distinct invitation codes
+        inv_codes = Organization.objects.values_list('inv_code', flat=True)
+        self.assertEqual(len(set(inv_codes)), 2)
+        self.assertTrue(all(len(code) == 6 for code in inv_codes))
+
+    def test_names_differ_in_case(self):
+        csv_data = (
+            '#Name,Url,Email,Phone,recommendations_hidden\n'
+            'ORG1 ,http://org1.ru,,,\n'
+            'Org2,,,,\n'
+            'org2,http://org2.ru,,,\n')
+        f = ContentFile(csv_data.encode('utf-16'), name='temp.csv')
+
+        # WHEN I upload csv file with names differing from each other and existing one only in case
+        response = self.client.post(self.url, data={'orgfile': f})
+
+        # THEN all rows are imported
+        self.assertEqual(response.context['row_count'], '3/4')
+        # AND existing organization is updated
+        self.assertEqual(Organization.objects.get(pk=self.org1.pk).url, 'http://org1.ru')
+        # AND new organization is created once with data of the last row
+        self.assertEqual(list(Organization.objects.exclude(pk=self.org1.pk).values_list('name', 'url')),
+                         [('Org2', 'http://org2.ru')])
@@ -21,6 +21,7 @@ from __future__ import unicode_literals
 from cStringIO import StringIO
 
 from django.contrib.auth.models import User, Group
+from django.contrib.contenttypes.models import ContentType
 from django.core.urlresolvers import reverse
 from core.test_utils import TestCase
 from model_mommy import mommy
@@ -53,7 +54,7 @@ class RepresentativesExportTestCase(TestCase):
         orguser.groups.add(Group.objects.get(name=orguser.profile.organization_group))
         mommy.make(OrgUser, organization=org, userprofile=orguser.profile)
         # AND comment from orguser
-        mommy.make(CommentExmo, object_pk=score.pk, user=orguser)
+        mommy.make(CommentExmo, object_pk=score.pk, user=orguser, content_type=ContentType.objects.get_for_model(Score))
         # AND I am logged in as expert A
         self.client.login(username='expertA', password='password')
 
@@ -18,6 +18,7 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import hashlib
 import json
 from os.path import join
 
@@ -35,7 +36,7 @@ class AjaxUploadUnicodeFileTestCase(FileStorageTestCase):
     # exmo2010:ajax_upload_file
 
     # BUG #2369
-    # Uploaded files with unicode names should get translified names.
+    # Uploaded files with unicode names should be saved with ascii names (sha1 of content).
 
     def setUp(self):
         # GIVEN i am logged in as experA
@@ -54,9 +55,9 @@ class AjaxUploadUnicodeFileTestCase(FileStorageTestCase):
         # THEN response status code is 200 (OK)
         self.assertEqual(response.status_code, 200)
 
-        # AND saved filename should get translified
+        # AND saved filename should be sha1 of content
         result = json.loads(response.content)
-        self.assertEqual(result['saved_filename'], 'YiVA.doc')
+        self.assertEqual(result['saved_filename'], hashlib.sha1('some content').hexdigest())
         # AND saved file content should match uploaded file content
         saved_file = default_storage.open(join(settings.EMAIL_ATTACHMENT_UPLOAD_PATH, result['saved_filename']))
         self.assertEqual(saved_file.read(), 'some content')
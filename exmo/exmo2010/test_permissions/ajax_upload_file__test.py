@@ -113,7 +113,7 @@ class AjaxUploadFileAccessTestCase(OptimizedTestCase):
 
     @parameterized.expand(zip(['admin', 'expertA']))
     def test_allow_post(self, username, *args):
-        mock_file = Mock(spec=File, _size=12, read=lambda: 'some content')
+        mock_file = Mock(spec=File, _size=12, read=lambda: 'some content', chunks=lambda: ['some content'])
         mock_file.name = u'ЫВА.doc'
         # WHEN privileged user uploads file
         request = Mock(user=self.users[username], method='POST', is_ajax=lambda: True, FILES={'upload_file': mock_file})
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import AnonymousUser, User
+from core.test_utils import OptimizedTestCase
+from model_mommy import mommy
+from nose_parameterized import parameterized
+
+from auth.helpers import _existing_permissions, get_perms_map, perm_filter
+from exmo2010.models import Monitoring, ObserversGroup, Organization, OrgUser, Parameter, Score, Task
+from exmo2010.models.monitoring import PRE, RATE, RES, INT, FIN, PUB
+
+
+class PermQueryParityTestCase(OptimizedTestCase):
+    # auth.helpers.perm_filter
+
+    # Queryset permission filters should give the same results as object permission checks.
+
+    @classmethod
+    def setUpClass(cls):
+        super(PermQueryParityTestCase, cls).setUpClass()
+
+        cls.users = {'anonymous': AnonymousUser()}
+        for name in ['expertA', 'expertB', 'expertB_other', 'orguser', 'observer', 'user']:
+            cls.users[name] = User.objects.create_user(name, 'usr@svobodainfo.org', 'password')
+        cls.users['expertA'].profile.is_expertA = True
+        cls.users['expertB'].profile.is_expertB = True
+        cls.users['expertB_other'].profile.is_expertB = True
+
+        # GIVEN monitorings in every phase, one published monitoring is hidden
+        for status, hidden in [(PRE, False), (RATE, False), (RES, False), (INT, False),
+                               (FIN, False), (PUB, False), (PUB, True)]:
+            monitoring = mommy.make(Monitoring, status=status, hidden=hidden)
+            param = mommy.make(Parameter, monitoring=monitoring)
+            # AND organization represented by orguser and observed by observer
+            org = mommy.make(Organization, monitoring=monitoring)
+            mommy.make(OrgUser, organization=org, userprofile=cls.users['orguser'].profile)
+            group = mommy.make(ObserversGroup, monitoring=monitoring)
+            group.organizations.add(org)
+            group.users.add(cls.users['observer'])
+            # AND organization without representatives
+            org_other = mommy.make(Organization, monitoring=monitoring)
+            # AND tasks with scores in every status for both organizations, executed by different experts
+            experts = [cls.users['expertB'], cls.users['expertB_other'], mommy.make(User)]
+            for shift, organization in enumerate((org, org_other)):
+                statuses = [Task.TASK_OPEN, Task.TASK_READY, Task.TASK_APPROVED]
+                for status, expert in zip(statuses, experts[shift:] + experts[:shift]):
+                    task = mommy.make(Task, organization=organization, user=expert, status=status)
+                    mommy.make(Score, task=task, parameter=param)
+
+    @parameterized.expand(zip(['anonymous', 'expertA', 'expertB', 'expertB_other', 'orguser', 'observer', 'user']))
+    def test_parity(self, username):
+        user = self.users[username]
+        for model in (Task, Score):
+            objs = list(model.objects.all())
+            perms_map = get_perms_map(user, objs)
+            for priv in _existing_permissions[model]:
+                # WHEN objects are filtered by permission
+                filtered = set(perm_filter(user, priv, model.objects.all()).values_list('pk', flat=True))
+                # THEN result is the same as object permission checks give
+                expected = set(obj.pk for obj in objs if user.has_perm('exmo2010.' + priv, obj))
+                self.assertEqual(filtered, expected, '%s %s' % (model.__name__, priv))
+                # AND precomputed permissions map agrees too
+                self.assertEqual(set(pk for pk, perms in perms_map.items() if priv in perms), expected)
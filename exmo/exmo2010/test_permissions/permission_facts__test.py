@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import User
+from core.test_utils import TestCase
+from model_mommy import mommy
+
+from auth.helpers import PermissionFacts
+from exmo2010.models import Monitoring, Organization, OrgUser, Task
+from exmo2010.models.monitoring import INT
+
+
+class PermissionFactsTestCase(TestCase):
+    # auth.helpers.PermissionFacts
+
+    # Permission checks with request-scoped facts should not query database for every object.
+
+    def setUp(self):
+        # GIVEN interaction monitoring with 2 organizations
+        monitoring = mommy.make(Monitoring, status=INT)
+        org1, org2 = mommy.make(Organization, monitoring=monitoring, _quantity=2)
+        # AND 3 approved tasks for each organization
+        for org in (org1, org2):
+            mommy.make(Task, organization=org, status=Task.TASK_APPROVED, _quantity=3)
+        # AND representative of first organization
+        self.orguser = User.objects.create_user('orguser', 'orguser@svobodainfo.org', 'password')
+        mommy.make(OrgUser, organization=org1, userprofile=self.orguser.profile)
+        self.org1 = org1
+
+    def test_view_task(self):
+        tasks = list(Task.objects.select_related('organization__monitoring'))
+        # WHEN request-scoped facts are attached to the user
+        self.orguser.perm_facts = PermissionFacts(self.orguser)
+
+        # THEN view_task permission of all tasks is checked with constant number of queries
+        with self.assertNumQueries(3):
+            allowed = [t.pk for t in tasks if self.orguser.has_perm('exmo2010.view_task', t)]
+        # AND only tasks of represented organization are allowed
+        self.assertEqual(sorted(allowed), sorted(Task.objects.filter(organization=self.org1).values_list('pk', flat=True)))
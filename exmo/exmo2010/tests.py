@@ -25,18 +25,23 @@ from bs4 import BeautifulSoup
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
 from django.core import mail
+from django.core.cache import get_cache
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
+from django.db import IntegrityError
 from django.http import HttpResponseRedirect
 from core.test_utils import TestCase
+from django.test.utils import override_settings
 from django.utils import translation
-from mock import MagicMock, Mock
+from mock import MagicMock, Mock, patch
 from model_mommy import mommy
 from nose_parameterized import parameterized
 
 from .middleware import CustomLocaleMiddleware
 from .models import (Group, Monitoring, ObserversGroup, Organization, Parameter, OrgUser,
                      Score, PhonesField, Task, UserProfile, MONITORING_PUBLISHED)
+from .models.task_openness import TaskOpenness, update_task_openness
+from .openness import OpennessEngine, UNIT
 from .templatetags.exmo2010_filters import linkify
 from .views.views import ckeditor_upload, org_url_re
 from core.test_utils import OptimizedTestCase, TranslationTestCase
@@ -93,6 +98,253 @@ class NegativeParamMonitoringRatingTestCase(TestCase):
         self.assertEqual(task.task_openness, 50)
 
 
+class TaskOpennessUpdateTestCase(TestCase):
+    # Materialized task openness SHOULD be recalculated when scores, parameters or exclusions change
+
+    def setUp(self):
+        attrs = {a: False for a in 'complete accessible topical hypertext document image'.split()}
+
+        # GIVEN monitoring with normative and recommendatory parameters
+        self.monitoring = mommy.make(Monitoring, openness_expression__code=8)
+        self.param_npa = mommy.make(Parameter, monitoring=self.monitoring, weight=1, npa=True, **attrs)
+        self.param_other = mommy.make(Parameter, monitoring=self.monitoring, weight=1, npa=False, **attrs)
+        # AND approved task with found scores for both parameters
+        self.org = mommy.make(Organization, monitoring=self.monitoring)
+        self.task = mommy.make(Task, organization=self.org, status=Task.TASK_APPROVED)
+        self.score_npa = mommy.make(Score, task=self.task, parameter=self.param_npa, found=1)
+        self.score_other = mommy.make(Score, task=self.task, parameter=self.param_other, found=1)
+
+    def openness(self, rating_type='all'):
+        return [t.task_openness for t in self.monitoring.rating(rating_type=rating_type)]
+
+    def test_rating_types(self):
+        # WHEN rating is calculated for all rating types
+        # THEN every rating type has 100% openness
+        self.assertEqual(self.openness('all'), [100])
+        self.assertEqual(self.openness('npa'), [100])
+        self.assertEqual(self.openness('other'), [100])
+
+    def test_score_change(self):
+        # WHEN rating is calculated
+        self.assertEqual(self.openness('npa'), [100])
+        # AND normative score is changed to not found
+        self.score_npa.found = 0
+        self.score_npa.save()
+        # THEN normative openness is 0
+        self.assertEqual(self.openness('npa'), [0])
+        # AND recommendatory openness does not change
+        self.assertEqual(self.openness('other'), [100])
+
+    def test_parameter_exclude(self):
+        # GIVEN normative score with zero openness
+        self.score_npa.found = 0
+        self.score_npa.save()
+        self.assertEqual(self.openness(), [50])
+        # WHEN organization is excluded from normative parameter
+        self.param_npa.exclude.add(self.org)
+        # THEN openness is 100
+        self.assertEqual(self.openness(), [100])
+
+    def test_parameter_weight_change(self):
+        # GIVEN normative score with zero openness
+        self.score_npa.found = 0
+        self.score_npa.save()
+        self.assertEqual(self.openness(), [50])
+        # WHEN recommendatory parameter weight is changed to 3
+        self.param_other.weight = 3
+        self.param_other.save()
+        # THEN openness is 75
+        self.assertEqual(self.openness(), [75])
+
+    def test_concurrent_update(self):
+        # WHEN openness of the task is stored by concurrent request during recalculation
+        with patch.object(TaskOpenness.objects, 'bulk_create', side_effect=IntegrityError):
+            # THEN recalculation does not fail
+            update_task_openness(self.monitoring)
+        # AND rating is calculated afterwards
+        self.assertEqual(self.openness(), [100])
+
+    def test_score_change_during_update(self):
+        tasks_openness = OpennessEngine.tasks_openness
+
+        def change_score(engine, *args, **kwargs):
+            # Score is changed by concurrent request after old scores are read.
+            if self.score_npa.found:
+                self.score_npa.found = 0
+                self.score_npa.save()
+            return tasks_openness(engine, *args, **kwargs)
+
+        # WHEN normative score is changed during recalculation
+        with patch.object(OpennessEngine, 'tasks_openness', autospec=True, side_effect=change_score):
+            update_task_openness(self.monitoring)
+        # THEN openness calculated from old scores is not stored
+        self.assertFalse(TaskOpenness.objects.filter(task=self.task).exists())
+        # AND rating is calculated with new score afterwards
+        self.assertEqual(self.openness(), [50])
+
+
+@override_settings(SHARED_CACHE='db')
+class RatingPlaceLookupTestCase(TestCase):
+    # Task rating place SHOULD be equal to place in monitoring rating and SHOULD be updated on score changes.
+    # Rating index SHOULD be cached only if cache is shared between processes.
+
+    def setUp(self):
+        attrs = {a: False for a in Parameter.OPTIONAL_CRITERIA}
+        # GIVEN monitoring with 2 parameters
+        monitoring = mommy.make(Monitoring)
+        self.param1 = mommy.make(Parameter, monitoring=monitoring, weight=1, **attrs)
+        self.param2 = mommy.make(Parameter, monitoring=monitoring, weight=1, **attrs)
+        # AND 4 approved tasks with openness 100, 50, 50 and 0
+        self.tasks = []
+        for found1, found2 in [(1, 1), (1, 0), (0, 1), (0, 0)]:
+            task = mommy.make(Task, organization__monitoring=monitoring, status=Task.TASK_APPROVED)
+            mommy.make(Score, task=task, parameter=self.param1, found=found1)
+            mommy.make(Score, task=task, parameter=self.param2, found=found2)
+            self.tasks.append(task)
+        # AND rating index and monitoring data version are cached in local memory
+        self.cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='rating-place-lookup')
+        self.cache.clear()
+        for module in ['exmo2010.models.task_openness', 'exmo2010.view_cache']:
+            patcher = patch('%s.cache' % module, self.cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_rating_place(self):
+        # WHEN I get rating places of tasks
+        # THEN tasks with equal openness share same place
+        self.assertEqual([t.rating_place for t in self.tasks], [1, 2, 2, 3])
+        # AND places are equal to places in monitoring rating
+        rating_places = {t.pk: t.place for t in self.tasks[0].organization.monitoring.rating()}
+        self.assertEqual([rating_places[t.pk] for t in self.tasks], [1, 2, 2, 3])
+
+    def test_score_change(self):
+        # WHEN rating index is calculated
+        self.assertEqual(self.tasks[3].rating_place, 3)
+        # AND score of last task is changed
+        score = Score.objects.get(task=self.tasks[3], parameter=self.param1)
+        score.found = 1
+        score.save()
+        # THEN places are updated
+        self.assertEqual([t.rating_place for t in self.tasks], [1, 2, 2, 2])
+
+    def test_not_approved_task(self):
+        # WHEN first task is not approved anymore
+        self.assertEqual(self.tasks[1].rating_place, 2)
+        self.tasks[0].status = Task.TASK_OPEN
+        self.tasks[0].save()
+        # THEN it has no rating place
+        self.assertEqual(Task.objects.get(pk=self.tasks[0].pk).rating_place, None)
+        # AND places of other tasks are updated
+        self.assertEqual([t.rating_place for t in self.tasks[1:]], [1, 1, 2])
+
+    def test_cached_index(self):
+        # WHEN rating place is looked up
+        self.assertEqual(self.tasks[3].rating_place, 3)
+        # THEN rating index is cached
+        self.assertTrue(any('rating_index' in key for key in self.cache._cache))
+
+    @override_settings(SHARED_CACHE=None)
+    def test_not_shared_cache(self):
+        # WHEN rating place is looked up and cache is not shared
+        self.assertEqual(self.tasks[3].rating_place, 3)
+        # THEN rating index is not cached
+        self.assertFalse(self.cache._cache)
+
+
+class OpennessEngineSqlParityTestCase(TestCase):
+    # OpennessEngine SHOULD calculate the same openness as SQL expressions for both openness codes
+
+    SCORES = [
+        dict(found=1, complete=2, topical=3, accessible=1, hypertext=1, document=0, image=0),
+        dict(found=1, complete=3, topical=1, accessible=2, hypertext=0, document=1, image=1),
+        dict(found=0),
+        dict(found=1, complete=1, topical=2, accessible=3, hypertext=1, document=1, image=0),
+    ]
+
+    def setUp(self):
+        # GIVEN monitoring with parameters of different weights, types and relevant criteria
+        self.monitoring = mommy.make(Monitoring)
+        crit = lambda names: {c: c in names.split() for c in Parameter.OPTIONAL_CRITERIA}
+        self.parameters = [
+            mommy.make(Parameter, monitoring=self.monitoring, weight=1, npa=True, **crit('complete topical accessible hypertext document image')),
+            mommy.make(Parameter, monitoring=self.monitoring, weight=2, npa=False, **crit('complete topical')),
+            mommy.make(Parameter, monitoring=self.monitoring, weight=3, npa=False, **crit('hypertext document')),
+            mommy.make(Parameter, monitoring=self.monitoring, weight=-1, npa=True, **crit('complete accessible hypertext')),
+            mommy.make(Parameter, monitoring=self.monitoring, weight=1, npa=False, **crit('hypertext image')),
+        ]
+        # AND 3 organizations, last parameter is excluded for second organization
+        orgs = mommy.make(Organization, monitoring=self.monitoring, _quantity=3)
+        self.parameters[-1].exclude.add(orgs[1])
+        # AND tasks with final scores and interim scores for first 2 parameters, last task has no scores
+        tasks = [mommy.make(Task, organization=org) for org in orgs]
+        for i, task in enumerate(tasks[:2]):
+            for j, param in enumerate(self.parameters):
+                mommy.make(Score, task=task, parameter=param, revision=Score.FINAL, **self.SCORES[(i + j) % 4])
+                if j < 2:
+                    mommy.make(Score, task=task, parameter=param, revision=Score.INTERIM, **self.SCORES[(i + j + 1) % 4])
+
+    def sql_openness(self, parameters=None):
+        expression = self.monitoring.openness_expression
+        select = {
+            'openness': expression.get_sql_openness(parameters),
+            'openness_initial': expression.get_sql_openness(parameters, initial=True)}
+        rows = Task.objects.filter(organization__monitoring=self.monitoring).extra(select=select)\
+                           .values_list('pk', 'openness', 'openness_initial')
+        return dict((pk, (openness, initial)) for pk, openness, initial in rows)
+
+    def assertOpennessEqual(self, engine_result, sql_result):
+        self.assertEqual(set(engine_result), set(sql_result))
+        for task_pk, values in sql_result.items():
+            for engine_value, sql_value in zip(engine_result[task_pk], values):
+                if sql_value is None:
+                    self.assertEqual(engine_value, None)
+                else:
+                    self.assertAlmostEqual(engine_value, float(sql_value), places=9)
+
+    @parameterized.expand([(1,), (8,)])
+    def test_tasks_openness(self, code):
+        self.monitoring.openness_expression_id = code
+        self.monitoring.save()
+        engine = OpennessEngine.for_monitoring(self.monitoring)
+
+        # WHEN openness is calculated for all, normative and recommendatory parameters
+        # THEN results are equal to SQL results
+        self.assertOpennessEqual(engine.tasks_openness(), self.sql_openness())
+        self.assertEqual(len([o for o, oi in engine.tasks_openness().values() if o is not None]), 2)
+        npa = [p.pk for p in self.parameters if p.npa]
+        other = [p.pk for p in self.parameters if not p.npa]
+        self.assertOpennessEqual(engine.tasks_openness(npa=True), self.sql_openness(npa))
+        self.assertOpennessEqual(engine.tasks_openness(npa=False), self.sql_openness(other))
+        # AND results for user defined parameters are equal to SQL results
+        self.assertOpennessEqual(engine.tasks_openness(parameters=self.parameters[1:3]), self.sql_openness(self.parameters[1:3]))
+
+    @parameterized.expand([(1,), (8,)])
+    def test_scores_openness(self, code):
+        self.monitoring.openness_expression_id = code
+        self.monitoring.save()
+        engine = OpennessEngine.for_monitoring(self.monitoring)
+
+        # WHEN score openness is calculated
+        scores = Score.objects.filter(parameter__monitoring=self.monitoring).select_related('parameter__monitoring')\
+                              .extra(select={'sql_openness': self.monitoring.openness_expression.get_sql_expression()})
+        units = engine.scores_units()
+        for score in scores:
+            # THEN weighted engine openness is equal to SQL openness
+            self.assertAlmostEqual(score.parameter.weight * units[score.pk] / float(UNIT), float(score.sql_openness), places=9)
+            # AND Score.openness is equal to engine openness
+            self.assertAlmostEqual(score.openness, units[score.pk] * 100.0 / UNIT, places=9)
+
+    def test_for_task(self):
+        task = Task.objects.filter(organization__monitoring=self.monitoring).order_by('pk')[1]
+        excluded = set(Parameter.objects.filter(exclude=task.organization).values_list('pk', flat=True))
+        # WHEN engine is created from loaded parameters and scores of the task with excluded parameter
+        engine = OpennessEngine.for_task(task, self.parameters, excluded, Score.objects.filter(task=task),
+                                         self.monitoring.openness_expression_id)
+        # THEN task openness is equal to the one calculated for monitoring
+        expected = OpennessEngine.for_monitoring(self.monitoring).tasks_openness()[task.pk]
+        self.assertEqual(engine.tasks_openness(), {task.pk: expected})
+
+
 class CanonicalViewKwargsTestCase(TestCase):
     # Url patterns and views should use and accept only canonical kwargs
 
@@ -484,3 +736,30 @@ class OrguserTrackingMiddlewareTestCase(TestCase):
         self.assertEqual(set(OrgUser.objects.values_list('userprofile_id', 'seen')), {(orguser.profile.pk, True), })
         # AND Organization status should change to 'RGS' (registered)
         self.assertEqual(Organization.objects.get(pk=org.pk).inv_status, 'RGS')
+
+    def test_cached_seen_flag(self):
+        cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='orguser-seen')
+        for module in ['exmo2010.middleware', 'exmo2010.models.userprofile']:
+            patcher = patch(module + '.cache', cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # GIVEN seen orguser
+        orguser = User.objects.create_user('orguser', 'usr@svobodainfo.org', 'password')
+        mommy.make(OrgUser, userprofile=orguser.profile)
+        # AND i am logged in as orguser
+        self.client.login(username='orguser', password='password')
+        self.client.get('/')
+
+        # WHEN i get any page again
+        with patch('exmo2010.middleware.OrgUser.objects.filter') as filter_mock:
+            self.client.get('/')
+        # THEN links of orguser are not queried
+        self.assertFalse(filter_mock.called)
+
+        # WHEN new not-seen link for orguser is created (monitoring is copied)
+        orguser_link = mommy.make(OrgUser, userprofile=orguser.profile, seen=False)
+        # AND i get any page
+        self.client.get('/')
+        # THEN new link is marked as seen
+        self.assertTrue(OrgUser.objects.get(pk=orguser_link.pk).seen)
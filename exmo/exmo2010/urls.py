@@ -122,6 +122,7 @@ monitoring_patterns = named_urls('monitorings.views',
     (r'^(?P<monitoring_pk>\d+)_update/$', MonitoringEditView, 'monitoring_update'),
     (r'^(?P<monitoring_pk>\d+)_delete/$', MonitoringDeleteView, 'monitoring_delete'),
     (r'^(?P<monitoring_pk>\d+)_copy/$', MonitoringCopyView, 'monitoring_copy'),
+    (r'^(?P<monitoring_pk>\d+)/copy_progress/$', 'monitoring_copy_progress'),
     (r'^(?P<monitoring_pk>\d+)/observers_groups/$', ObserversGroupView, 'observers_groups'),
     (r'^(?P<monitoring_pk>\d+)/observers_group/add/$', ObserversGroupEditView, 'observers_group_add'),
     (r'^(?P<monitoring_pk>\d+)/observers_group/(?P<obs_group_pk>\d+)_update/$', ObserversGroupEditView, 'observers_group_update'),
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# This file is part of EXMO2010 software.
+# Copyright 2016 IRSI LTD
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Cache of rating, ratings, public statistics and task scores pages.
+
+Computed page data and rendered fragments are cached with version of monitoring in the key. Version
+is dropped whenever the monitoring, its organizations, parameters, exclusions, tasks, scores,
+representatives, questionnaire answers, observers groups or comments are changed, so stale entries
+are never read again and expire by VIEW_CACHE_TIMEOUT. Ratings page, which lists all monitorings, uses the common version which is
+dropped along with version of any monitoring.
+
+Versions are dropped only in cache of the process which changes data, so pages are cached only when
+cache is shared between processes, see SHARED_CACHE setting. Otherwise data is computed on every request.
+
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import translation
+
+from .models import Monitoring, ObserversGroup, Organization, OrgUser, Parameter, QAnswer, Score, Task
+
+
+# Versions should outlive cached entries.
+VERSION_TIMEOUT = 30 * 24 * 60 * 60
+
+
+def _version_key(monitoring_pk):
+    return 'view_cache_version:%s' % (monitoring_pk or 'all')
+
+
+def monitoring_version(monitoring_pk=None):
+    """
+    Return current version of monitoring data, or common version of all monitorings if
+    monitoring_pk is None.
+
+    """
+    key = _version_key(monitoring_pk)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # Another process may have set the version just now.
+        if not cache.add(key, version, VERSION_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_monitoring_views(monitoring_pks):
+    """
+    Drop versions of given monitorings and common version of all monitorings.
+
+    """
+    cache.delete_many([_version_key(pk) for pk in monitoring_pks] + [_version_key(None)])
+
+
+def user_role(user):
+    """
+    Return the part of cache key which depends on user. Anonymous users share the same entries,
+    as well as experts A, who can see everything. Other users see data depending on their tasks,
+    organizations and observers groups, so they get entries of their own.
+
+    """
+    if not user.is_active:
+        return 'anonymous'
+    if user.is_expertA:
+        return 'expertA'
+    return 'user:%s' % user.pk
+
+
+def view_cache_key(name, monitoring_pk, request, *parts):
+    """
+    Return key of cached page data. Key varies on monitoring version, user role, language, query
+    string and given extra parts.
+
+    """
+    parts = (monitoring_pk, monitoring_version(monitoring_pk), user_role(request.user),
+             translation.get_language(), request.GET.urlencode()) + parts
+    digest = hashlib.md5(u':'.join(map(unicode, parts)).encode('utf-8')).hexdigest()
+    return 'view_cache:%s:%s' % (name, digest)
+
+
+def view_cache_enabled():
+    """
+    Whether page data may be cached, i.e. cache is shared between processes.
+
+    """
+    return bool(settings.SHARED_CACHE)
+
+
+def cached_view_data(key, compute):
+    """
+    Return cached data by key, or compute and cache it. Data is always computed if view cache is disabled.
+
+    """
+    if not view_cache_enabled():
+        return compute()
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, settings.VIEW_CACHE_TIMEOUT)
+    return data
+
+
+def changed_monitoring_pks(sender, instance):
+    """
+    Return pks of monitorings which data is changed along with given instance.
+
+    """
+    if sender is Monitoring:
+        return [instance.pk]
+    elif sender in (ObserversGroup, Organization, Parameter):
+        return [instance.monitoring_id]
+    elif sender in (Task, OrgUser):
+        return Organization.objects.filter(pk=instance.organization_id).values_list('monitoring', flat=True)
+    else:
+        return Task.objects.filter(pk=instance.task_id).values_list('organization__monitoring', flat=True)
+
+
+def _monitoring_data_changed(sender, instance, **kwargs):
+    invalidate_monitoring_views(changed_monitoring_pks(sender, instance))
+
+
+def _relation_changed(sender, instance, action, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, User):
+        # Observers groups of user are changed.
+        monitoring_pks = ObserversGroup.objects.filter(pk__in=pk_set or []).values_list('monitoring', flat=True)
+    else:
+        monitoring_pks = [instance.monitoring_id]
+    invalidate_monitoring_views(monitoring_pks)
+
+
+for model in (Monitoring, ObserversGroup, Organization, OrgUser, Parameter, QAnswer, Score, Task):
+    post_save.connect(_monitoring_data_changed, sender=model)
+    post_delete.connect(_monitoring_data_changed, sender=model)
+for through in (Parameter.exclude.through, ObserversGroup.organizations.through, ObserversGroup.users.through):
+    m2m_changed.connect(_relation_changed, sender=through)
@@ -15,29 +15,30 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import csv
-import os
-import tempfile
 import zipfile
-from collections import OrderedDict
-from copy import deepcopy
+from copy import copy
 from cStringIO import StringIO
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError, PermissionDenied
 from django.core.urlresolvers import reverse
-from django.db import connection
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
 from django.views.decorators.csrf import csrf_protect
 from django.utils import simplejson
 from django.utils.translation import ugettext as _
+from modeltranslation.utils import build_localized_fieldname, get_language
 from reversion.revisions import default_revision_manager as revision
 
+from custom_comments.models import CommentExmo
+from exmo2010.export_artifacts import artifact_response, invalidate_artifacts
 from exmo2010.models import (LicenseTextFragments, Monitoring, Organization,
-                             Parameter, Score, Task, generate_inv_code)
-from core.utils import UnicodeReader, UnicodeWriter, dictfetchall
+                             Parameter, Score, Task, generate_inv_codes)
+from exmo2010.view_cache import invalidate_monitoring_views
+from core.utils import UnicodeReader, UnicodeWriter, dictfetchiter
 from core.views import login_required_on_deny
 
 
@@ -55,99 +56,105 @@ def replace_string(cell):
 
 
 class MonitoringExport(object):
-    def __init__(self, monitoring):
-        self.monitoring = monitoring
-        cursor = connection.cursor()
-        cursor.execute(monitoring.sql_scores())
-        scores = dictfetchall(cursor)
-        cursor.close()
+    """
+    Streaming export of approved tasks scores of monitoring.
 
-        if not len(scores):
-            return
+    Scores are fetched from server-side cursor and grouped by organization on the fly (SQL result
+    is ordered by openness and organization), so only scores of one task are held in memory at once.
+    Response content is generated incrementally while it is sent to the client.
 
+    """
+    def __init__(self, monitoring):
+        self.monitoring = monitoring
         if monitoring.openness_expression.code == 1:
-            criteria = Parameter.OPTIONAL_CRITERIA_V1
+            self.criteria = Parameter.OPTIONAL_CRITERIA_V1
         else:
-            criteria = Parameter.OPTIONAL_CRITERIA
+            self.criteria = Parameter.OPTIONAL_CRITERIA
+        # Content is generated after the view returns, when request language may be already deactivated.
+        # Translated names should be resolved in advance.
+        self.name = monitoring.name
+        self.sql = monitoring.sql_scores()
+        # License should be fetched before scores, no queries are allowed while server-side cursor is open.
+        license = LicenseTextFragments.objects.filter(pk='license')
+        self.license = license[0] if license else None
+
+    def _score_dict(self, score):
+        score_dict = {
+            'name': score['parameter_name'].strip(),
+            'social': score['weight'],
+            'found': score['found'],
+            'type': 'npa' if score['parameter_npa'] else 'other',
+            'revision': Score.REVISION_EXPORT[score['revision']],
+            'id': score['parameter_id'],
+            'links': (score['links'] or '').strip(),
+            'recommendations': (score['recommendations'] or '').strip(),
+        }
+        if settings.DEBUG:
+            score_dict['pk'] = score['id']
+
+        for criterion in self.criteria:
+            if score[criterion] != -1:
+                score_dict[criterion] = float(score[criterion])
+
+        return score_dict
+
+    def tasks(self):
+        """
+        Yields dicts of approved tasks with scores, ordered by rating position.
 
-        # dict with organization as keys and el as list of scores for json export
-        self.tasks = OrderedDict()
+        """
+        task = None
         rating_place = 0
         current_openness = None
 
-        for score in scores:
+        for score in dictfetchiter(self.sql):
             # skip score from non-approved task
             if score['task_status'] != Task.TASK_APPROVED:
                 continue
 
-            if not current_openness or score['task_openness'] != current_openness:
-                rating_place += 1
-                current_openness = score['task_openness']
-
-            score_dict = {
-                'name': score['parameter_name'].strip(),
-                'social': score['weight'],
-                'found': score['found'],
-                'type': 'npa' if score['parameter_npa'] else 'other',
-                'revision': Score.REVISION_EXPORT[score['revision']],
-                'id': score['parameter_id'],
-                'links': (score['links'] or '').strip(),
-                'recommendations': (score['recommendations'] or '').strip(),
-            }
-            if settings.DEBUG:
-                score_dict['pk'] = score['id']
-
-            for criterion in criteria:
-                if score[criterion] != -1:
-                    score_dict[criterion] = float(score[criterion])
-
-            if score['organization_id'] in self.tasks.keys():
-                self.tasks[score['organization_id']]['scores'].append(score_dict)
-            else:
-                if score['task_openness'] is not None:
-                    score['task_openness'] = '%.3f' % score['task_openness']
-                if score['openness_initial'] is not None:
-                    score['openness_initial'] = '%.3f' % score['openness_initial']
+            if task is None or score['organization_id'] != task['id']:
+                if task is not None:
+                    yield task
+
+                # NOTE: Tasks with equal openness share same place.
+                if rating_place == 0 or score['task_openness'] != current_openness:
+                    rating_place += 1
+                    current_openness = score['task_openness']
 
-                self.tasks[score['organization_id']] = {
-                    'scores': [score_dict, ],
+                task = {
+                    'scores': [],
                     'position': rating_place,
-                    'openness': score['task_openness'],
-                    'openness_initial': score['openness_initial'],
+                    'openness': _format_openness(score['task_openness']),
+                    'openness_initial': _format_openness(score['openness_initial']),
                     'name': score['organization_name'],
                     'id': score['organization_id'],
                     'url': score['url'],
                 }
 
-    def json(self):
-        ret = {
-            'monitoring': {
-                'name': self.monitoring.name,
-                'tasks': self.tasks.values(),
-            },
-        }
-        license = LicenseTextFragments.objects.filter(pk='license')
-        json_license = license[0].json_license if license else {}
-        if json_license:
-            ret.update({'license': json_license})
-        json_dump_args = {}
+            task['scores'].append(self._score_dict(score))
+
+        if task is not None:
+            yield task
+
+    def iter_json(self):
+        json_dump_args = {'ensure_ascii': False}
         if settings.DEBUG:
-            json_dump_args = {'indent': 2}
-        response = HttpResponse(mimetype='application/json')
-        response.encoding = 'UTF-8'
-        response['Content-Disposition'] = 'attachment; filename=monitoring-%s.json' % self.monitoring.pk
-        response.write(
-            simplejson.dumps(
-                ret, **json_dump_args
-            ).decode("unicode_escape").encode("utf8"))
-        return response
+            json_dump_args['indent'] = 2
+        dumps = lambda obj: simplejson.dumps(obj, **json_dump_args).encode('utf8')
 
-    def csv(self):
-        response = HttpResponse(mimetype='application/vnd.ms-excel')
-        response['Content-Disposition'] = \
-            'attachment; filename=monitoring-%s.csv' % self.monitoring.pk
-        response.encoding = 'UTF-16'
-        writer = UnicodeWriter(response)
+        json_license = self.license.json_license if self.license else {}
+        if json_license:
+            yield '{"license": %s, ' % dumps(json_license)
+        else:
+            yield '{'
+        yield '"monitoring": {"name": %s, "tasks": [' % dumps(self.name)
+        for num, task in enumerate(self.tasks()):
+            yield (', ' if num else '') + dumps(task)
+        yield ']}}'
+
+    def iter_csv(self):
+        buf = StringIO()
+        writer = UnicodeWriter(buf)
         # csv HEAD
         writer.writerow([
             "#Monitoring",
@@ -174,10 +181,10 @@ class MonitoringExport(object):
 
         score_fields = ['name', 'id', 'found'] + Parameter.OPTIONAL_CRITERIA
         score_fields += ['social', 'type', 'revision', 'links', 'recommendations']
-        for task in self.tasks.values():
+        for task in self.tasks():
             for score_dict in task['scores']:
                 row = [
-                    self.monitoring.name,
+                    self.name,
                     task['name'],
                     task['id'],
                     task['position'],
@@ -186,14 +193,39 @@ class MonitoringExport(object):
                 ]
                 row.extend([unicode(score_dict.get(c, "not relevant")) for c in score_fields])
                 writer.writerow(row)
+            yield _flush(buf)
+
         # csv FOOTER
-        license = LicenseTextFragments.objects.filter(pk='license')
-        if license:
-            writer.writerow([u'#%s' % license[0].csv_footer])
+        if self.license:
+            writer.writerow([u'#%s' % self.license.csv_footer])
+        yield _flush(buf)
+
+    def json(self):
+        response = StreamingHttpResponse(self.iter_json(), content_type='application/json')
+        response['Content-Disposition'] = 'attachment; filename=monitoring-%s.json' % self.monitoring.pk
+        return response
 
+    def csv(self):
+        response = StreamingHttpResponse(self.iter_csv(), content_type='application/vnd.ms-excel')
+        response['Content-Disposition'] = 'attachment; filename=monitoring-%s.csv' % self.monitoring.pk
         return response
 
 
+def _format_openness(openness):
+    return None if openness is None else '%.3f' % openness
+
+
+def _flush(buf):
+    """
+    Return accumulated content of the buffer and empty it.
+
+    """
+    data = buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+    return data
+
+
 @login_required_on_deny
 def monitoring_export(request, monitoring_pk):
     """
@@ -210,11 +242,16 @@ def monitoring_export(request, monitoring_pk):
         raise PermissionDenied
 
     export_format = request.GET.get('format', 'json')
-    if export_format == 'csv':
+    if export_format not in ('csv', 'json'):
+        raise PermissionDenied
+
+    response = artifact_response(request, monitoring, export_format)
+    if response is not None:
+        return response
+    elif export_format == 'csv':
         return MonitoringExport(monitoring).csv()
-    elif export_format == 'json':
+    else:
         return MonitoringExport(monitoring).json()
-    raise PermissionDenied
 
 
 @login_required
@@ -310,6 +347,10 @@ def monitoring_organization_export(request, monitoring_pk):
     return response
 
 
+def _name_key(name):
+    return (name or '').strip().lower()
+
+
 @login_required
 @csrf_protect
 def monitoring_organization_import(request, monitoring_pk):
@@ -332,6 +373,14 @@ def monitoring_organization_import(request, monitoring_pk):
     indexes = {}
     rowOKCount = 0
     row_num = 0
+
+    # Organizations of monitoring by name in current language, as "name" lookup is translated by modeltranslation.
+    # Names are compared case-insensitive and without surrounding spaces, as database collation does.
+    name_field = build_localized_fieldname('name', get_language())
+    organizations = dict((_name_key(getattr(org, name_field)), org)
+                         for org in Organization.objects.filter(monitoring=monitoring))
+    # Imported organizations by name, which are not yet saved.
+    imported = {}
     try:
         for row_num, row in enumerate(reader, start=1):
             if row[0] and row[0].startswith('#'):
@@ -346,17 +395,17 @@ def monitoring_organization_import(request, monitoring_pk):
                 errors.append("header row (csv). Field 'Name' does not exist")
                 break
 
-            if row[indexes['name']] == '':
+            name = row[indexes['name']]
+            if name == '':
                 errors.append("row %d (csv). Empty organization name" % row_num)
                 continue
-            try:
-                organization = Organization.objects.get(monitoring=monitoring, name=row[indexes['name']])
-            except Organization.DoesNotExist:
-                organization = Organization(name=row[indexes['name']])
+            if _name_key(name) in imported:
+                organization = copy(imported[_name_key(name)])
+            elif _name_key(name) in organizations:
+                organization = copy(organizations[_name_key(name)])
+            else:
+                organization = Organization(name=name)
                 organization.monitoring = monitoring
-            except Exception, e:
-                errors.append("row %d. %s" % (row_num, e))
-                continue
             try:
                 if row[indexes['email']]:
                     organization.email = replace_string(row[indexes['email']]).strip()
@@ -369,9 +418,11 @@ def monitoring_organization_import(request, monitoring_pk):
                 if row[indexes['recommendations_hidden']] == 'True':
                     organization.recommendations_hidden = True
 
-                organization.inv_code = generate_inv_code(6)
-                organization.full_clean()
-                organization.save()
+                # Uniqueness of name is ensured by lookup above and invitation codes are generated
+                # unique below, so validate_unique queries are skipped.
+                organization.clean_fields(exclude=['monitoring', 'inv_code'])
+                organization.clean()
+                imported[_name_key(name)] = organization
             except ValidationError, e:
                 errors.append("row %d (validation). %s" % (
                     row_num,
@@ -387,6 +438,26 @@ def monitoring_organization_import(request, monitoring_pk):
     except Exception, e:
         errors.append(_("Import error: %s." % e))
 
+    if imported:
+        for organization, inv_code in zip(imported.values(), generate_inv_codes(len(imported))):
+            organization.inv_code = inv_code
+        fields = [build_localized_fieldname('name', lang) for lang, name in settings.LANGUAGES] + \
+            ['url', 'email', 'phone', 'recommendations_hidden', 'inv_code']
+        try:
+            with transaction.commit_on_success():
+                Organization.objects.bulk_create([org for org in imported.values() if org.pk is None])
+                for organization in imported.values():
+                    if organization.pk is not None:
+                        Organization.objects.filter(pk=organization.pk).update(
+                            **dict((f, getattr(organization, f)) for f in fields))
+        except IntegrityError, e:
+            errors.append(_("Import error: %s." % e))
+            rowOKCount = 0
+        else:
+            invalidate_monitoring_views([monitoring.pk])
+            if settings.PRECOMPUTED_EXPORTS:
+                invalidate_artifacts(monitoring.pk)
+
     if must_register:
         revision.register(Organization)
 
@@ -491,96 +562,100 @@ def monitoring_by_criteria_mass_export(request, monitoring_pk):
     if not request.user.has_perm('exmo2010.admin_monitoring', monitoring):
         raise PermissionDenied
 
-    row_template = {
-        'Found': [],
-        'Complete': [],
-        'Topical': [],
-        'Accessible': [],
-        'Hypertext': [],
-        'Document': [],
-        'Image': []
-    }
-    spool = {}
-    writer = {}
-    handle = {}
-    for criteria in row_template.keys():
-        spool[criteria] = tempfile.mkstemp()
-        handle[criteria] = os.fdopen(spool[criteria][0], 'w')
-        writer[criteria] = UnicodeWriter(handle[criteria])
-    header_row = True
-    parameters = Parameter.objects.filter(monitoring=monitoring)
-    for task in Task.approved_tasks.filter(organization__monitoring=monitoring):
-        row = deepcopy(row_template)
-        if header_row:
-            for criteria in row.keys():
-                row[criteria] = [''] + [p.code for p in parameters]
-                writer[criteria].writerow(row[criteria])
-            header_row = False
-            row = deepcopy(row_template)
-        for criteria in row.keys():
-            row[criteria] = [task.organization.name]
-        for parameter in parameters:
-            try:
-                score = Score.objects.filter(task=task, parameter=parameter, revision=Score.REVISION_DEFAULT)[0]
-                if task.organization in parameter.exclude.all():
-                    raise IndexError
-            except IndexError:
-                row['Found'].append('')
-                row['Complete'].append('')
-                row['Topical'].append('')
-                row['Accessible'].append('')
-                row['Hypertext'].append('')
-                row['Document'].append('')
-                row['Image'].append('')
-            else:
-                row['Found'].append(score.found)
-                if score.parameter.complete:
-                    row['Complete'].append(score.complete)
-                else:
-                    row['Complete'].append('')
-                if score.parameter.topical:
-                    row['Topical'].append(score.topical)
-                else:
-                    row['Topical'].append('')
-                if score.parameter.accessible:
-                    row['Accessible'].append(score.accessible)
-                else:
-                    row['Accessible'].append('')
-                if score.parameter.hypertext:
-                    row['Hypertext'].append(score.hypertext)
-                else:
-                    row['Hypertext'].append('')
-                if score.parameter.document:
-                    row['Document'].append(score.document)
-                else:
-                    row['Document'].append('')
-                if score.parameter.image:
-                    row['Image'].append(score.image)
-                else:
-                    row['Image'].append('')
-        for criteria in row.keys():
-            writer[criteria].writerow(row[criteria])
-
-    for criteria in row_template.keys():
-        license = LicenseTextFragments.objects.filter(pk='license')
-        if license:
-            writer[criteria].writerow([u'#%s' % license[0].csv_footer])
+    response = artifact_response(request, monitoring, 'criteria')
+    if response is not None:
+        return response
 
-    response = HttpResponse(mimetype='application/zip')
+    response = StreamingHttpResponse(iter_criteria_zip(monitoring), content_type='application/zip')
     response['Content-Disposition'] = 'attachment; filename=monitoring-%s.zip' % monitoring_pk
-    buffer = StringIO()
-    writer = zipfile.ZipFile(buffer, 'w')
-    for criteria in row_template.keys():
-        handle[criteria].close()
-        writer.write(spool[criteria][1], criteria + '.csv')
-        os.unlink(spool[criteria][1])
-    writer.close()
-    buffer.flush()
-    response.write(buffer.getvalue())
-    buffer.close()
     return response
 
 
+CRITERIA_FILES = zip(
+    ['Found', 'Complete', 'Topical', 'Accessible', 'Hypertext', 'Document', 'Image'],
+    ['found'] + Parameter.OPTIONAL_CRITERIA)
+
+
+class _ZipStream(object):
+    """
+    Write-only file object for ZipFile, which keeps written data until it is taken. ZipFile writes
+    members with writestr and central directory without seeking, it only needs current position.
+
+    """
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.position += len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data, self.chunks = ''.join(self.chunks), []
+        return data
+
+
+def iter_criteria_zip(monitoring):
+    """
+    Generate zip archive of CSV files, one file per criterion, by chunks of one archive member.
+    Rows are organizations of approved tasks, columns are parameters.
+
+    All scores and exclusions of monitoring are fetched at once, then every CSV file is filled in
+    a pass over tasks and yielded. Zipfile of python 2.7 can't write member of unknown size without
+    seeking, so only one CSV file at a time is kept in memory.
+
+    """
+    criteria = Parameter.OPTIONAL_CRITERIA
+    parameters = list(Parameter.objects.filter(monitoring=monitoring).values_list('pk', 'code', *criteria))
+    tasks = list(Task.approved_tasks.filter(organization__monitoring=monitoring).select_related('organization'))
+    excluded = set(Parameter.exclude.through.objects.filter(parameter__monitoring=monitoring)
+                                                    .values_list('organization_id', 'parameter_id'))
+    scores = Score.objects.filter(task__in=[t.pk for t in tasks], revision=Score.REVISION_DEFAULT)\
+                          .values_list('task_id', 'parameter_id', 'found', *criteria)
+    scores = dict(((task_pk, param_pk), values) for task_pk, param_pk, values in
+                  ((row[0], row[1], row[2:]) for row in scores))
+    license = LicenseTextFragments.objects.filter(pk='license')
+
+    stream = _ZipStream()
+    zip_file = zipfile.ZipFile(stream, 'w')
+    for num, (name, field) in enumerate(CRITERIA_FILES):
+        buf = StringIO()
+        writer = UnicodeWriter(buf)
+        if tasks:
+            writer.writerow([''] + [code for pk, code in (p[:2] for p in parameters)])
+        for task in tasks:
+            row = [task.organization.name]
+            for param in parameters:
+                score = scores.get((task.pk, param[0]))
+                # "found" is always relevant, other criteria are exported only if relevant for parameter.
+                if score is None or (task.organization_id, param[0]) in excluded or (num and not param[num + 1]):
+                    row.append('')
+                else:
+                    row.append(score[num])
+            writer.writerow(row)
+        if license:
+            writer.writerow([u'#%s' % license[0].csv_footer])
+        zip_file.writestr(name + '.csv', buf.getvalue())
+        yield stream.take()
+    zip_file.close()
+    yield stream.take()
+
+
+def write_criteria_zip(monitoring, fileobj):
+    """
+    Write zip archive of CSV files, one file per criterion, to the file object.
+
+    """
+    for chunk in iter_criteria_zip(monitoring):
+        fileobj.write(chunk)
+
+
 @login_required
 def representatives_export(request, monitoring_pk):
     monitoring = get_object_or_404(Monitoring, pk=monitoring_pk)
@@ -591,9 +666,9 @@ def representatives_export(request, monitoring_pk):
 
     for org in orgs:
         org.users = []
+        tasks = list(org.task_set.values_list('pk', flat=True))
         for user in sorted(org.userprofile_set.all(), key=lambda m: m.full_name):
-            scores = Score.objects.filter(task__organization=org).values_list('pk', flat=True)
-            user.comments = user.user.comment_comments.filter(object_pk__in=scores)
+            user.comments = CommentExmo.objects.filter(user=user.user, task_id__in=tasks)
             org.users.append(user)
 
     response = HttpResponse(mimetype='application/vnd.ms-excel')
@@ -19,15 +19,13 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import json
-from os.path import join, basename
-from urllib import urlencode
+from collections import OrderedDict
 
 from django import forms
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse
 from django.forms.models import modelform_factory
 from django.http import HttpResponseRedirect
@@ -35,13 +33,13 @@ from django.template.defaultfilters import filesizeformat
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext as _
 from django.views.generic import DetailView, UpdateView
-from pytils.translit import translify
 
 
 from core.response import JSONResponse
 from core.views import LoginRequiredMixin
-from exmo2010.mail import mail_organization, mail_orguser
-from exmo2010.models import Monitoring, Organization, SentMailHistory, Score, UserProfile, OrgUser
+from custom_comments.models import CommentExmo
+from exmo2010.mail import expand_magic_words, mail_mass, store_attachment
+from exmo2010.models import Monitoring, SentMailHistory, OrgUser
 from queryform import QueryForm
 
 
@@ -61,16 +59,88 @@ def ajax_upload_file(request):
         context = {'error': error}
 
         if not error:
-            upload_path = settings.EMAIL_ATTACHMENT_UPLOAD_PATH
-            upload_filename = default_storage.get_available_name(join(upload_path, translify(upload_file.name)))
-            saved_path = default_storage.save(upload_filename, upload_file)
-            context = {'saved_filename': basename(saved_path), 'original_filename': upload_file.name}
+            context = {'saved_filename': store_attachment(upload_file), 'original_filename': upload_file.name}
 
         return JSONResponse(context)
 
     raise PermissionDenied
 
 
+def mail_recipients(monitoring, formdata):
+    """
+    Return list of recipients of mass mailing, selected with checkbox filters of send mail form: dicts with
+    'email', 'code' and 'link_codes' (to expand magic words %code% and %link%), and also 'org_pk' and
+    'inv_code' for messages to organizations. See exmo2010.mail.expand_magic_words.
+
+    """
+    handpicked = set(org.pk for org in formdata['handpicked_orgs'])
+
+    # At first, organizations.
+    statuses = []
+    if formdata.get('dst_orgs_noreg'):
+        statuses += ['NTS', 'SNT', 'RD']
+    if formdata.get('dst_orgs_inact'):
+        statuses.append('RGS')
+    if formdata.get('dst_orgs_activ'):
+        statuses.append('ACT')
+
+    orgs = monitoring.organization_set.filter(inv_status__in=statuses)
+    if handpicked:
+        orgs = orgs.filter(pk__in=handpicked)
+
+    recipients = []
+    for org in orgs:
+        for addr in org.email_iter():
+            recipients.append({'email': addr, 'code': org.inv_code, 'link_codes': [org.inv_code],
+                               'org_pk': org.pk, 'inv_code': org.inv_code})
+
+    # Secondly, org-users (representatives), grouped with all their organizations in this monitoring.
+    dst_orgusers = set(attr for attr in ['dst_orgusers_inact', 'dst_orgusers_activ', 'dst_orgusers_unseen']
+                       if formdata.get(attr))
+    if not dst_orgusers:
+        return recipients
+
+    orgusers = OrderedDict()
+    rows = OrgUser.objects.filter(organization__monitoring=monitoring)\
+        .order_by('userprofile', 'organization__name')\
+        .values_list('userprofile_id', 'userprofile__user_id', 'userprofile__user__email',
+                     'organization_id', 'organization__inv_code', 'seen')
+    for profile_pk, user_pk, email, org_pk, inv_code, seen in rows:
+        orguser = orgusers.setdefault(profile_pk, {'user_pk': user_pk, 'email': email, 'orgs': [],
+                                                   'codes': [], 'seen': False})
+        orguser['orgs'].append(org_pk)
+        orguser['codes'].append(inv_code)
+        orguser['seen'] = orguser['seen'] or seen
+
+    commented = CommentExmo.objects.filter(monitoring_id=monitoring.pk).order_by().values_list('user_id', flat=True)
+    commented = set(commented.distinct())
+
+    for orguser in orgusers.values():
+        if not orguser['email'] or handpicked and not handpicked.intersection(orguser['orgs']):
+            continue
+        if not orguser['seen']:
+            kind = 'dst_orgusers_unseen'
+        elif orguser['user_pk'] in commented:
+            kind = 'dst_orgusers_activ'
+        else:
+            kind = 'dst_orgusers_inact'
+        if kind not in dst_orgusers:
+            continue
+
+        email, codes = orguser['email'], orguser['codes']
+        if '%code%' in formdata['comment']:
+            # Send email to this user for every related organization in this monitoring.
+            recipients += [{'email': email, 'code': code, 'link_codes': codes} for code in codes]
+        elif '%link%' in formdata['comment']:
+            # Send single email to this user with all related organizations in one link.
+            recipients.append({'email': email, 'link_codes': codes})
+        else:
+            # Send single email to this user without any magic words.
+            recipients.append({'email': email})
+
+    return recipients
+
+
 class SendMailMixin(LoginRequiredMixin):
     pk_url_kwarg = 'monitoring_pk'
     context_object_name = 'monitoring'
@@ -100,112 +170,34 @@ class SendMailView(SendMailMixin, UpdateView):
             'initial': {'handpicked_orgs': self.request.GET.getlist('orgs')}})
         return kwargs
 
-    def replace_link(self, text, email, orgs):
-        params = {'code': [org.inv_code for org in orgs]}
-        if email:
-            params['email'] = email
-        url = reverse('exmo2010:auth_orguser') + '?' + urlencode(params, True)
-        return text.replace('%link%', self.request.build_absolute_uri(url))
-
     def form_valid(self, form):
         """
-        Return first email preview instead of sending emails if request is AJAX.
+        Return first email preview and number of messages instead of sending emails if request is AJAX.
         Send email messages to selected recipients, expanding magic words %code% and %link%.
+        Messages are sent in batches by celery tasks, magic words are expanded for every recipient there.
         """
-        preview_only = self.request.is_ajax()
-
-        if not preview_only:
-            self.object = form.save()
         formdata = form.cleaned_data
+        link_url = self.request.build_absolute_uri(reverse('exmo2010:auth_orguser'))
+        recipients = mail_recipients(self.monitoring, formdata)
 
-        attachments = []
-        if not preview_only:
-            attachments_names = formdata.get('attachments_names')
-
-            if attachments_names:
-                for saved_filename, original_filename in json.loads(attachments_names).items():
-                    saved_file = default_storage.open(join(settings.EMAIL_ATTACHMENT_UPLOAD_PATH, saved_filename))
-                    attachments.append((original_filename, saved_file.read()))
-                    saved_file.close()
-
-        # At first, send messages to organizations, selected with checkbox filters. If request is ajax - return
-        # preview of message to the first matching organization.
-        if formdata['handpicked_orgs']:
-            prepicked_orgs = Organization.objects.filter(pk__in=formdata['handpicked_orgs'])
-        else:
-            prepicked_orgs = self.monitoring.organization_set.all()
-
-        orgs = []
-        if formdata.get('dst_orgs_noreg'):
-            orgs += prepicked_orgs.filter(inv_status__in=['NTS', 'SNT', 'RD'])
-        if formdata.get('dst_orgs_inact'):
-            orgs += prepicked_orgs.filter(inv_status='RGS')
-        if formdata.get('dst_orgs_activ'):
-            orgs += prepicked_orgs.filter(inv_status='ACT')
-
-        for org in orgs:
-            comment_text = formdata['comment'].replace('%code%', org.inv_code)
-            for addr in org.email_iter():
-                text = self.replace_link(comment_text, addr, [org])
-                if preview_only:
-                    context = {'email': addr, 'subject': formdata['subject'], 'body': text}
-                    return JSONResponse({'page': render_to_string('mail/email_preview.html', context)})
-                else:
-                    mail_organization(addr, org, formdata['subject'], text, attachments)
-
-        # Secondly, send messages to org-users (representatives), selected with checkbox filters. If request is
-        # ajax - return preview of message to the first matching user.
-        orgusers = UserProfile.objects.filter(organization__monitoring=self.monitoring).prefetch_related('organization')
-        if formdata['handpicked_orgs']:
-            orgusers = orgusers.filter(organization__in=formdata['handpicked_orgs'])
-
-        seen = OrgUser.objects.filter(organization__monitoring=self.monitoring, seen=True).values_list('userprofile_id', flat=True)
-
-        scores = Score.objects.filter(parameter__monitoring=self.monitoring)
-        orgusers_seen = orgusers.filter(pk__in=seen)
-        orgusers_unseen = orgusers.exclude(pk__in=seen)
-        active = orgusers_seen.filter(user__comment_comments__object_pk__in=scores).distinct()
-        inactive = orgusers_seen.exclude(user__comment_comments__object_pk__in=scores).distinct()
-
-        mailto = []
-        if formdata.get('dst_orgusers_inact'):
-            mailto += list(inactive)
-        if formdata.get('dst_orgusers_activ'):
-            mailto += list(active)
-        if formdata.get('dst_orgusers_unseen'):
-            mailto += list(orgusers_unseen)
-
-        monitoring_orgs = set(self.monitoring.organization_set.all())
-
-        for user in mailto:
-            # All orgs of this user in this monitoring.
-            user_orgs = filter(monitoring_orgs.__contains__, user.organization.all())
-
-            if '%code%' in formdata['comment']:
-                # Send email to this user for every related organization in this monitoring.
-                comment_text = self.replace_link(formdata['comment'], user.user.email, user_orgs)
-                texts = [comment_text.replace('%code%', org.inv_code) for org in user_orgs]
-            elif '%link%' in formdata['comment']:
-                # Send single email to this user with all related organizations in one link.
-                texts = [self.replace_link(formdata['comment'], user.user.email, user_orgs)]
-            else:
-                # Send single email to this user without any magic words.
-                texts = [formdata['comment']]
-
-            for text in texts:
-                if preview_only:
-                    context = {'email': user.user.email, 'subject': formdata['subject'], 'body': text}
-                    return JSONResponse({'page': render_to_string('mail/email_preview.html', context)})
-                else:
-                    mail_orguser(user.user.email, formdata['subject'], text, attachments)
-
-        if preview_only:
-            return JSONResponse({'error': True, 'page': _('This email will not be delivered to anyone!')})
-        else:
-            messages.success(self.request, _('Mails sent.'))
-            url = reverse('exmo2010:send_mail_history', args=[self.monitoring.pk])
-
-            return HttpResponseRedirect('%s?%s' % (url, self.request.GET.urlencode()))
+        if self.request.is_ajax():
+            if not recipients:
+                return JSONResponse({'error': True, 'page': _('This email will not be delivered to anyone!')})
+            rcpt = recipients[0]
+            body = expand_magic_words(formdata['comment'], link_url, rcpt)
+            context = {'email': rcpt['email'], 'subject': formdata['subject'], 'body': body, 'count': len(recipients)}
+            return JSONResponse({'page': render_to_string('mail/email_preview.html', context),
+                                 'count': len(recipients)})
+
+        self.object = form.save()
+        attachments_names = formdata.get('attachments_names')
+        attachments = json.loads(attachments_names).items() if attachments_names else []
+        mail_mass(formdata['subject'], formdata['comment'], link_url, recipients, attachments)
+
+        messages.success(self.request, _('Mails sent.'))
+        url = reverse('exmo2010:send_mail_history', args=[self.monitoring.pk])
+
+        return HttpResponseRedirect('%s?%s' % (url, self.request.GET.urlencode()))
 
     def form_invalid(self, form):
         if self.request.is_ajax():
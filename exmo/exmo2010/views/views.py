@@ -23,6 +23,7 @@ from collections import OrderedDict, defaultdict
 
 from ckeditor.views import upload
 from django import http
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
@@ -43,10 +44,12 @@ from livesettings import config_value
 
 from ..forms import FeedbackForm, CertificateOrderForm, CertificateOrderQueryForm, TasksIndexQueryForm, ContactsForm
 from ..mail import mail_certificate_order, mail_feedback, mail_contacts_frontpage
-from ..models import Monitoring, ObserversGroup, StaticPage, Task, FeedbackItem
+from ..models import Monitoring, ObserversGroup, StaticPage, Task, FeedbackItem, annotate_completeness
 from ..models.text_fragments import FrontPageTextFragments, LicenseTextFragments
 from ..models.monitoring import PRE, RATE, RES, INT, FIN, PUB
+from ..view_cache import monitoring_version, view_cache_enabled
 from accounts.forms import SettingsInvCodeForm
+from auth.helpers import get_facts
 from core.response import JSONResponse
 from core.views import LoginRequiredMixin
 from perm_utils import annotate_exmo_perms
@@ -89,13 +92,14 @@ def tasks_index(request):
 
     Monitoring.objects.filter()
     filter = Q(user=request.user, organization__monitoring__status__in=[RATE, RES, INT, FIN])
-    tasks = Task.objects.filter(filter).prefetch_related('organization__monitoring', 'qanswer_set')
+    tasks = Task.objects.filter(filter).prefetch_related('organization__monitoring')
 
     if queryform.is_valid():
         tasks = queryform.apply(tasks)
 
     monitorings = defaultdict(list)
-    tasks = annotate_exmo_perms(tasks, request.user)
+    # Completeness of all tasks is calculated with a few grouped queries.
+    tasks = annotate_completeness(annotate_exmo_perms(tasks, request.user))
 
     for task in tasks:
         monitorings[task.organization.monitoring].append(task)
@@ -114,10 +118,10 @@ def tasks_index(request):
 
 
 def index_orgs(request):
-    tasks = Task.approved_tasks.filter(Q(organization__observersgroup__users=request.user) |
-                                       Q(organization__userprofile__user=request.user))\
-                               .order_by('-organization__monitoring__publish_date')\
-                               .distinct()
+    facts = get_facts(request.user)
+    orgs = facts.represented_orgs | facts.observed_orgs
+    tasks = Task.approved_tasks.filter(organization__in=list(orgs))\
+                               .order_by('-organization__monitoring__publish_date')
     int_tasks = tasks.filter(organization__monitoring__status=INT)
     fin_tasks = tasks.filter(organization__monitoring__status=FIN)
     pub_tasks = tasks.filter(organization__monitoring__status=PUB)
@@ -415,6 +419,13 @@ def public_stats(request, report_type='inprogress', monitoring_pk=None):
 
         monitorings = paginator_list.object_list
 
+    # Statistics of every monitoring is cached in template until monitoring data is changed.
+    monitorings = list(monitorings)
+    view_cache_timeout = settings.VIEW_CACHE_TIMEOUT if view_cache_enabled() else None
+    if view_cache_timeout:
+        for monitoring in monitorings:
+            monitoring.cache_version = monitoring_version(monitoring.pk)
+
     return TemplateResponse(request, 'public_stats.html', {
         'paginator': paginator_list,
         'monitorings': monitorings,
@@ -422,6 +433,7 @@ def public_stats(request, report_type='inprogress', monitoring_pk=None):
         'title': title,
         'monitoring_id': monitoring_pk,
         'all_monitorings': all_monitorings,
+        'view_cache_timeout': view_cache_timeout,
     })
 
 
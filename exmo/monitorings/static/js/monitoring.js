@@ -18,6 +18,26 @@
 //    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 //
 $(document).ready(function () {
+    // poll progress of background monitoring copy job, reload page when it is done
+    var copy_progress = $('#copy_progress');
+    if (copy_progress.length) {
+        (function poll() {
+            $.getJSON(copy_progress.data('url'), function (data) {
+                if (data.state == 'SUCCESS') {
+                    window.location = window.location.pathname;
+                } else if (data.state == 'FAILURE') {
+                    copy_progress.find('.copy-running').hide();
+                    copy_progress.find('.copy-failed').show();
+                } else {
+                    if (data.total) {
+                        copy_progress.find('.copy-done').text(data.done + ' / ' + data.total);
+                    }
+                    setTimeout(poll, 2000);
+                }
+            });
+        })();
+    }
+
     // calendar initializing with user locale settings
     var settings = $.datepicker.regional[$('html').attr('lang')];
     settings['buttonImage'] = "/static/exmo2010/img/calendar.png";
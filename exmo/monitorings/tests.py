@@ -21,25 +21,35 @@
 from __future__ import unicode_literals
 
 import datetime
+import json
+from cStringIO import StringIO
+from urlparse import urlparse
 
 from bs4 import BeautifulSoup
 from django.conf import settings
 from django.contrib.auth.models import Group, User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django.core.urlresolvers import reverse
+from django.core.cache import get_cache
+from django.core.urlresolvers import resolve, reverse
+from django.test.utils import override_settings
 from core.test_utils import TestCase
 from django.utils.formats import get_format
 from django.utils.translation import get_language
+from mock import patch
 from model_mommy import mommy
 from nose_parameterized import parameterized
 
 from .forms import MonitoringCopyForm
+from .views import _comments_stats, _parameter_found_report
 from core.test_utils import OptimizedTestCase
+from core.utils import UnicodeReader
 from custom_comments.models import CommentExmo
+from exmo2010.celery_tasks import refresh_monitoring_statistics
 from exmo2010.models import (Claim, Monitoring, ObserversGroup, OrgUser,
-                             Organization, Parameter, Task, Score, UserProfile)
+                             Organization, Parameter, Task, TaskHistory, Score, UserProfile)
 from exmo2010.models.monitoring import INT, PRE, PUB
+from exmo2010.monitoring_copy import MonitoringCopy
 
 
 class MonitoringDeleteTestCase(TestCase):
@@ -126,6 +136,72 @@ class RatingsAvgOpennessTestCase(TestCase):
         # AND monitoring_nonzero_score average openness should be 100.0
         self.assertEqual(monitorings[self.monitoring_nonzero_score.pk].avg_openness, 100.0)
 
+    def test_filtered_values(self):
+        # WHEN user requests ratings page filtered by monitoring name
+        response = self.client.get(reverse('exmo2010:ratings'), {'name': self.monitoring_nonzero_score.name})
+
+        # THEN output contains only filtered monitoring
+        monitorings = {m.pk: m for m in response.context['monitoring_list']}
+        self.assertEqual(monitorings.keys(), [self.monitoring_nonzero_score.pk])
+        # AND average openness should be 100.0
+        self.assertEqual(monitorings[self.monitoring_nonzero_score.pk].avg_openness, 100.0)
+
+
+@override_settings(SHARED_CACHE='db')
+class RatingViewCacheTestCase(TestCase):
+    # exmo2010:monitoring_rating, exmo2010:ratings
+
+    # Rating and ratings pages data should be cached until scores are changed, if cache is shared
+    # between processes.
+
+    def setUp(self):
+        # GIVEN published monitoring with approved task and zero score
+        self.monitoring = mommy.make(Monitoring, status=PUB)
+        task = mommy.make(Task, organization__monitoring=self.monitoring, status=Task.TASK_APPROVED)
+        parameter = mommy.make(Parameter, monitoring=self.monitoring, weight=1)
+        self.score = mommy.make(Score, task=task, parameter=parameter, found=0)
+        self.url = reverse('exmo2010:monitoring_rating', args=[self.monitoring.pk])
+        # AND pages data is cached in local memory
+        cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='view-cache')
+        cache.clear()
+        patcher = patch('exmo2010.view_cache.cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached_rating(self):
+        with patch.object(Monitoring, 'rating', autospec=True, side_effect=Monitoring.rating) as rating:
+            # WHEN anonymous user requests rating page twice
+            self.client.get(self.url)
+            response = self.client.get(self.url)
+        # THEN rating is calculated once
+        self.assertEqual(rating.call_count, 1)
+        # AND cached rating is shown
+        self.assertEqual([t.openness for t in response.context['rating_list']], [0])
+
+    @override_settings(SHARED_CACHE=None)
+    def test_not_shared_cache(self):
+        with patch.object(Monitoring, 'rating', autospec=True, side_effect=Monitoring.rating) as rating:
+            # WHEN anonymous user requests rating page twice and cache is not shared
+            self.client.get(self.url)
+            self.client.get(self.url)
+        # THEN rating is calculated every time
+        self.assertEqual(rating.call_count, 2)
+
+    def test_score_change(self):
+        # WHEN anonymous user requests rating and ratings pages
+        self.client.get(self.url)
+        self.client.get(reverse('exmo2010:ratings'))
+        # AND score is changed
+        self.score.found = 1
+        self.score.save()
+
+        # THEN rating page shows new openness
+        response = self.client.get(self.url)
+        self.assertEqual([t.openness for t in response.context['rating_list']], [100])
+        # AND ratings page shows new average openness
+        response = self.client.get(reverse('exmo2010:ratings'))
+        self.assertEqual([m.avg_openness for m in response.context['monitoring_list']], [100])
+
 
 class RatingColumnsPickerTestCase(OptimizedTestCase):
     # exmo2010:monitoring_rating
@@ -732,6 +808,134 @@ class StatisticsActiveOrganizationRepresentsTestCase(TestCase):
         self.assertEqual(statistics['organization_users_active'], 1)
 
 
+@override_settings(SHARED_CACHE='db')
+class MonitoringStatisticsTestCase(TestCase):
+    # Monitoring statistics should be calculated with fixed number of queries and cached
+    # until monitoring data is changed.
+
+    def setUp(self):
+        # GIVEN interaction monitoring with parameter
+        self.monitoring = mommy.make(Monitoring, status=INT)
+        parameter = mommy.make(Parameter, monitoring=self.monitoring, weight=1)
+        # AND 2 approved tasks with scores 100 and 0 (50 and 0 initially)
+        for found, found_initial in [(1, 0), (0, 0)]:
+            task = mommy.make(Task, organization__monitoring=self.monitoring, status=Task.TASK_APPROVED)
+            score = mommy.make(Score, task=task, parameter=parameter, found=found)
+            mommy.make(Score, task=task, parameter=parameter, found=found_initial, revision=Score.INTERIM)
+        # AND organization representative, who has seen the first organization
+        orguser = User.objects.create_user('org', 'org@svobodainfo.org', 'password')
+        mommy.make(OrgUser, organization=score.task.organization, userprofile=orguser.profile, seen=True)
+        # AND comments of representative and expert to the last score
+        content_type = ContentType.objects.get_for_model(Score)
+        for user in [orguser, orguser, score.task.user]:
+            CommentExmo.objects.create(content_type=content_type, object_pk=score.pk, user=user,
+                                       site=Site.objects.get_current())
+        # AND statistics is cached in local memory
+        cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='view-cache')
+        cache.clear()
+        patcher = patch('exmo2010.view_cache.cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_statistics(self):
+        # WHEN statistics is calculated
+        stat = self.monitoring.compute_statistics()
+        # THEN it has counts of organizations, representatives, experts and comments
+        self.assertEqual(stat['organization'], 2)
+        self.assertEqual(stat['organization_rated'], 2)
+        self.assertEqual(stat['organization_users'], 1)
+        self.assertEqual(stat['organization_users_active'], 1)
+        self.assertEqual(stat['expert'], 2)
+        self.assertEqual(stat['comment_organization'], 2)
+        self.assertEqual(stat['comment_expert'], 1)
+        # AND average openness of approved tasks
+        self.assertEqual(stat['avg_openness'], 50)
+        self.assertEqual(stat['avg_openness_initial'], 0)
+
+    def test_queries(self):
+        # WHEN task openness is materialized
+        self.monitoring.rating()
+        # THEN statistics is calculated with fixed number of queries
+        with self.assertNumQueries(9):
+            self.monitoring.compute_statistics()
+
+    def test_cache(self):
+        # WHEN statistics is requested twice
+        self.monitoring.statistics()
+        # THEN it is calculated once
+        with self.assertNumQueries(0):
+            self.monitoring.statistics()
+
+        # WHEN organization is added
+        mommy.make(Organization, monitoring=self.monitoring)
+        # THEN statistics is calculated again
+        self.assertEqual(self.monitoring.statistics()['organization'], 3)
+
+    def test_periodic_refresh(self):
+        with patch.object(Monitoring, 'compute_statistics', autospec=True,
+                          side_effect=Monitoring.compute_statistics) as compute:
+            # WHEN statistics is refreshed by periodic task twice
+            refresh_monitoring_statistics()
+            refresh_monitoring_statistics()
+        # THEN it is calculated once
+        self.assertEqual(compute.call_count, 1)
+
+
+class ParameterFoundReportTestCase(TestCase):
+    # exmo2010:monitoring_parameter_found_report
+
+    # Should count relevant organizations and found scores of approved tasks for every parameter
+    # with one query and export the report as CSV.
+
+    def setUp(self):
+        # GIVEN monitoring with 2 parameters
+        self.monitoring = mommy.make(Monitoring)
+        param1 = mommy.make(Parameter, monitoring=self.monitoring, code=1, name='a')
+        param2 = mommy.make(Parameter, monitoring=self.monitoring, code=2, name='b')
+        # AND 3 organizations, second parameter is excluded for the first organization
+        org1, org2, org3 = mommy.make(Organization, monitoring=self.monitoring, _quantity=3)
+        param2.exclude.add(org1)
+        # AND approved tasks of the first and second organizations, open task of the third one
+        task1 = mommy.make(Task, organization=org1, status=Task.TASK_APPROVED)
+        task2 = mommy.make(Task, organization=org2, status=Task.TASK_APPROVED)
+        task3 = mommy.make(Task, organization=org3, status=Task.TASK_OPEN)
+        # AND found scores of all tasks and parameters, except first parameter of the second task
+        for task, param in [(task1, param1), (task1, param2), (task2, param2), (task3, param1), (task3, param2)]:
+            mommy.make(Score, task=task, parameter=param, found=1)
+        mommy.make(Score, task=task2, parameter=param1, found=0)
+        # AND expert A account
+        expertA = User.objects.create_user('expertA', 'usr@svobodainfo.org', 'password')
+        expertA.profile.is_expertA = True
+        self.client.login(username='expertA', password='password')
+        self.url = reverse('exmo2010:monitoring_parameter_found_report', args=[self.monitoring.pk])
+
+    def test_report(self):
+        # WHEN parameter found report is calculated
+        with self.assertNumQueries(1):
+            report = _parameter_found_report(self.monitoring)
+        # THEN every parameter has count of relevant organizations and found scores of approved tasks
+        self.assertEqual([(o['parameter'].code, o['organization_count'], o['score_count'])
+                          for o in report['object_list']], [(1, 3, 1), (2, 2, 1)])
+        # AND totals are summed up
+        self.assertEqual(report['organization_count_total'], 5)
+        self.assertEqual(report['score_count_total'], 2)
+
+    def test_page(self):
+        # WHEN I get parameter found report page
+        response = self.client.get(self.url)
+        # THEN report is shown
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['object_list']), 2)
+
+    def test_csv(self):
+        # WHEN I get parameter found report as CSV
+        response = self.client.get(self.url + '?format=csv')
+        # THEN response is csv file with the same data
+        self.assertEqual(response.get('content-type'), 'application/vnd.ms-excel')
+        rows = list(UnicodeReader(StringIO(response.content)))
+        self.assertEqual([row[2:4] for row in rows[1:]], [['3', '1'], ['2', '1'], ['5', '2']])
+
+
 class MonitoringCopyFormTestCase(TestCase):
     # MonitoringCopyForm should validate user form and return corrected values
 
@@ -768,6 +972,97 @@ class MonitoringCopyFormTestCase(TestCase):
         self.assertEqual(form.cleaned_data['donors'], expected_list)
 
 
+class MonitoringCopyTestCase(TestCase):
+    # exmo2010:monitoring_copy
+
+    # Should copy organizations, tasks, parameters with exclusions, scores and representatives
+    # to the new monitoring, both in request and in background job.
+
+    def setUp(self):
+        # GIVEN monitoring with 2 organizations and 2 parameters, second parameter is excluded for second organization
+        self.monitoring = mommy.make(Monitoring)
+        org1, org2 = mommy.make(Organization, monitoring=self.monitoring, _quantity=2)
+        param1 = mommy.make(Parameter, monitoring=self.monitoring, code=1)
+        param2 = mommy.make(Parameter, monitoring=self.monitoring, code=2)
+        param2.exclude.add(org2)
+        # AND task for each organization
+        expertB = mommy.make(User)
+        task1 = mommy.make(Task, organization=org1, user=expertB)
+        mommy.make(Task, organization=org2, user=expertB)
+        # AND final and interim scores in first task
+        mommy.make(Score, task=task1, parameter=param1, found=1, revision=Score.FINAL)
+        mommy.make(Score, task=task1, parameter=param1, found=0, revision=Score.INTERIM)
+        # AND representative of first organization
+        orguser = mommy.make(User)
+        mommy.make(OrgUser, organization=org1, userprofile=orguser.profile)
+        # AND I am logged in as expert A
+        expertA = User.objects.create_user('expertA', 'expertA@svobodainfo.org', 'password')
+        expertA.profile.is_expertA = True
+        self.client.login(username='expertA', password='password')
+
+    def copy_monitoring(self):
+        now = datetime.datetime.now().strftime(get_format('DATE_INPUT_FORMATS')[0])
+        url = reverse('exmo2010:monitoring_copy', args=[self.monitoring.pk])
+        self.response = self.client.post(url, {
+            'name_%s' % get_language(): 'monitoring copy',
+            'status': PRE,
+            'openness_expression': 8,
+            'donors': ['organizations', 'parameters', 'tasks', 'current_scores', 'representatives'],
+            'rate_date': now,
+            'interact_date': now,
+            'finishing_date': now,
+            'publish_date': now,
+        })
+        return Monitoring.objects.exclude(pk=self.monitoring.pk).get()
+
+    def assertCopied(self, monitoring):
+        # new organizations have distinct invitation codes
+        orgs = Organization.objects.filter(monitoring=monitoring)
+        self.assertEqual(len(set(orgs.values_list('inv_code', flat=True))), 2)
+        org1, org2 = orgs.order_by('pk')
+        # second parameter is excluded for copy of second organization
+        param2 = Parameter.objects.get(monitoring=monitoring, code=2)
+        self.assertEqual(list(param2.exclude.all()), [org2])
+        # tasks are copied with history
+        self.assertEqual(Task.objects.filter(organization__monitoring=monitoring).count(), 2)
+        self.assertEqual(TaskHistory.objects.filter(task__organization__monitoring=monitoring).count(), 2)
+        # only final score is copied to the copy of first task
+        scores = Score.objects.filter(task__organization=org1, parameter__code=1)
+        self.assertEqual(list(scores.values_list('found', 'revision')), [(1, Score.FINAL)])
+        # representative is copied
+        self.assertEqual(list(OrgUser.objects.filter(organization__monitoring=monitoring).values_list(
+            'organization', 'seen')), [(org1.pk, False)])
+
+    def test_copy(self):
+        # WHEN I copy monitoring
+        monitoring = self.copy_monitoring()
+        # THEN all data is copied
+        self.assertCopied(monitoring)
+
+    @override_settings(MONITORING_COPY_BACKGROUND_SCORES=0)
+    def test_background_copy(self):
+        # WHEN I copy monitoring with more scores than may be copied in request
+        monitoring = self.copy_monitoring()
+        # THEN all data is copied by background job
+        self.assertCopied(monitoring)
+        # AND I am redirected to monitoring edit page, which polls progress of the job
+        response = self.client.get(self.response['Location'])
+        self.assertEqual(response.context['copy_progress_url'],
+                         reverse('exmo2010:monitoring_copy_progress', args=[monitoring.pk]))
+
+    @override_settings(MONITORING_COPY_BACKGROUND_SCORES=0)
+    def test_background_copy_failure(self):
+        # WHEN I copy monitoring in background and copy job fails
+        with patch.object(MonitoringCopy, 'run', side_effect=Exception):
+            self.assertRaises(Monitoring.DoesNotExist, self.copy_monitoring)
+        # THEN the new monitoring is deleted
+        self.assertEqual(list(Monitoring.objects.all()), [self.monitoring])
+        # AND copy progress is reported as failed
+        monitoring_pk = resolve(urlparse(self.response['Location']).path).kwargs['monitoring_pk']
+        url = reverse('exmo2010:monitoring_copy_progress', args=[monitoring_pk])
+        self.assertEqual(json.loads(self.client.get(url).content)['state'], 'FAILURE')
+
+
 class RatingRecommendationsStatsTestCase(TestCase):
     # exmo2010:monitoring_rating
 
@@ -837,6 +1132,35 @@ class RatingRecommendationsStatsTestCase(TestCase):
         self.assertEqual(response.context['rating_list'][0].done_recommends_len, 0)
 
 
+class CommentsStatsQueriesTestCase(TestCase):
+    # Rating comments and recommendations statistics should be calculated with constant number of queries.
+
+    def setUp(self):
+        # GIVEN monitoring with 2 parameters
+        self.monitoring = mommy.make(Monitoring)
+        params = mommy.make(Parameter, monitoring=self.monitoring, weight=1, _quantity=2)
+        # AND 3 approved tasks with representatives, scores and comments of representatives
+        self.tasks = []
+        for i in range(3):
+            task = mommy.make(Task, status=Task.TASK_APPROVED, organization__monitoring=self.monitoring)
+            orguser = User.objects.create_user('org%d' % i, 'org%d@svobodainfo.org' % i, 'password')
+            mommy.make(OrgUser, organization=task.organization, userprofile=orguser.profile)
+            for param in params:
+                score = mommy.make(Score, task=task, parameter=param, recommendations='lol')
+                mommy.make(CommentExmo, object_pk=score.pk, user=orguser, content_type=ContentType.objects.get_for_model(Score))
+            self.tasks.append(task)
+
+    def test_queries(self):
+        # WHEN statistics for all tasks is calculated
+        with self.assertNumQueries(4):
+            stats = _comments_stats(self.monitoring, self.tasks)
+
+        # THEN every task has 1 active representative, 2 comments and 2 recommendations
+        self.assertEqual([(t.active_repr_len, t.num_comments, t.interim_recommends_len) for t in self.tasks],
+                         [(1, 2, 2)] * 3)
+        self.assertEqual(stats['sum_num_comments'], 6)
+
+
 class CopyMonitoringViewTestCase(TestCase):
     # exmo2010:monitoring_copy
 
@@ -18,22 +18,21 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
-from collections import defaultdict
-from copy import deepcopy
 from operator import attrgetter
 
+from celery.result import AsyncResult
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.contrib.comments.models import Comment
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
 from django.db import transaction
-from django.db.models import Count, Q
+from django.db.models import Avg, Count, F, Q
 from django.db.utils import DEFAULT_DB_ALIAS
 from django.forms import Form, ModelMultipleChoiceField, CheckboxSelectMultiple, BooleanField
 from django.forms.models import modelformset_factory, modelform_factory
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
 from django.utils.translation import ugettext as _
@@ -42,13 +41,21 @@ from django.views.generic import DeleteView, DetailView, UpdateView
 from .forms import MonitoringCopyForm, MonitoringsQueryForm, RatingsQueryForm, RatingQueryForm, ObserversGroupQueryForm
 from auth.helpers import perm_filter
 from core.helpers import table
+from core.response import JSONResponse
+from core.sql import sql_initial_revision_filter, sql_parameter_found_report
+from core.utils import UnicodeWriter
 from core.views import login_required_on_deny, LoginRequiredMixin
+from custom_comments.models import CommentExmo
 from custom_comments.utils import comment_report
+from exmo2010.celery_tasks import copy_monitoring, copy_task_id
 from exmo2010.columns_picker import monitorings_index_columns_form, rating_columns_form
 from exmo2010.forms import FilteredSelectMultiple
 from exmo2010.models import (Claim, Clarification, Monitoring, ObserversGroup, Organization, OrgUser,
-                             Parameter, Questionnaire, Score, Task, UserProfile, generate_inv_code)
+                             Parameter, Questionnaire, Score, Task, TaskOpenness,
+                             update_monitorings_openness)
 from exmo2010.models.monitoring import MONITORING_PREPARE, MONITORING_PUBLISHED, MONITORING_STATUS, PUB
+from exmo2010.monitoring_copy import MonitoringCopy
+from exmo2010.view_cache import cached_view_data, view_cache_key
 from modeltranslation_utils import CurLocaleModelForm
 from parameters.forms import ParamCritScoreFilterForm, ParameterTypeForm
 from perm_utils import annotate_exmo_perms
@@ -162,6 +169,14 @@ class MonitoringEditView(MonitoringMixin, UpdateView):
             initial.update({'add_questionnaire': self.object.has_questionnaire})
         return initial
 
+    def get_context_data(self, **kwargs):
+        context = super(MonitoringEditView, self).get_context_data(**kwargs)
+        context['copy_progress_url'] = None
+        if self.object and 'copying' in self.request.GET:
+            # Monitoring data is being copied in background, page polls progress of the job.
+            context['copy_progress_url'] = reverse('exmo2010:monitoring_copy_progress', args=[self.object.pk])
+        return context
+
     def get_object(self, queryset=None):
         if 'monitoring_pk' in self.kwargs:
             # Existing monitoring edit page
@@ -261,8 +276,11 @@ class MonitoringCopyView(LoginRequiredMixin, UpdateView):
             raise PermissionDenied
         return self.monitoring
 
-    def get_success_url(self):
-        return '%s?%s' % (reverse('exmo2010:monitoring_update', args=[self.monitoring.pk]), self.request.GET.urlencode())
+    def get_success_url(self, background=False):
+        query = self.request.GET.copy()
+        if background:
+            query['copying'] = 1
+        return '%s?%s' % (reverse('exmo2010:monitoring_update', args=[self.monitoring.pk]), query.urlencode())
 
     def get_form_kwargs(self):
         kwargs = super(MonitoringCopyView, self).get_form_kwargs()
@@ -271,84 +289,43 @@ class MonitoringCopyView(LoginRequiredMixin, UpdateView):
         return kwargs
 
     def form_valid(self, form):
+        origin_monitoring = self.get_object()
+        donors = form.cleaned_data.get('donors', set())
+        background = Score.objects.filter(task__organization__monitoring=origin_monitoring).count() \
+            > settings.MONITORING_COPY_BACKGROUND_SCORES
+
         with transaction.commit_on_success():
-            origin_monitoring = self.get_object()
             self.monitoring = form.save()
-            cd = form.cleaned_data
-
-            if cd.get('add_questionnaire'):
+            if form.cleaned_data.get('add_questionnaire'):
                 Questionnaire.objects.create(monitoring=self.monitoring)
+            if not background:
+                MonitoringCopy(origin_monitoring, self.monitoring, donors).run()
 
-            organization_map = {}
-            task_map = {}
-            parameter_map = {}
-
-            orgs = Organization.objects.filter(monitoring=origin_monitoring)
-            for org in orgs:
-                copied_org = deepcopy(org)
-                copied_org.id = None
-                copied_org.monitoring = self.monitoring
-                copied_org.inv_status = 'NTS'
-                copied_org.inv_code = generate_inv_code(6)
-                copied_org.save()
-                organization_map[org.id] = copied_org.id
-
-            if 'tasks' in cd.get('donors', []):
-                for task in Task.objects.filter(organization__monitoring=origin_monitoring):
-                    copied_task = deepcopy(task)
-                    copied_task.id = None
-                    copied_task.organization_id = organization_map[task.organization_id]
-                    copied_task.save()
-                    task_map[task.id] = copied_task.id
-
-            if 'parameters' in cd.get('donors', []):
-                for param in Parameter.objects.filter(monitoring=origin_monitoring):
-                    copied_param = deepcopy(param)
-                    copied_param.id = None
-                    copied_param.monitoring = self.monitoring
-                    copied_param.save()
-                    copied_param.exclude.add(*[organization_map[x] for x in param.exclude.values_list('pk', flat=True)])
-                    parameter_map[param.id] = copied_param.id
-
-            scores = None
-            if 'all_scores' in cd.get('donors', []):
-                scores = Score.objects.filter(task__organization__monitoring=origin_monitoring,
-                                              parameter__monitoring=origin_monitoring)
-            elif 'current_scores' in cd.get('donors', []):
-                scores = Score.objects.filter(task__organization__monitoring=origin_monitoring,
-                                              parameter__monitoring=origin_monitoring,
-                                              revision=Score.FINAL)
-            if scores:
-                bulk_of_scores = []
-                for score in scores:
-                    copied_score = deepcopy(score)
-                    copied_score.id = None
-                    copied_score.task_id = task_map[score.task_id]
-                    copied_score.parameter_id = parameter_map[score.parameter_id]
-                    bulk_of_scores.append(copied_score)
-
-                # Disable 'auto_now' option to copy 'last_modified' field as is
-                for field in Score._meta.local_fields:
-                    if field.name == 'last_modified':
-                        field.auto_now = False
-                # Then create all scores in one query
-                Score.objects.bulk_create(bulk_of_scores, batch_size=3000)
-                # And restore 'auto_now' option
-                for field in Score._meta.local_fields:
-                    if field.name == 'last_modified':
-                        field.auto_now = True
-
-            if 'representatives' in cd.get('donors', []):
-                orgusers = UserProfile.objects.filter(organization__monitoring=origin_monitoring)
-                for user in orgusers:
-                    org_pks = user.organization.values_list('pk', flat=True)
-                    for pk in org_pks:
-                        if pk in organization_map:
-                            if not OrgUser.objects.filter(organization_id=organization_map[pk], userprofile=user).exists():
-                                orguser = OrgUser(organization_id=organization_map[pk], userprofile=user, seen=False)
-                                orguser.save()
+        if background:
+            # New monitoring is committed already, so it is visible to celery worker.
+            copy_monitoring.apply_async((origin_monitoring.pk, self.monitoring.pk, donors),
+                                        task_id=copy_task_id(self.monitoring.pk))
 
-        return HttpResponseRedirect(self.get_success_url())
+        return HttpResponseRedirect(self.get_success_url(background))
+
+
+@login_required
+def monitoring_copy_progress(request, monitoring_pk):
+    """
+    Progress of background monitoring copy job.
+
+    """
+    monitorings = Monitoring.objects.filter(pk=monitoring_pk)
+    if not monitorings:
+        # New monitoring is deleted by failed copy job, which only expert A could start.
+        if not request.user.is_expertA:
+            raise PermissionDenied
+        return JSONResponse(state='FAILURE', done=None, total=None)
+    if not request.user.has_perm('exmo2010.admin_monitoring', monitorings[0]):
+        raise PermissionDenied
+    result = AsyncResult(copy_task_id(monitoring_pk))
+    info = result.info if isinstance(result.info, dict) else {}
+    return JSONResponse(state=result.state, done=info.get('done'), total=info.get('total'))
 
 
 @login_required_on_deny
@@ -374,59 +351,57 @@ def monitoring_rating(request, monitoring_pk):
         monitoring.parameter_set.all(), widget=CheckboxSelectMultiple)
 
     params = params_form.cleaned_data['params'] if params_form.is_valid() else None
-
     rating_type = request.GET.get('type', 'all')
-    rating_list = monitoring.rating(params, rating_type)
+    queryform = RatingQueryForm(request.GET)
+
+    def rating_data():
+        rating_list = monitoring.rating(params, rating_type)
+
+        orgs = set()
+        if user.is_active:
+            # Include all orgs from all observers groups that current user belongs to.
+            obs_groups = user.observersgroup_set.filter(monitoring=monitoring)
+            orgs = orgs.union(set(obs_groups.values_list('organizations__pk', flat=True)))
+
+        if user.is_expert or monitoring.is_published:
+            if queryform.is_valid():
+                queryset = queryform.apply(monitoring.organization_set.all())
+                orgs = orgs.union(set(queryset.values_list('pk', flat=True)))
+                rating_list = [t for t in rating_list if t.organization.pk in orgs]
+
+            approved_tasks = Task.approved_tasks.filter(organization__monitoring=monitoring).distinct()
+            rating_stats = dict(_comments_stats(monitoring, rating_list), **{
+                'num_approved_tasks': approved_tasks.count(),
+                'num_rated_tasks': len(rating_list),
+                'openness': avg('task_openness', rating_list),
+                'openness_initial': avg('task_openness_initial', rating_list),
+                'openness_delta': avg('openness_delta', rating_list)
+            })
+            return rating_list, rating_stats
+        else:
+            if user.is_organization:
+                orgs = orgs.union(set(user.profile.organization.values_list('pk', flat=True)))
+            return [t for t in rating_list if t.organization.pk in orgs], None
+
+    # Rating is cached until monitoring data is changed.
+    rating_list, rating_stats = cached_view_data(
+        view_cache_key('monitoring_rating', monitoring.pk, request), rating_data)
 
     context = {
         'monitoring': monitoring,
         'rating_type': rating_type,
         'params_form': params_form,
         'rating_columns_form': columns_form,
+        'rating_list': rating_list,
+        'rating_stats': rating_stats,
     }
-
-    orgs = set()
-    if user.is_active:
-        # Include all orgs from all observers groups that current user belongs to.
-        obs_groups = user.observersgroup_set.filter(monitoring=monitoring)
-        orgs = orgs.union(set(obs_groups.values_list('organizations__pk', flat=True)))
-
     if user.is_expert or monitoring.is_published:
-
-        queryform = RatingQueryForm(request.GET)
-
-        if queryform.is_valid():
-            queryset = queryform.apply(monitoring.organization_set.all())
-            orgs = orgs.union(set(queryset.values_list('pk', flat=True)))
-            rating_list = [t for t in rating_list if t.organization.pk in orgs]
-
-        approved_tasks = Task.approved_tasks.filter(organization__monitoring=monitoring).distinct()
-        rating_stats = dict(_comments_stats(rating_list), **{
-            'num_approved_tasks': approved_tasks.count(),
-            'num_rated_tasks': len(rating_list),
-            'openness': avg('task_openness', rating_list),
-            'openness_initial': avg('task_openness_initial', rating_list),
-            'openness_delta': avg('openness_delta', rating_list)
-        })
-
-        context.update({
-            'rating_list': rating_list,
-            'rating_stats': rating_stats,
-            'queryform': queryform,
-        })
-    else:
-        if user.is_organization:
-            orgs = orgs.union(set(user.profile.organization.values_list('pk', flat=True)))
-        rating_list = [t for t in rating_list if t.organization.pk in orgs]
-        context.update({
-            'rating_list': rating_list,
-            'rating_stats': None
-        })
+        context['queryform'] = queryform
 
     return TemplateResponse(request, 'rating.html', context)
 
 
-def _comments_stats(tasks):
+def _comments_stats(monitoring, tasks):
     """
     Calculate and annotate each task in the list with comment statistics
     Return summary comment statistics.
@@ -448,41 +423,32 @@ def _comments_stats(tasks):
             'avg_interim_recommends_len': 0,
             'avg_done_recommends_len': 0}
 
-    orgusers_by_task, orgcomments_by_task = defaultdict(list), defaultdict(list)
+    task_pks = [task.pk for task in tasks]
 
-    orgusers = User.objects.filter(userprofile__organization__task__in=tasks)\
-                           .values_list('pk', 'userprofile__organization__task')
-    for uid, tid in orgusers:
-        orgusers_by_task[tid].append(uid)
+    orgusers = OrgUser.objects.filter(organization__monitoring=monitoring).order_by()\
+                              .values_list('organization_id').annotate(Count('userprofile'))
+    repr_len_by_org = dict(orgusers)
 
-    orgcomments = Comment.objects.filter(user__in=[uid for uid, tid in orgusers])\
-                                 .values_list('user_id', 'object_pk')
+    orgcomments = CommentExmo.objects.filter(
+        monitoring_id=monitoring.pk,
+        user__in=User.objects.filter(userprofile__organization__monitoring=monitoring))
+    orgcomments = orgcomments.order_by().values_list('task_id')\
+                             .annotate(Count('pk'), Count('user', distinct=True))
+    orgcomments_by_task = dict((tid, (num, active)) for tid, num, active in orgcomments)
 
-    scores = Score.objects.filter(pk__in=[sid for uid, sid in orgcomments])
-    tasks_by_scores = dict(scores.values_list('pk', 'task_id'))
-    for uid, sid in orgcomments:
-        if int(sid) in tasks_by_scores:
-            orgcomments_by_task[tasks_by_scores[int(sid)]].append(uid)
+    recommended = Score.objects.filter(task_id__in=task_pks).order_by()\
+                               .exclude(recommendations__isnull=True).exclude(recommendations='')
+    final_recommends_by_task = dict(
+        recommended.filter(revision=Score.FINAL).values_list('task_id').annotate(Count('pk')))
+    interim_recommends_by_task = dict(
+        recommended.extra(where=[sql_initial_revision_filter]).values_list('task_id').annotate(Count('pk')))
 
     for task in tasks:
-        task.num_comments = len(orgcomments_by_task[task.pk])
-        task.repr_len = len(orgusers_by_task[task.pk])
-        task.active_repr_len = len(set(orgcomments_by_task[task.pk]))
-
-        task.interim_recommends_len = 0
-        task.final_recommends_len = 0
-
-        scores = list(task.score_set.only('recommendations', 'revision', 'parameter', 'id', 'task'))
-
-        final_scores = [s for s in scores if s.revision == Score.FINAL]
-        interim_scores_by_param = dict((s.parameter_id, s) for s in scores if s.revision == Score.INTERIM)
-        for score in final_scores:
-            interim_score = interim_scores_by_param.get(score.parameter_id, score)
-            if score.recommendations:
-                task.final_recommends_len += 1
-            if interim_score.recommendations:
-                task.interim_recommends_len += 1
+        task.num_comments, task.active_repr_len = orgcomments_by_task.get(task.pk, (0, 0))
+        task.repr_len = repr_len_by_org.get(task.organization_id, 0)
 
+        task.final_recommends_len = final_recommends_by_task.get(task.pk, 0)
+        task.interim_recommends_len = interim_recommends_by_task.get(task.pk, 0)
         task.done_recommends_len = task.interim_recommends_len - task.final_recommends_len
 
     return {
@@ -658,53 +624,58 @@ def monitoring_parameter_found_report(request, monitoring_pk):
     if not request.user.has_perm('exmo2010.admin_monitoring', monitoring):
         raise PermissionDenied
 
-    query = '''(select count(*) from %(orgtable)s where %(orgtable)s.monitoring_id = %(monitoring)s) -
-                    (select count(*) from %(parameterexclude_table)s where %(parameterexclude_table)s.parameter_id = %(parameter_table)s.id
-                        and %(parameterexclude_table)s.organization_id in
-                                (select id from %(orgtable)s where %(orgtable)s.monitoring_id = %(monitoring)s))''' % {
-        'orgtable': Organization._meta.db_table,
-        'monitoring': monitoring.pk,
-        'parameterexclude_table': ('%s_%s') % (Parameter._meta.db_table, 'exclude'),
-        'parameter_table': Parameter._meta.db_table,
-    }
-    queryset = Parameter.objects.filter(monitoring=monitoring).extra(select={'organization_count': query})
+    report = _parameter_found_report(monitoring)
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(mimetype='application/vnd.ms-excel')
+        response['Content-Disposition'] = 'attachment; filename=parameter-found-report-%s.csv' % monitoring.pk
+        response.encoding = 'UTF-16'
+        writer = UnicodeWriter(response)
+        writer.writerow(['#Code', 'Name', 'Organizations', 'Organizations with found parameters', '%'])
+        for obj in report['object_list']:
+            writer.writerow([obj['parameter'].code, obj['parameter'].name, obj['organization_count'],
+                             obj['score_count'], '%.3f' % obj['score_per_organization']])
+        writer.writerow(['#Total', '', report['organization_count_total'], report['score_count_total'],
+                         '%.3f' % report['score_per_organization_total']])
+        return response
+
+    return TemplateResponse(request, 'manage_monitoring/parameter_found_report.html', dict(report, monitoring=monitoring))
+
+
+def _parameter_found_report(monitoring):
+    """
+    Count organizations, for which parameter is relevant, and found scores of their approved tasks
+    for every parameter of monitoring with one grouped query.
+
+    """
+    parameters = list(Parameter.objects.raw(sql_parameter_found_report % {
+        'monitoring_pk': monitoring.pk,
+        'task_status': Task.TASK_APPROVED,
+        'revision': Score.REVISION_DEFAULT,
+    }))
     object_list = []
-    score_count_total = 0
-    organization_count_total = 0
-    score_per_organization_total = 0
-    queryset_list = list(queryset)
-    for parameter in queryset_list:
-        score_count = Score.objects.filter(
-            task__organization__monitoring=monitoring,
-            task__status=Task.TASK_APPROVED,
-            found=1,
-            parameter=parameter,
-            revision=Score.REVISION_DEFAULT,
-        ).exclude(
-            task__organization__in=parameter.exclude.all(),
-        ).count()
-        score_count_total += score_count
-        organization_count_total += parameter.organization_count
+    for parameter in parameters:
         score_per_organization = 0
         if parameter.organization_count:
-            score_per_organization = float(score_count) / parameter.organization_count * 100
-        obj = {
+            score_per_organization = float(parameter.score_count) / parameter.organization_count * 100
+        object_list.append({
             'parameter': parameter,
             'organization_count': parameter.organization_count,
-            'score_count': score_count,
+            'score_count': parameter.score_count,
             'score_per_organization': score_per_organization,
-        }
-        object_list.append(obj)
+        })
+    score_count_total = sum(p.score_count for p in parameters)
+    organization_count_total = sum(p.organization_count for p in parameters)
+    score_per_organization_total = 0
     if organization_count_total:
         score_per_organization_total = float(score_count_total) / organization_count_total * 100
 
-    return TemplateResponse(request, 'manage_monitoring/parameter_found_report.html', {
-        'monitoring': monitoring,
+    return {
         'object_list': object_list,
         'score_count_total': score_count_total,
         'organization_count_total': organization_count_total,
         'score_per_organization_total': score_per_organization_total,
-    })
+    }
 
 
 class MonitoringCommentReportView(LoginRequiredMixin, UpdateView):
@@ -759,21 +730,35 @@ def ratings(request):
 
     queryset = queryset.annotate(org_count=Count('organization')).order_by('-publish_date')
 
-    for m in queryset:
-        if m.status == MONITORING_PUBLISHED:
-            sql_openness = m.openness_expression.get_sql_openness()
-            tasks = Task.approved_tasks.filter(organization__monitoring=m).extra(select={'_openness': sql_openness})
-            m.avg_openness = avg('_openness', tasks)
-        else:
-            m.avg_openness = 0
-
     queryform = RatingsQueryForm(request.GET)
 
     if queryform.is_valid():
         queryset = queryform.apply(queryset)
 
+    def monitoring_list():
+        # Average openness of all published monitorings is calculated with single query over materialized openness.
+        monitorings = list(queryset)
+        published = [m for m in monitorings if m.status == MONITORING_PUBLISHED]
+        update_monitorings_openness(published)
+        avg_openness = dict(TaskOpenness.objects.filter(
+            monitoring__in=published,
+            rating_type='all',
+            openness_code=F('monitoring__openness_expression'),
+            task__status=Task.TASK_APPROVED).values_list('monitoring').annotate(Avg('openness')).order_by())
+
+        for m in monitorings:
+            if m.status == MONITORING_PUBLISHED:
+                value = avg_openness.get(m.pk)
+                m.avg_openness = None if value is None else round(value, 3)
+            else:
+                m.avg_openness = 0
+        return monitorings
+
+    # Monitorings list is cached until data of any monitoring is changed.
+    monitorings = cached_view_data(view_cache_key('ratings', None, request), monitoring_list)
+
     context = {
-        'monitoring_list': queryset,
+        'monitoring_list': monitorings,
         'queryform': queryform,
     }
 
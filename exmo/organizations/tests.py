@@ -192,10 +192,10 @@ class OrguserCommentCountTestCase(TestCase):
         score_org2 = mommy.make(Score, task__organization=self.org2, parameter=self.param)
 
         # AND 2 comments from representative for org1 score
-        mommy.make(CommentExmo, object_pk=score_org1.pk, user=orguser)
-        mommy.make(CommentExmo, object_pk=score_org1.pk, user=orguser)
+        mommy.make(CommentExmo, object_pk=score_org1.pk, user=orguser, content_type=ContentType.objects.get_for_model(Score))
+        mommy.make(CommentExmo, object_pk=score_org1.pk, user=orguser, content_type=ContentType.objects.get_for_model(Score))
         # AND 1 comment from representative for org2 score
-        mommy.make(CommentExmo, object_pk=score_org2.pk, user=orguser)
+        mommy.make(CommentExmo, object_pk=score_org2.pk, user=orguser, content_type=ContentType.objects.get_for_model(Score))
 
         # AND expert A
         self.expertA = User.objects.create_user('expertA', 'expertA@svobodainfo.org', 'password')
@@ -32,8 +32,9 @@ from django.utils.translation import ugettext as _
 from .forms import OrganizationsQueryForm, RepresentativesQueryForm
 from core.views import LoginRequiredMixin
 from core.widgets import ModelMultiRawInput
+from custom_comments.models import CommentExmo
 from exmo2010.models import (
-    Monitoring, Organization, Score, UserProfile, OrgUser)
+    Monitoring, Organization, UserProfile, OrgUser)
 from modeltranslation_utils import CurLocaleModelForm
 
 
@@ -171,10 +172,10 @@ class RepresentativesView(LoginRequiredMixin, DetailView):
 
         for org in orgs:
             org.users = []
+            tasks = list(org.task_set.values_list('pk', flat=True))
             for user in sorted(org.userprofile_set.all(), key=lambda u: u.full_name):
                 if user.pk in queried_users:
-                    scores = Score.objects.filter(task__organization=org).values_list('pk', flat=True)
-                    user.comments = user.user.comment_comments.filter(object_pk__in=scores)
+                    user.comments = CommentExmo.objects.filter(user=user.user, task_id__in=tasks)
                     user.seen = OrgUser.objects.filter(userprofile=user, organization=org, seen=True).exists()
                     org.users.append(user)
 
@@ -22,6 +22,8 @@ import re
 from django.db.models import Model
 from django.db.models.query import QuerySet
 
+from auth.helpers import get_perms_map, perm_queries
+
 
 class ObjectPermissons(object):
     '''
@@ -35,17 +37,25 @@ class ObjectPermissons(object):
     >>> perms['can_edit_task']
     True
 
+    If set of permissions (without prefix) is given, it is used instead of checking permissions.
+
     '''
-    def __init__(self, user, obj, perm_prefix=None):
+    def __init__(self, user, obj, perm_prefix=None, perms=None):
         self.user = user
         self.obj = obj
         self.perm_prefix = perm_prefix or ''
+        self.perms = perms
 
     def __getitem__(self, perm):
+        if self.perms is not None:
+            return perm in self.perms
         return self.user.has_perm(self.perm_prefix + perm, self.obj)
 
     def __iter__(self):
-        perms = self.user.get_all_permissions(self.obj)
+        if self.perms is not None:
+            perms = self.perms
+        else:
+            perms = self.user.get_all_permissions(self.obj)
         perms = set(re.sub('^' + self.perm_prefix, '', p) for p in perms)   # strip prefix
         if hasattr(self.obj, 'current_transitions') and hasattr(self.obj, 'transitions'):
             nonstate_perms = perms - set(self.obj.transitions)
@@ -73,8 +83,9 @@ class PermsQuerySet(QuerySet):
         if perm_prefix is not None:
             self.perm_prefix = perm_prefix
         if self.perm_user and self._result_cache:
+            perms_map = precompute_perms(self._result_cache, self.perm_user, self.perm_prefix)
             for obj in self._result_cache:
-                obj.perms = ObjectPermissons(self.perm_user, obj, self.perm_prefix)
+                obj.perms = ObjectPermissons(self.perm_user, obj, self.perm_prefix, perms_map.get(obj.pk))
 
     def _fill_cache(self, num=None):
         super(PermsQuerySet, self)._fill_cache(num)
@@ -86,6 +97,21 @@ class PermsQuerySet(QuerySet):
         return res
 
 
+def precompute_perms(objs, user, perm_prefix):
+    '''
+    Return dict of permissions sets by object pk, if exmo2010 permissions of objects can be checked
+    with constant number of queries, otherwise empty dict (permissions will be checked per object).
+    Superuser permissions are not precomputed, as superuser has all non-exmo2010 permissions.
+    '''
+    objs = [obj for obj in objs if isinstance(obj, Model)]
+    if perm_prefix != 'exmo2010.' or user.is_superuser or not objs:
+        return {}
+    model = objs[0].__class__
+    if model not in perm_queries or any(obj.__class__ is not model for obj in objs):
+        return {}
+    return get_perms_map(user, objs)
+
+
 def annotate_perms(objs, user, perm_prefix=None):
     '''
     Add 'perms' attribute to the object or all objects in the list\queryset
@@ -100,8 +126,11 @@ def annotate_perms(objs, user, perm_prefix=None):
     elif isinstance(objs, Model):
         objs.perms = ObjectPermissons(user, objs, perm_prefix)
     elif hasattr(objs, '__iter__'):
+        if iter(objs) is objs:
+            objs = list(objs)
+        perms_map = precompute_perms(objs, user, perm_prefix)
         for obj in objs:
-            obj.perms = ObjectPermissons(user, obj, perm_prefix)
+            obj.perms = ObjectPermissons(user, obj, perm_prefix, perms_map.get(obj.pk))
     return objs
 
 
@@ -31,6 +31,7 @@ from django.utils.translation import ugettext as _
 from django.views.decorators.csrf import csrf_exempt
 
 from .forms import QuestionnaireDynForm
+from exmo2010.export_artifacts import artifact_response
 from exmo2010.models import Monitoring, Task, LicenseTextFragments
 from exmo2010.models import Questionnaire, QAnswer, QQuestion, QUESTION_TYPE_CHOICES, AnswerVariant
 from core.utils import UnicodeWriter
@@ -120,10 +121,25 @@ def answers_export(request, monitoring_pk):
     if hasattr(settings, 'DEBUG_EXPORT') and settings.DEBUG_EXPORT:
         response = HttpResponse(mimetype='text/plain')
     else:
+        response = artifact_response(request, monitoring, 'answers')
+        if response is not None:
+            return response
         response = HttpResponse(mimetype='application/vnd.ms-excel')
         response['Content-Disposition'] = 'attachment; filename=anketa-%s.csv' % monitoring.pk
     response.encoding = 'UTF-16'
-    writer = UnicodeWriter(response)
+    write_answers_csv(monitoring, response)
+
+    return response
+
+
+def write_answers_csv(monitoring, stream):
+    """
+    Write CSV with questionnaire answers of approved tasks to the stream.
+
+    """
+    questionnaire = Questionnaire.objects.get(monitoring=monitoring)
+    tasks = Task.approved_tasks.filter(organization__monitoring=monitoring)
+    writer = UnicodeWriter(stream)
 
     header = ['#organization', 'url']
     questions = QQuestion.objects.filter(questionnaire=questionnaire)
@@ -145,8 +161,6 @@ def answers_export(request, monitoring_pk):
     if license:
         writer.writerow([u'#%s' % license[0].csv_footer])
 
-    return response
-
 
 @login_required
 def ajax_get_qqt(request):
@@ -22,11 +22,14 @@ from bs4 import BeautifulSoup
 from contextlib import contextmanager
 
 from django.conf import settings
-from django.contrib.auth.models import User
+from django.contrib.auth.models import Group, User
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core.cache import get_cache
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
 from core.test_utils import TestCase
+from django.test.utils import override_settings
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _
 from mock import Mock, patch
@@ -35,9 +38,11 @@ from nose_parameterized import parameterized
 
 from core.test_utils import OptimizedTestCase
 from custom_comments.models import CommentExmo
-from exmo2010.models import Monitoring, ObserversGroup, Organization, Parameter, Task, Score, UserProfile, OrgUser
+from exmo2010.models import (Claim, Clarification, Monitoring, ObserversGroup, Organization, Parameter, Task, Score,
+                             UserProfile, OrgUser)
 from exmo2010.models.monitoring import INT, PUB, RATE
-from scores.views import rating_update
+from parameters.forms import ParametersQueryForm
+from scores.views import TaskScoresView, rating_update
 
 
 class ScoreAddAccessTestCase(TestCase):
@@ -948,3 +953,143 @@ class TaskScoresColumnsPickerTestCase(OptimizedTestCase):
         }
         visible = {col: response.context['columns_form'][col].value() for col in expected_data}
         self.assertEqual(visible, expected_data)
+
+
+@override_settings(SHARED_CACHE='db')
+class TaskScoresViewCacheTestCase(TestCase):
+    # exmo2010:task_scores
+
+    # Parameters with scores should be cached until monitoring data is changed.
+
+    def setUp(self):
+        # GIVEN published monitoring with 2 parameters
+        monitoring = mommy.make(Monitoring, status=PUB)
+        self.param1 = mommy.make(Parameter, monitoring=monitoring, weight=1, code=1)
+        self.param2 = mommy.make(Parameter, monitoring=monitoring, weight=1, code=2)
+        # AND approved task with score for the first parameter
+        self.task = mommy.make(Task, organization__monitoring=monitoring, status=Task.TASK_APPROVED)
+        self.score = mommy.make(Score, task=self.task, parameter=self.param1, found=1)
+        # AND expert A account
+        expertA = User.objects.create_user('expertA', 'usr@svobodainfo.org', 'password')
+        expertA.profile.is_expertA = True
+        self.client.login(username='expertA', password='password')
+        self.url = reverse('exmo2010:task_scores', args=[self.task.pk])
+        # AND pages data is cached in local memory
+        cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='view-cache')
+        cache.clear()
+        patcher = patch('exmo2010.view_cache.cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached_scores(self):
+        # WHEN I get task scores page twice
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        # THEN cached parameters have scores
+        self.assertEqual([p.score_pk for p in response.context['relevant_parameters']], [self.score.pk, 0])
+
+    def test_exclusion(self):
+        # WHEN I get task scores page
+        self.client.get(self.url)
+        # AND the second parameter is excluded for the organization
+        self.param2.exclude.add(self.task.organization)
+
+        # THEN the second parameter is not relevant anymore
+        response = self.client.get(self.url)
+        self.assertEqual([p.pk for p in response.context['relevant_parameters']], [self.param1.pk])
+        self.assertEqual([p.pk for p in response.context['nonrelevant_parameters']], [self.param2.pk])
+
+
+class TaskScoresDataTestCase(TestCase):
+    # TaskScoresView should load task scores data with fixed number of queries and calculate
+    # openness in memory equal to openness calculated in database.
+
+    def setUp(self):
+        attrs = dict({a: False for a in Parameter.OPTIONAL_CRITERIA}, complete=True)
+        # GIVEN monitoring with 3 parameters having only "complete" criterion
+        monitoring = mommy.make(Monitoring, status=INT)
+        params = [mommy.make(Parameter, monitoring=monitoring, weight=weight, code=code, **attrs)
+                  for code, weight in [(1, 1), (2, 2), (3, 3)]]
+        # AND task with third parameter excluded
+        self.task = mommy.make(Task, organization__monitoring=monitoring, status=Task.TASK_APPROVED)
+        params[2].exclude.add(self.task.organization)
+        # AND final and interim scores
+        self.scores = [mommy.make(Score, task=self.task, parameter=param, found=1, complete=2) for param in params]
+        mommy.make(Score, task=self.task, parameter=params[0], found=1, complete=1, revision=Score.INTERIM)
+        # AND expert A account
+        expertA = User.objects.create_user('expertA', 'usr@svobodainfo.org', 'password')
+        expertA.profile.is_expertA = True
+        self.client.login(username='expertA', password='password')
+
+    def test_scores_data(self):
+        # WHEN I get task scores page
+        response = self.client.get(reverse('exmo2010:task_scores', args=[self.task.pk]))
+
+        # THEN task openness and delta are equal to calculated in database
+        self.assertAlmostEqual(response.context['openness'], float(self.task.openness))
+        self.assertAlmostEqual(response.context['delta'], float(self.task.openness - self.task.openness_initial))
+        # AND parameters openness is equal to scores openness
+        self.assertEqual([p.score_openness for p in response.context['relevant_parameters']],
+                         [s.openness for s in self.scores[:2]])
+        self.assertEqual([p.pk for p in response.context['nonrelevant_parameters']], [self.scores[2].parameter_id])
+
+    def test_queries(self):
+        # WHEN task scores data is loaded for expert A
+        expertA = Mock(is_expert=True, is_expertA=True, **{'executes.return_value': False})
+        request = Mock(user=expertA, GET={})
+        view = TaskScoresView(request=request)
+        view.task = Task.objects.select_related('organization__monitoring').get(pk=self.task.pk)
+        view.queryform = ParametersQueryForm({})
+
+        # THEN parameters, exclusions, scores and open comments are loaded with 4 queries
+        with self.assertNumQueries(4):
+            view._scores_data()
+
+
+class ScorePageQueriesTestCase(TestCase):
+    # exmo2010:score
+
+    # Score page should be rendered with fixed number of queries, which does not depend on
+    # number of comments and claims.
+
+    def setUp(self):
+        attrs = dict({a: False for a in Parameter.OPTIONAL_CRITERIA}, complete=True)
+        # GIVEN monitoring in interaction phase with parameter having "complete" criterion
+        monitoring = mommy.make(Monitoring, status=INT)
+        parameter = mommy.make(Parameter, monitoring=monitoring, weight=1, **attrs)
+        task = mommy.make(Task, organization__monitoring=monitoring, status=Task.TASK_APPROVED)
+        # AND final and interim scores
+        self.score = mommy.make(Score, task=task, parameter=parameter, found=1, complete=2)
+        mommy.make(Score, task=task, parameter=parameter, found=1, complete=1, revision=Score.INTERIM)
+        # AND organization representative
+        self.orguser = User.objects.create_user('orguser', 'org@svobodainfo.org', 'password')
+        self.orguser.groups.add(Group.objects.get(name=self.orguser.profile.organization_group))
+        mommy.make(OrgUser, organization=task.organization, userprofile=self.orguser.profile)
+        # AND expert A account
+        self.expertA = User.objects.create_user('expertA', 'usr@svobodainfo.org', 'password')
+        self.expertA.profile.is_expertA = True
+        self.url = reverse('exmo2010:score', args=[self.score.pk])
+
+    def add_comments_and_claims(self):
+        content_type = ContentType.objects.get_for_model(Score)
+        for user in (self.orguser, self.expertA):
+            mommy.make(CommentExmo, object_pk=self.score.pk, content_type=content_type, user=user,
+                       site=Site.objects.get_current())
+        mommy.make(Claim, score=self.score, creator=self.expertA, addressee=self.expertA)
+        mommy.make(Clarification, score=self.score, creator=self.expertA)
+
+    def test_queries(self):
+        # WHEN I am logged in as expert A
+        self.client.login(username='expertA', password='password')
+        # AND static data is initialized by the first request
+        self.client.get(self.url)
+        self.add_comments_and_claims()
+        # THEN score page is rendered with fixed number of queries
+        with self.assertNumQueries(22):
+            self.client.get(self.url)
+
+        # AND more comments and claims are added
+        self.add_comments_and_claims()
+        # THEN number of queries is the same
+        with self.assertNumQueries(22):
+            self.client.get(self.url)
@@ -20,10 +20,12 @@
 #
 import re
 from collections import defaultdict
+from copy import copy
 from datetime import datetime
 
 from bs4 import BeautifulSoup
 from ckeditor.fields import RichTextFormField
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import PermissionDenied, ValidationError
@@ -48,7 +50,9 @@ from exmo2010.columns_picker import task_scores_columns_form
 from exmo2010.mail import mail_comment
 from exmo2010.models import Organization, Score, Task, Parameter, QAnswer, QQuestion, UserProfile
 from exmo2010.models.monitoring import Monitoring
+from exmo2010.openness import OpennessEngine, score_openness
 from exmo2010.templatetags.exmo2010_filters import linkify, strict_bleach
+from exmo2010.view_cache import cached_view_data, view_cache_key
 from parameters.forms import ParametersQueryForm
 from perm_utils import annotate_exmo_perms
 from questionnaire.forms import QuestionnaireDynForm
@@ -65,7 +69,9 @@ def score_view(request, **kwargs):
 
     if 'score_pk' in kwargs:
         # Score edit or view
-        score = get_object_or_404(Score, pk=kwargs['score_pk'])
+        score = get_object_or_404(
+            Score.objects.select_related('task__organization__monitoring', 'parameter__monitoring'),
+            pk=kwargs['score_pk'])
         task = score.task
         param = score.parameter
         if request.method == 'POST' and not request.user.has_perm('exmo2010.edit_score', score):
@@ -74,8 +80,8 @@ def score_view(request, **kwargs):
             raise PermissionDenied
     else:
         # Score creation by task and param
-        task = get_object_or_404(Task, pk=kwargs['task_pk'])
-        param = get_object_or_404(Parameter, pk=kwargs['parameter_pk'])
+        task = get_object_or_404(Task.objects.select_related('organization__monitoring'), pk=kwargs['task_pk'])
+        param = get_object_or_404(Parameter.objects.select_related('monitoring'), pk=kwargs['parameter_pk'])
         if not request.user.has_perm('exmo2010.fill_task', task):
             raise PermissionDenied
 
@@ -95,7 +101,7 @@ def score_view(request, **kwargs):
                 raise PermissionDenied
 
     org = task.organization
-    param.relevant = bool(task.organization not in param.exclude.all())
+    param.relevant = not param.exclude.filter(pk=org.pk).exists()
 
     if not param.relevant and not request.user.is_expert:
         raise PermissionDenied
@@ -114,6 +120,9 @@ def score_view(request, **kwargs):
     for f in criteria:
         ScoreForm.base_fields[f].widget.choices[0] = ('', '–')
 
+    if score.pk:
+        # Score state before changes, Score.clean compares recommendations with it.
+        score.db_score = copy(score)
     form = ScoreForm(request.POST if request.method == 'POST' else None, instance=score)
 
     if request.method == 'POST' and form.is_valid():
@@ -142,16 +151,20 @@ def score_view(request, **kwargs):
             url = reverse('exmo2010:task_scores', args=[task.pk])
             return HttpResponseRedirect('%s#parameter_%s' % (url, param.code))
 
-    score_interim = Score.objects.filter(parameter=param, task=task, revision=Score.INTERIM)
+    score_interim = Score.objects.filter(parameter=param, task=task, revision=Score.INTERIM).order_by()[:1]
+    score_interim = score_interim[0] if score_interim else None
+    if score_interim:
+        # Share already fetched parameter and monitoring, needed for openness.
+        score_interim.parameter = param
     score_table = [{
         'label': score._meta.get_field_by_name(criterion)[0].verbose_name,
         'score': getattr(score, criterion),
-        'score_interim': getattr(score_interim[0], criterion) if score_interim else '',
+        'score_interim': getattr(score_interim, criterion) if score_interim else '',
         'criterion': criterion,
         'max_score': getattr(score, criterion) == score._meta.get_field(criterion).choices[-1][-1]
     } for criterion in criteria]
 
-    score_delta = score.openness - score_interim[0].openness if score_interim else 0
+    score_delta = score.openness - score_interim.openness if score_interim else 0
     if request.user.is_expert:
         show_interim_score = True
     elif request.user.is_anonymous():
@@ -169,17 +182,27 @@ def score_view(request, **kwargs):
         # Add attribute with initial value to each criterion boundfield
         boundfield.initial = form.initial.get(boundfield.name, boundfield.field.initial)
 
+    authors = ('creator__userprofile', 'close_user__userprofile')
     if request.user.is_expertA:
-        claim_list = score.claim_set.all()
+        claim_list = score.claim_set.select_related(*authors)
     elif request.user.is_expertB:
-        claim_list = score.claim_set.filter(addressee=request.user)
+        claim_list = score.claim_set.filter(addressee=request.user).select_related(*authors)
     else:
         claim_list = []
 
+    if score.pk:
+        comment_list = CommentExmo.objects.filter(
+            object_pk=score.pk, content_type=ContentType.objects.get_for_model(Score),
+            site=settings.SITE_ID, is_public=True, is_removed=False)\
+            .select_related('user__userprofile').order_by('submit_date')
+        clarification_list = score.clarification_set.select_related(*authors)
+    else:
+        comment_list = clarification_list = []
+
     context = {
         'form': form,
         'score': annotate_exmo_perms(score, request.user),
-        'score_interim': annotate_exmo_perms(score_interim[0] if score_interim else None, request.user),
+        'score_interim': annotate_exmo_perms(score_interim, request.user),
         'param': annotate_exmo_perms(param, request.user),
         'task': annotate_exmo_perms(task, request.user),
         'org': org,
@@ -190,6 +213,8 @@ def score_view(request, **kwargs):
         'criteria': criteria,
         'interaction': org.monitoring.is_interact or org.monitoring.is_finishing,
         'claim_list': claim_list,
+        'clarification_list': clarification_list,
+        'comment_list': comment_list,
         'recommendations_required': param.monitoring.no_interact is False and not all_max,
         'comment_form': score.comment_form(request.POST if request.method == 'POST' else None),
         'invcodeform': SettingsInvCodeForm(),
@@ -341,47 +366,9 @@ class TaskScoresView(TaskScoresMixin, DetailView):
         monitoring = self.task.organization.monitoring
         self.queryform = ParametersQueryForm(self.request.GET)
 
-        # These fields should be annotated on paramter for strict pedantic tests.
-        _param_extra = {'select': {'comment_url': 0, 'score_pk': 0, 'score_table': 0, 'score_openness': 0, 'score_openness_delta': 0}}
-
-        # Relevant parameters
-        relevant_parameters = Parameter.objects.filter(monitoring=monitoring)\
-                                               .exclude(exclude=self.task.organization)\
-                                               .defer('grounds', 'rating_procedure', 'notes')\
-                                               .extra(**_param_extra)
-        scores_rel = Score.objects.filter(task=self.task)\
-                                  .exclude(parameter__exclude=self.task.organization)\
-                                  .defer('links', 'recommendations', 'created', 'last_modified', 'editor')
-        relevant_parameters_exist = relevant_parameters.exists()
-
-        # Apply user provided filters to relevant parameters
-        if self.queryform.is_valid():
-            relevant_parameters = self.queryform.apply(relevant_parameters)
-
-        # Set scores to relevant parameters list
-        self._set_parameters_scores(relevant_parameters, scores_rel)
-        self._set_last_comment_url(relevant_parameters, scores_rel)
-
-        if self.request.user.is_expert:
-            # Non relevant parameters
-            nonrelevant_parameters = Parameter.objects.filter(monitoring=monitoring, exclude=self.task.organization)\
-                                                      .defer('grounds', 'rating_procedure', 'notes')\
-                                                      .extra(**_param_extra)
-            scores_nonrel = Score.objects.filter(task=self.task, parameter__exclude=self.task.organization)\
-                                         .defer('links', 'recommendations', 'created', 'last_modified', 'editor')
-            nonrelevant_parameters_exist = nonrelevant_parameters.exists()
-
-            # Apply user provided filters to non relevant parameters
-            if self.queryform.is_valid():
-                nonrelevant_parameters = self.queryform.apply(nonrelevant_parameters)
-
-            # Set scores to non relevant parameters list
-            self._set_parameters_scores(nonrelevant_parameters, scores_nonrel)
-
-            context.update({
-                'nonrelevant_parameters': nonrelevant_parameters,
-                'nonrelevant_parameters_exist': nonrelevant_parameters_exist,
-            })
+        # Parameters with scores and task openness are cached until monitoring data is changed.
+        context.update(cached_view_data(
+            view_cache_key('task_scores', monitoring.pk, self.request, self.task.pk), self._scores_data))
 
         # Get questionnaire form
         questionnaire_form = None
@@ -392,61 +379,101 @@ class TaskScoresView(TaskScoresMixin, DetailView):
             questionnaire_form = QuestionnaireDynForm(questions=questions, initial=initial_data)
 
         context.update({
-            'relevant_parameters': relevant_parameters,
-            'relevant_parameters_exist': relevant_parameters_exist,
             'mon': monitoring,
             'task': self.task,
             'questionnaire_form': questionnaire_form,
             'invcodeform': SettingsInvCodeForm(),
             'orgs_count': Organization.objects.filter(monitoring=monitoring).count(),
-            'openness': self.task.openness,
-            'delta': self.task.openness - self.task.openness_initial if self.task.openness is not None else None,
             'columns_form': task_scores_columns_form(self.request),
             'is_representative': self.request.user.represents(self.task.organization),
         })
 
         return context
 
-    @staticmethod
-    def _set_parameters_scores(parameters, scores):
-        score_fin_dict = {s.parameter.pk: s for s in scores if s.revision == Score.FINAL}
-        score_int_dict = {s.parameter.pk: s for s in scores if s.revision == Score.INTERIM}
+    def _scores_data(self):
+        """
+        Load parameters, scores of both revisions, exclusions and open comments of the task with
+        a fixed number of queries. Calculate openness of parameters and task from loaded data.
+
+        """
+        monitoring = self.task.organization.monitoring
+        code = monitoring.openness_expression_id
+        parameters = list(Parameter.objects.filter(monitoring=monitoring).defer('grounds', 'rating_procedure', 'notes'))
+        params_by_pk = dict((p.pk, p) for p in parameters)
+        excluded = set(Parameter.exclude.through.objects.filter(organization=self.task.organization_id)
+                                                        .values_list('parameter_id', flat=True))
+        scores = Score.objects.filter(task=self.task)\
+                              .defer('links', 'recommendations', 'created', 'last_modified', 'editor')
+        scores = [s for s in scores if s.parameter_id in params_by_pk]
+        score_fin_dict = {s.parameter_id: s for s in scores if s.revision == Score.FINAL}
+        score_int_dict = {s.parameter_id: s for s in scores if s.revision == Score.INTERIM}
 
         for param in parameters:
-            score_fin = score_fin_dict.get(param.pk, None)
-            if score_fin:
-                param.score_pk = score_fin.pk
-                param.score_accomplished = score_fin.accomplished
-                score_int = score_int_dict.get(param.pk, None)
-                param.score_openness = score_fin.openness
-                param.score_openness_delta = score_fin.openness - score_int.openness if score_int else 0
-
-                criteria = ['found'] + filter(param.__getattribute__, Parameter.OPTIONAL_CRITERIA)
-
-                score_table = []
-                for criterion in ['found'] + Parameter.OPTIONAL_CRITERIA:
-                    if criterion in criteria:
-                        score_table.append({
-                            'score_final': getattr(score_fin, criterion),
-                            'score_interim': getattr(score_int, criterion) if score_int else '',
-                            'max_score': getattr(score_fin, criterion) == score_fin._meta.get_field(criterion).choices[-1][-1]
-                        })
-                    else:
-                        score_table.append({})
-
-                param.score_table = score_table
-
-    def _set_last_comment_url(self, parameters, scores):
+            # These fields should be annotated on parameter for strict pedantic tests.
+            param.comment_url = param.score_pk = param.score_table = 0
+            param.score_openness = param.score_openness_delta = 0
+
+            score_fin = score_fin_dict.get(param.pk)
+            if not score_fin:
+                continue
+            score_int = score_int_dict.get(param.pk)
+            param.score_pk = score_fin.pk
+            param.score_accomplished = score_fin.accomplished
+            param.score_openness = score_openness(code, param, score_fin)
+            param.score_openness_delta = param.score_openness - score_openness(code, param, score_int) if score_int else 0
+
+            criteria = ['found'] + filter(param.__getattribute__, Parameter.OPTIONAL_CRITERIA)
+
+            score_table = []
+            for criterion in ['found'] + Parameter.OPTIONAL_CRITERIA:
+                if criterion in criteria:
+                    score_table.append({
+                        'score_final': getattr(score_fin, criterion),
+                        'score_interim': getattr(score_int, criterion) if score_int else '',
+                        'max_score': getattr(score_fin, criterion) == score_fin._meta.get_field(criterion).choices[-1][-1]
+                    })
+                else:
+                    score_table.append({})
+
+            param.score_table = score_table
+
+        relevant_parameters = [p for p in parameters if p.pk not in excluded]
+        nonrelevant_parameters = [p for p in parameters if p.pk in excluded]
+        self._set_last_comment_url(relevant_parameters, [s.pk for s in scores if s.parameter_id not in excluded])
+
+        openness, openness_initial = OpennessEngine.for_task(self.task, parameters, excluded, scores, code)\
+                                                   .tasks_openness()[self.task.pk]
+        data = {
+            'relevant_parameters_exist': bool(relevant_parameters),
+            'openness': openness,
+            'delta': openness - openness_initial if openness is not None else None,
+        }
+
+        # Apply user provided filters to parameters
+        if self.queryform.is_valid() and self.queryform.get_filter():
+            filtered = set(self.queryform.apply(Parameter.objects.filter(monitoring=monitoring)).values_list('pk', flat=True))
+            relevant_parameters = [p for p in relevant_parameters if p.pk in filtered]
+            nonrelevant_parameters = [p for p in nonrelevant_parameters if p.pk in filtered]
+
+        data['relevant_parameters'] = relevant_parameters
+        if self.request.user.is_expert:
+            data.update({
+                'nonrelevant_parameters': nonrelevant_parameters,
+                'nonrelevant_parameters_exist': bool(excluded & set(params_by_pk)),
+            })
+        return data
+
+    def _set_last_comment_url(self, parameters, score_pks):
         if self.request.user.executes(self.task) or self.request.user.is_expertA:
             scores_with_opened_comments = CommentExmo.objects.filter(
-                object_pk__in=scores.values_list('pk', flat=True),
-                content_type__model=ContentType.objects.get_for_model(Score),
+                score_id__in=score_pks,
+                content_type__model='score',
                 status=CommentExmo.OPEN,
                 user__groups__name=UserProfile.organization_group,
-            ).values_list('object_pk', flat=True)
+            ).values_list('score_id', flat=True)
 
             if scores_with_opened_comments:
-                scores_with_opened_comments = [int(s) for s in set(scores_with_opened_comments)]
+                scores_with_opened_comments = set(scores_with_opened_comments)
                 for param in parameters:
                     if not getattr(param, 'score_pk', None):
                         continue
@@ -477,11 +504,11 @@ class RecommendationsView(TaskScoresMixin, DetailView):
         context = super(RecommendationsView, self).get_context_data(**kwargs)
 
         monitoring = self.task.organization.monitoring
-        scores = list(self.task.score_set.all())
+        scores = list(self.task.score_set.select_related('parameter__monitoring'))
 
         comments_by_score = defaultdict(list)
-        for comment in CommentExmo.objects.filter(object_pk__in=[s.pk for s in scores]):
-            comments_by_score[int(comment.object_pk)].append(comment)
+        for comment in CommentExmo.objects.filter(task_id=self.task.pk):
+            comments_by_score[comment.score_id].append(comment)
 
         final_scores = [s for s in scores if s.revision == Score.FINAL]
         interim_scores_by_param = dict((s.parameter.pk, s) for s in scores if s.revision == Score.INTERIM)
@@ -539,15 +566,9 @@ class RecommendationsPrint(RecommendationsView):
     def get_context_data(self, **kwargs):
         context = super(RecommendationsPrint, self).get_context_data(**kwargs)
         recommendations_url = reverse('exmo2010:recommendations', args=(self.task.pk,))
-        rating_place = None
-        if self.task.approved:
-            for t in self.task.organization.monitoring.rating(rating_type='all'):
-                if t.pk == self.task.pk:
-                    rating_place = t.place
-                    break
 
         context.update({
-            'rating_place': rating_place,
+            'rating_place': self.task.rating_place,
             'recommendations_url': self.request.build_absolute_uri(recommendations_url),
             'is_representative': self.request.user.represents(self.task.organization),
         })
@@ -574,13 +595,7 @@ def rating_update(request):
         task = get_object_or_404(Task, pk=request.GET.get('task_id', None))
 
         if request.user.has_perm('exmo2010.view_openness', task) and task.approved:
-            place = None
-            for t in task.organization.monitoring.rating(rating_type='all'):
-                if t.pk == task.pk:
-                    place = t.place
-                    break
-
-            return JSONResponse({'rating_place': place})
+            return JSONResponse({'rating_place': task.rating_place})
         else:
             raise PermissionDenied
 
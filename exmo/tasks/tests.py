@@ -19,14 +19,17 @@
 #
 import json
 import re
+from StringIO import StringIO
 
+import reversion
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
 from django.core import mail
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
+from django.db import IntegrityError
 from core.test_utils import TestCase
-from mock import MagicMock, Mock
+from mock import MagicMock, Mock, patch
 from model_mommy import mommy
 from nose_parameterized import parameterized
 
@@ -34,7 +37,7 @@ from .views import TaskHistoryView
 from core.test_utils import OptimizedTestCase
 from exmo2010.models import (
     Monitoring, ObserversGroup, Organization, TaskHistory, Task, Score, OrgUser,
-    Parameter, MONITORING_INTERACTION, MONITORING_RATE)
+    Parameter, QAnswer, QQuestion, MONITORING_INTERACTION, MONITORING_RATE, annotate_completeness)
 
 
 class TaskAssignSideEffectsTestCase(TestCase):
@@ -575,6 +578,39 @@ class TaskCompletenessTestCase(TestCase):
         self.assertEqual(self.task.completeness, 100)
 
 
+class AnnotateCompletenessTestCase(TestCase):
+    # Completeness of many tasks should be calculated with constant number of queries
+    # and should be equal to completeness of every task calculated separately.
+
+    def setUp(self):
+        attrs = {a: False for a in Parameter.OPTIONAL_CRITERIA}
+        # GIVEN monitoring with 3 parameters and 1 question
+        monitoring = mommy.make(Monitoring)
+        param1, param2, param3 = mommy.make(Parameter, monitoring=monitoring, weight=1, _quantity=3, **attrs)
+        question = mommy.make(QQuestion, questionnaire__monitoring=monitoring)
+        # AND task with all parameters rated and answered question
+        self.task1 = mommy.make(Task, organization__monitoring=monitoring)
+        for param in (param1, param2, param3):
+            mommy.make(Score, task=self.task1, parameter=param, found=1)
+        mommy.make(QAnswer, task=self.task1, question=question)
+        # AND task with second parameter excluded and only first and excluded parameters rated
+        self.task2 = mommy.make(Task, organization__monitoring=monitoring)
+        param2.exclude.add(self.task2.organization)
+        for param in (param1, param2):
+            mommy.make(Score, task=self.task2, parameter=param, found=1)
+
+    def test_completeness(self):
+        # WHEN I annotate tasks with completeness
+        tasks = list(Task.objects.filter(pk__in=[self.task1.pk, self.task2.pk]).order_by('pk'))
+        with self.assertNumQueries(7):
+            annotate_completeness(tasks)
+
+        # THEN excluded parameters are not counted
+        self.assertEqual([round(t.completeness, 2) for t in tasks], [100, 33.33])
+        # AND completeness is equal to completeness of separate tasks
+        self.assertEqual([t.completeness for t in tasks], [self.task1.completeness, self.task2.completeness])
+
+
 class TaskHistoryAccessTestCase(OptimizedTestCase):
     # exmo2010:task_history
 
@@ -656,3 +692,109 @@ class TaskHistoryAccessTestCase(OptimizedTestCase):
         response = TaskHistoryView.as_view()(request, task_pk=self.task.id)
         # THEN response status_code should be 405 (method not allowed)
         self.assertEqual(response.status_code, 405)
+
+
+class TaskImportTestCase(TestCase):
+    # exmo2010:task_import
+
+    # Should import scores from csv file, create new scores, update changed ones
+    # and log errors of invalid rows.
+
+    def setUp(self):
+        attrs = {a: False for a in Parameter.OPTIONAL_CRITERIA}
+        # GIVEN monitoring without interaction with 3 parameters
+        monitoring = mommy.make(Monitoring, no_interact=True)
+        param1, param2, param3 = [mommy.make(Parameter, monitoring=monitoring, code=code, weight=1, **attrs)
+                                  for code in (1, 2, 3)]
+        # AND task with scores for first and third parameters
+        self.task = mommy.make(Task, organization__monitoring=monitoring)
+        self.score1 = mommy.make(Score, task=self.task, parameter=param1, found=0)
+        self.score3 = mommy.make(Score, task=self.task, parameter=param3, found=1)
+        # AND I am logged in as expert A
+        expertA = User.objects.create_user('expertA', 'usr@svobodainfo.org', 'password')
+        expertA.profile.is_expertA = True
+        self.client.login(username='expertA', password='password')
+
+    def test_import(self):
+        csv_file = StringIO('\n'.join([
+            '1,p1,1,,,,,,,http://example.com,',
+            '2,p2,1,,,,,,,,',
+            '3,p3,1,,,,,,,,',
+            '4,p4,1,,,,,,,,',
+            '#comment',
+            '2,p2,2,,,,,,,,',
+        ]).encode('utf-16'))
+        csv_file.name = 'task.csv'
+        # WHEN I upload csv file
+        url = reverse('exmo2010:task_import', args=[self.task.pk])
+        response = self.client.post(url, {'taskfile': csv_file})
+
+        # THEN 3 of 6 rows are imported
+        self.assertEqual(response.context['row_count'], '3/6')
+        # AND errors of unknown parameter, comment and invalid value are logged
+        errors = response.context['errors']
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith('row 4.'))
+        self.assertTrue(errors[1].startswith('row 5.'))
+        self.assertTrue(errors[2].startswith('row 6 (validation).'))
+        # AND changed score is updated
+        score1 = Score.objects.get(pk=self.score1.pk)
+        self.assertEqual((score1.found, score1.links), (1, 'http://example.com'))
+        # AND new score is created
+        self.assertEqual(Score.objects.get(task=self.task, parameter__code=2).found, 1)
+        # AND new and changed scores are added to revision, unchanged score is not
+        self.assertEqual(len(reversion.get_for_object(score1)), 1)
+        self.assertEqual(len(reversion.get_for_object(Score.objects.get(pk=self.score3.pk))), 0)
+
+    def test_concurrent_score_creation(self):
+        csv_file = StringIO('2,p2,1,,,,,,,,'.encode('utf-16'))
+        csv_file.name = 'task.csv'
+        # WHEN I upload csv file and the same score is created by concurrent request
+        url = reverse('exmo2010:task_import', args=[self.task.pk])
+        with patch.object(Score.objects, 'bulk_create', side_effect=IntegrityError('duplicate')):
+            response = self.client.post(url, {'taskfile': csv_file})
+
+        # THEN no rows are imported
+        self.assertEqual(response.context['row_count'], '0/1')
+        # AND import error is logged
+        self.assertEqual(response.context['errors'], ['Import error: duplicate.'])
+
+
+class TaskImportInteractionTestCase(TestCase):
+    # exmo2010:task_import
+
+    # Should require changed recommendations for changed non-maximum scores imported in interaction phase.
+
+    def setUp(self):
+        attrs = {a: False for a in Parameter.OPTIONAL_CRITERIA}
+        # GIVEN monitoring in interaction phase with 2 parameters
+        monitoring = mommy.make(Monitoring, status=MONITORING_INTERACTION, no_interact=False)
+        param1, param2 = [mommy.make(Parameter, monitoring=monitoring, code=code, weight=1, **attrs)
+                          for code in (1, 2)]
+        # AND task with found scores with recommendations for both parameters
+        self.task = mommy.make(Task, organization__monitoring=monitoring)
+        self.score1 = mommy.make(Score, task=self.task, parameter=param1, found=1, recommendations='rec1')
+        self.score2 = mommy.make(Score, task=self.task, parameter=param2, found=1, recommendations='rec2')
+        # AND I am logged in as expert A
+        expertA = User.objects.create_user('expertA', 'usr@svobodainfo.org', 'password')
+        expertA.profile.is_expertA = True
+        self.client.login(username='expertA', password='password')
+
+    def test_import(self):
+        csv_file = StringIO('\n'.join([
+            '1,p1,0,,,,,,,,rec1',
+            '2,p2,0,,,,,,,,new rec2',
+        ]).encode('utf-16'))
+        csv_file.name = 'task.csv'
+        # WHEN I upload csv file, which changes both scores to not found
+        url = reverse('exmo2010:task_import', args=[self.task.pk])
+        response = self.client.post(url, {'taskfile': csv_file})
+
+        # THEN only score with changed recommendations is imported
+        self.assertEqual(response.context['row_count'], '1/2')
+        errors = response.context['errors']
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith('row 1 (validation).'))
+        # AND scores in database are changed accordingly
+        self.assertEqual(Score.objects.get(pk=self.score1.pk).found, 1)
+        self.assertEqual(Score.objects.get(pk=self.score2.pk).found, 0)
@@ -21,21 +21,26 @@
 import csv
 import re
 import string
+from collections import defaultdict
+from copy import copy
 
 import reversion
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import Group, User
 from django.core.exceptions import ValidationError, PermissionDenied
 from django.core.urlresolvers import reverse
 from django.forms.models import modelform_factory
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.forms.widgets import HiddenInput
 from django.http import HttpResponse, HttpResponseRedirect, QueryDict
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
+from django.utils import timezone
 from django.utils.translation import ugettext as _
 from django.views.generic import DeleteView, ListView, UpdateView, View
+from reversion.models import VERSION_ADD, VERSION_CHANGE
 
 from .forms import MassAssignmentTasksForm
 from accounts.forms import SettingsInvCodeForm
@@ -44,8 +49,11 @@ from core.helpers import table
 from core.response import JSONResponse
 from core.views import login_required_on_deny, LoginRequiredMixin
 from core.utils import UnicodeReader, UnicodeWriter
+from exmo2010.export_artifacts import invalidate_artifacts
 from exmo2010.models import (Monitoring, Parameter, Score, Task,
-                             TaskHistory, LicenseTextFragments, UserProfile)
+                             TaskHistory, LicenseTextFragments, UserProfile, annotate_completeness)
+from exmo2010.models.task_openness import invalidate_task_openness
+from exmo2010.view_cache import invalidate_monitoring_views
 from perm_utils import annotate_exmo_perms
 
 
@@ -100,16 +108,40 @@ def task_export(request, task_pk):
     return response
 
 
-@reversion.create_revision()
-@login_required
-def task_import(request, task_pk):
-    task = get_object_or_404(Task, pk=task_pk)
-    if not request.user.has_perm('exmo2010.fill_task', task):
-        raise PermissionDenied
+SCORE_IMPORT_FIELDS = ['found', 'complete', 'topical', 'accessible',
+                       'hypertext', 'document', 'image', 'links', 'recommendations']
 
-    if 'taskfile' not in request.FILES:
-        return HttpResponseRedirect(reverse('exmo2010:task_scores', args=[task_pk]))
-    reader = UnicodeReader(request.FILES['taskfile'])
+
+def _add_to_revision(scores, type_flag):
+    """
+    Add scores saved with bulk queries to the current revision, as post_save signal would do.
+
+    """
+    manager = reversion.default_revision_manager
+    context = reversion.revision_context_manager
+    if not manager.is_registered(Score) or not context.is_active() or context.is_managing_manually():
+        return
+    adapter = manager.get_adapter(Score)
+    for score in scores:
+        context.add_to_context(manager, score, adapter.get_version_data(score, type_flag, context.get_db()))
+
+
+def import_scores(task, reader):
+    """
+    Import task scores from csv rows.
+    Parameters and scores of the task are fetched once, rows are validated in memory and changed
+    scores are written with bulk queries in single transaction.
+    Returns list of errors, number of imported rows and number of rows read.
+
+    """
+    monitoring = task.organization.monitoring
+    parameters = dict((p.code, p) for p in Parameter.objects.filter(monitoring=monitoring).select_related('monitoring'))
+    db_scores = defaultdict(list)
+    for score in Score.objects.filter(task=task).order_by():
+        db_scores[score.parameter_id].append(score)
+
+    # Latest valid state of imported scores by parameter pk.
+    scores = {}
     errors = []
     rowOKCount = 0
     row_num = 0
@@ -126,19 +158,24 @@ def task_import(request, task_pk):
                 if not any(row[2:16]):
                     errors.append(_("row %(row)d (csv). Empty score: %(raw)s") % {'row': row_num, 'raw': row[0]})
                     continue
-                parameter = Parameter.objects.get(code=code.group(1), monitoring=task.organization.monitoring)
-                try:
-                    score = Score.objects.get(task=task, parameter=parameter)
-                except Score.DoesNotExist:
-                    score = Score()
+                parameter = parameters.get(int(code.group(1)))
+                if parameter is None:
+                    raise Parameter.DoesNotExist
+                if len(db_scores[parameter.pk]) > 1:
+                    raise Score.MultipleObjectsReturned(
+                        'get() returned more than one Score -- it returned %d!' % len(db_scores[parameter.pk]))
+                db_score = scores.get(parameter.pk) or (db_scores[parameter.pk] or [None])[0]
+                score = copy(db_score) if db_score else Score()
+                score.db_score = db_score
                 score.task = task
                 score.parameter = parameter
-                for i, key in enumerate(['found', 'complete', 'topical', 'accessible',
-                                         'hypertext', 'document', 'image', 'links', 'recommendations']):
+                for i, key in enumerate(SCORE_IMPORT_FIELDS):
                     value = row[i+2]
                     setattr(score, key, value if value else None)
-                score.full_clean()
-                score.save()
+                # Task and parameter are known to exist and be unique together, skip checks querying database.
+                score.full_clean(exclude=['task', 'parameter'])
+                score.prepare_save()
+                scores[parameter.pk] = score
             except ValidationError, e:
                 errors.append(_("row %(row)d (validation). %(raw)s") % {
                     'row': row_num,
@@ -159,6 +196,56 @@ def task_import(request, task_pk):
         errors.append(_("File, you are loading is not valid CSV."))
     except Exception, e:
         errors.append(_("Import error: %s." % e))
+
+    # Values are cleaned, so they are converted to python types and may be compared with database ones.
+    fields = SCORE_IMPORT_FIELDS + ['accomplished']
+    created = []
+    changed = defaultdict(list)
+    for parameter_pk, score in scores.iteritems():
+        if score.pk is None:
+            created.append(score)
+            continue
+        values = tuple(getattr(score, f) for f in fields)
+        if values != tuple(getattr(db_scores[parameter_pk][0], f) for f in fields):
+            changed[values].append(score)
+
+    if created or changed:
+        now = timezone.now()
+        try:
+            with transaction.commit_on_success():
+                Score.objects.bulk_create(created)
+                # Scores with equal values are updated with single query.
+                for values, group in changed.iteritems():
+                    Score.objects.filter(pk__in=[s.pk for s in group])\
+                                 .update(last_modified=now, **dict(zip(fields, values)))
+                    for score in group:
+                        score.last_modified = now
+        except IntegrityError, e:
+            # Scores may be created by concurrent request in the meantime.
+            errors.append(_("Import error: %s." % e))
+            return errors, 0, row_num
+
+        created_pks = [s.parameter_id for s in created]
+        _add_to_revision(Score.objects.filter(task=task, parameter__in=created_pks).order_by(), VERSION_ADD)
+        _add_to_revision(sum(changed.values(), []), VERSION_CHANGE)
+        invalidate_task_openness(task.pk)
+        invalidate_monitoring_views([monitoring.pk])
+        if settings.PRECOMPUTED_EXPORTS:
+            invalidate_artifacts(monitoring.pk)
+
+    return errors, rowOKCount, row_num
+
+
+@reversion.create_revision()
+@login_required
+def task_import(request, task_pk):
+    task = get_object_or_404(Task, pk=task_pk)
+    if not request.user.has_perm('exmo2010.fill_task', task):
+        raise PermissionDenied
+
+    if 'taskfile' not in request.FILES:
+        return HttpResponseRedirect(reverse('exmo2010:task_scores', args=[task_pk]))
+    errors, rowOKCount, row_num = import_scores(task, UnicodeReader(request.FILES['taskfile']))
     title = _('Import CSV for task %s') % task
 
     return TemplateResponse(request, 'exmo2010/csv_import_log_tasks.html', {
@@ -310,10 +397,10 @@ def tasks_by_monitoring(request, monitoring_pk):
     tasks = Task.objects.filter(organization__monitoring=monitoring).select_related('user__userprofile', 'organization')
 
     # TODO: use queryform instead of table().
-    return table(
+    response = table(
         request,
         headers,
-        queryset=perm_filter(request.user, 'view_task', tasks).prefetch_related('qanswer_set'),
+        queryset=perm_filter(request.user, 'view_task', tasks),
         paginate_by=50,
         extra_context={
             'monitoring': annotate_exmo_perms(monitoring, request.user),
@@ -322,6 +409,9 @@ def tasks_by_monitoring(request, monitoring_pk):
         },
         template_name="manage_monitoring/tasks.html",
     )
+    # Completeness of all tasks on the page is calculated with a few grouped queries.
+    annotate_completeness(response.context_data['object_list'])
+    return response
 
 
 @login_required